@@ -1,22 +1,31 @@
 import pywikibot
 import pandas as pd
 import numpy as np
-from datetime import datetime
-from datetime import timedelta
-from matplotlib.backends.backend_pdf import PdfPages
 import matplotlib.pyplot as plt
 from wordcloud import WordCloud
 from wordcloud import STOPWORDS
-from get_edits import get_edits
-import nltk 
-import re
+from get_edits import get_user_edits, get_edits_from_contribs
+from wiki_client import get_default_client, set_default_client
+from edit_cache import get_default_cache, set_default_cache
+from edit_warehouse import get_default_warehouse, set_default_warehouse
+from user_info import get_user, prefetch_users
+from activity_fingerprint import ActivityFingerprints
+from report_pdf import StreamingPdf, make_page
+from text_cleaning import clean_changes, get_changes_batch, make_stopword_set, remove_stopwords
 import time
+import os
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from itertools import islice
 import simplejson as json
 
 numberOfContribs = 20 # 50
 start_time = time.time()
 site = pywikibot.Site('en', 'wikipedia')
 stopWords = ['ref', 'REDIRECT', 'cite', 'date', 'article', 'title', 'via', 'flag', 'web', 'date', 'User', 'Talk', 'page', 'This' + 'stop', 'the', 'to', 'and', 'a', 'in', 'it', 'is', 'I', 'that', 'had', 'on', 'for', 'were', 'was'] + list(STOPWORDS)
+stopWordSet = make_stopword_set(stopWords)
+prefetchedContribs = {} # usercontribs entries fetched through a wiki_client, by username
+workerCount = os.cpu_count() # number of processes rendering users' graphs at once
 
 
 def temp():
@@ -40,13 +49,18 @@ def get_flagged_account_list():
 def sort_by_birth(userList):
     noneUserList = []
     sortedUserList = []
+
+    # Every registration date is fetched into the shared user cache in a few batched requests
+    prefetch_users(site, [userList[i][0] for i in range(0, len(userList))])
+
     for i in range (0, len(userList)):
         user = pywikibot.User(site, userList[i][0])
+        registration = get_user(site, userList[i][0])["registration"]
 
-        if user.registration() != None:
-            sortedUserList.append([user, userList[i][1], user.registration()])
+        if registration != None:
+            sortedUserList.append([user, userList[i][1], registration])
         else:
-            noneUserList.append([user, userList[i][1], user.registration()])
+            noneUserList.append([user, userList[i][1], registration])
         
     sortedUserList = sorted(sortedUserList, key=lambda x:x[2])[:]
     sortedUserList += noneUserList
@@ -55,62 +69,48 @@ def sort_by_birth(userList):
 
 
 
-# get_contribs() takes in a user account and a number of edits
-# returns a ditionary of user contribution information
-def get_contribs(user, num):
-    contrib = user.contributions(num)
-    return contrib
+# prefetch_contribs takes in a list of user information and a number of edits
+# when requests go through a wiki_client, it fetches every user's contributions concurrently up front
+def prefetch_contribs(userList, num):
+    client = get_default_client()
+    if client:
+        prefetchedContribs.update(client.contributions_many([userList[i][0].username for i in range(0, len(userList))], num))
+
 
 
 # get_edit() takes in a user account and a number of edits
-# returns a list of contribution data
+# returns a list of the user's edits, read from the edit warehouse if one is set and otherwise
+# fetched with one contributions query and batched revision requests
 def get_edit(user, num):
-    edit = list(map(get_edit_from_contrib, get_contribs(user, num)))
-    return edit
+    warehouse = get_default_warehouse()
+    if warehouse:
+        return warehouse.get_user_edits(site, user.username, num)
+    if user.username in prefetchedContribs:
+        return get_edits_from_contribs(prefetchedContribs[user.username][:num], site)
+    return get_user_edits(user.username, site, num)
 
 
 
-# get_edit_from_contrib() takes in a tuple of contributions
-# Returns a list of what is added and removed within an edit from those contributions
-def get_edit_from_contrib(contrib):
-    page = contrib[0]
-    timestamp = contrib[2]
-
-    return get_edits(page.title(), page.site, 
-        start_time = timestamp + timedelta(seconds=1),
-        end_time = timestamp - timedelta(seconds=1))[0]
+# get_edit_bundle() takes in a user account and a number of edits
+# returns the user's edits, fetched once and shared by the bar graph and word clouds, along with their activity fingerprint
+def get_edit_bundle(user, num):
+    edit = get_edit(user, num)
+    bundle = {'edits': edit, 'fingerprint': ActivityFingerprints.from_edits({user.username: edit})}
+    return bundle
 
 
 
 # get_changed() takes in a list of edits
 # returns a list of strings of what has been changed (based on label) within an edit
 def get_changes(revision, label):
-    changes = []
-
-    for i in range(0, len(revision)):
-        changes += clean_edits(revision[i][label])
-
-    changes = [item for sublist in changes for item in sublist if len(item) > 2]
-
-    return changes
+    return get_changes_batch(revision, label)
 
 
 
 # clean_edits takes in a list of additons or removals and removed non-English words and characters
 # returns a list appeneded with the additional addition or removal
 def clean_edits(edits):
-    words = set(nltk.corpus.words.words())
-    cleanedEdit = []
-
-    for change in edits:
-        edit = " ".join(w for w in nltk.wordpunct_tokenize(change) if w.lower() in words or not w.isalpha()) # removes non-English words
-        edit = re.sub(r'[^a-zA-Z ]', '', edit) # removes non-alphabet characters
-
-        if(edits and edit.strip()):
-            wordList = re.sub("[^\w]", " ",  edit).split()
-            cleanedEdit.append(wordList)
-
-    return cleanedEdit
+    return clean_changes(edits)
 
 
 
@@ -126,18 +126,15 @@ def get_removals(edit):
 
 
 
-# make_word_cloud takes in a list of words, a tag to say if they were removals or additions, a user name, and a flag status
-# it returns a word cloud
-def make_word_cloud(originalWordList, user, tag, noFlag, num):
+# make_word_cloud takes in a list of words, a user name and a tag to say if they were removals or additions
+# it returns a list containing the word cloud as an RGB image array
+def make_word_cloud(originalWordList, user, tag):
     cloudList = []
     fontColor = 'Greens'
     if tag == 'Removals':
         fontColor = 'Blues_r'
 
-    status = 'Not Flagged'
-    if noFlag:
-        status = 'Flagged'
-    wordList = [w for w in originalWordList if w.lower() not in (s.lower() for s in stopWords)]
+    wordList = remove_stopwords(originalWordList, stopWordSet)
     if not wordList:
         wordList += ['null']
         
@@ -145,25 +142,22 @@ def make_word_cloud(originalWordList, user, tag, noFlag, num):
 
     print(user, wordList)
     wordcloud = WordCloud(stopwords = None, width = 800, height = 400, colormap = fontColor).generate(unique_string)
-    fig = plt.figure(figsize=(15,8))
-    plt.title(user.username + " - " + str(user.registration())[:10] + " - " + status + " - " + str(num) + " Contributions" + " - " + tag)
-
-    wordcloud.to_file(tag + ".png")
-    cloudList.append(fig)
-    plt.close()
+    cloudList.append(wordcloud.to_array())
 
     return cloudList
 
 
 
 # get_word_cloud calls make_word_cloud twice, once for additions and once for removals
-# It returns a list of word clouds.
-def get_word_cloud(user, num, flag):
-    edit = get_edit(user, num)
+# It returns a list containing the additions and removals word cloud images.
+def get_word_cloud(user, num, flag, bundle=None):
+    if bundle is None:
+        bundle = get_edit_bundle(user, num)
+    edit = bundle['edits']
     userWordCloudList = []
 
-    additions = make_word_cloud(get_additions(edit), user, 'Additions', flag, num)
-    removals = make_word_cloud(get_removals(edit), user, 'Removals', flag, num)
+    additions = make_word_cloud(get_additions(edit), user, 'Additions')
+    removals = make_word_cloud(get_removals(edit), user, 'Removals')
 
     userWordCloudList.append(additions + removals)
 
@@ -171,63 +165,30 @@ def get_word_cloud(user, num, flag):
 
 
 
-# get_tags takes in an edit and a tag that serves as a label
-# it returns a list that counts when a tag is counted in a given hour
-def get_tags(contribs, label):
-    tags = []
-    contribByTag = []
-
-    for i in range(0, len(contribs)):
-        if label == 'Mobile': # gets edits with tags for modble edits
-            if 'mobile web edit' in contribs[i]['tags']:
-                contribByTag.append(contribs[i])
-        elif label == 'Non-Mobile': # gets edits with tags not non-mobile edits
-            if 'mobile web edit' not in contribs[i]['tags']:
-                contribByTag.append(contribs[i])
-    
-    return contribByTag
-
-
-
-# get_hours takes in a list of edits and a user to find the times that an edit was made
-# it returns a list of hour times a user made their edits 
-def get_hours(edits, user):
-    hourData = [0] * 24
-
-    for contrib in edits:
-        time = contrib['timestamp']
-        time = time.replace("T", " ")
-        time = time.replace("Z", ".0")
-
-        hours = datetime.strptime(time, '%Y-%m-%d %H:%M:%S.%f')
-        hourData[hours.hour] += 1
-        
-    return hourData
-
-
-
 # get_bar_graph_data takes in a user an a number of edits to gather data on when a user has posted
 # it returns a list of of edit information and graphing traits
-def get_bar_graph_data(user, num):
-    edit = get_edit(user, num)
+def get_bar_graph_data(user, num, bundle=None):
+    if bundle is None:
+        bundle = get_edit_bundle(user, num)
     dataList = []
 
-    graphOne = [get_hours(get_tags(edit, 'Non-Mobile'), user), "Non-Mobile", "hotpink"]
-    graphTwo = [get_hours(get_tags(edit, 'Mobile'), user), "Mobile", "dodgerblue"]
+    # app edits aren't mobile web edits, so they are counted as non-mobile
+    graphOne = [list(bundle['fingerprint'].hour_counts(user.username, ('non-mobile', 'app'))), "Non-Mobile", "hotpink"]
+    graphTwo = [list(bundle['fingerprint'].hour_counts(user.username, ('mobile',))), "Mobile", "dodgerblue"]
     dataList += (graphOne + graphTwo)
 
     return dataList
 
     
 
-# make_bar_graphs creates a bar_graph of the hour of day a user has edited a page
-# it returns a list of hisotgrams
-def make_bar_graph(data, user, flag, num):
+# make_bar_graphs creates a bar_graph of the hour of day a user has edited a page, titled with their registration date
+# it returns a list containing the histogram as an RGB image array
+def make_bar_graph(data, user, flag, num, registration):
     graphList = []
     status = ' '
     colors = [data[2], data[5]]
     legend = [data[1], data[4]]
-    times = [range(24)]
+    times = [*range(24)]
 
     if flag:
         status = 'Flagged'
@@ -237,46 +198,112 @@ def make_bar_graph(data, user, flag, num):
     fig = plt.figure()
     plt.bar(times, data[0], color = colors[0], alpha = 0.5, width = 0.95)
     plt.bar(times, data[3], color = colors[1], alpha = 0.5, width = 0.95)
-    plt.title(user.username + " - " + str(user.registration())[:10] + " - " + status, fontsize = 20)
+    plt.title(user.username + " - " + str(registration)[:10] + " - " + status, fontsize = 20)
     plt.ylabel('Number of Edits')
     plt.xlabel('Hour of the Day')
     plt.xticks(np.arange(min(times), max(times)+1, 1))
     plt.legend(labels = legend)
 
-    plt.savefig('hour_of_edit.png')
-    graphList.append(fig)
+    graphList.append(figure_to_array(fig))
+    plt.close(fig)
     
     return graphList
 
 
 
-# write_PDF creats a PDF page of the word clouds and bar_graphs for a list of users
-# no return value
-def write_PDF(userList):
-    pdf = PdfPages('info.pdf')
-    rows = 3
+# figure_to_array takes in a matplotlib figure
+# it returns the drawn figure as an RGB image array, without saving it to a file
+def figure_to_array(fig):
+    fig.canvas.draw()
+    return np.asarray(fig.canvas.buffer_rgba())[:, :, :3].copy()
+
+
+
+# init_worker takes in the prefetched contributions and the default client, edit cache and warehouse of the main process
+# it sets up a worker process to draw graphs without a display and to fetch edits the same way as the main process
+# they are passed in rather than inherited, since a spawned worker (the default on Windows and macOS) starts with none of them
+def init_worker(contribs, client, cache, warehouse):
+    plt.switch_backend('Agg')
+    prefetchedContribs.update(contribs)
+    set_default_client(client)
+    set_default_cache(cache)
+    set_default_warehouse(warehouse)
+
+
+
+# render_user takes in a user name, their flag status, a number of edits and their registration date
+# it renders the user's bar graph and word clouds (in a worker process) and returns the images and the time taken
+def render_user(job):
+    username, flag, num, registration = job
+    renderStart = time.time()
+    user = pywikibot.User(site, username)
 
-    for i in range(0, len(userList), rows):
-        fig, axarr = plt.subplots(rows, 3, figsize=(50, 30))
-        for row in range(i, min(i+rows, len(userList))):
-            bar_graphs = make_bar_graph(get_bar_graph_data(userList[row][0], numberOfContribs), userList[row][0], userList[row][1], numberOfContribs)
-            wordClouds = get_word_cloud(userList[row][0], numberOfContribs, userList[row][1])
+    bundle = get_edit_bundle(user, num) # fetched once for both graphs
+    barGraphs = make_bar_graph(get_bar_graph_data(user, num, bundle), user, flag, num, registration)
+    wordClouds = get_word_cloud(user, num, flag, bundle)
 
-            axarr[row % rows][0].imshow(bar_graphs)
-            axarr[row % rows][1].imshow(np.array(wordClouds))
-            axarr[row % rows][2].imshow(plt.imread("hour_of_edit.png"))  # Assuming "hour_of_edit.png" is a valid image file path
+    images = barGraphs + wordClouds[0]
+    return images, time.time() - renderStart
 
-            for ax in axarr[row % rows]:
-                ax.axis('off')
 
-        pdf.savefig(fig, orientation='landscape')
-        plt.close(fig)
 
-    pdf.close()
+# render_users takes in a list of user information and a number of worker processes
+# it renders the users' images in a process pool and yields them in the same order as the list
+# at most two jobs per worker are queued, so only a few users' images are held in memory at once
+def render_users(userList, workers):
+    renderStart = time.time()
+    # registration dates for the graph titles come from the shared user cache, so the workers don't look them up again
+    prefetch_users(site, [userList[i][0].username for i in range(0, len(userList))])
+    jobs = iter([(userList[i][0].username, userList[i][1], numberOfContribs, get_user(site, userList[i][0].username)["registration"]) for i in range(0, len(userList))])
+    rendered = 0
+    userTime = 0
+
+    workerState = (prefetchedContribs, get_default_client(), get_default_cache(), get_default_warehouse())
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=workerState) as executor:
+        pending = deque(executor.submit(render_user, job) for job in islice(jobs, 2 * workers))
+        while pending:
+            images, userRenderTime = pending.popleft().result()
+            pending.extend(executor.submit(render_user, job) for job in islice(jobs, 1))
+            rendered += 1
+            userTime += userRenderTime
+            yield images
+
+    renderTime = time.time() - renderStart
+    print("Rendered %d users with %d workers in %.1f seconds (%.2f seconds of work per user, %.1f seconds of work in total)" % (
+        rendered, workers, renderTime, userTime / max(rendered, 1), userTime))
+
+
+
+# write_pages takes in an open StreamingPdf, an iterable of each user's images and the number of users on a page
+# it lays out and writes each page as soon as its users' images arrive, so only one page of images is in memory at once
+# it returns the number of pages written
+def write_pages(pdf, imageList, rows=3):
+    pages = 0
+    imageList = iter(imageList)
+    pageImages = list(islice(imageList, rows))
+    while pageImages:
+        pdf.add_page(make_page(pageImages, rows))
+        pages += 1
+        pageImages = list(islice(imageList, rows))
+
+    return pages
+
+
+
+# write_PDF creats a PDF page of the word clouds and bar_graphs for a list of users
+# the users' images are rendered by a pool of worker processes, and each page is written as soon as its users are rendered
+# no return value
+def write_PDF(userList, workers=workerCount):
+    prefetch_contribs(userList, numberOfContribs)
+    writeStart = time.time()
+    with StreamingPdf('info.pdf') as pdf:
+        pages = write_pages(pdf, render_users(userList, workers))
+    print("Wrote %d pages in %.1f seconds" % (pages, time.time() - writeStart))
 
 
-write_PDF(sort_by_birth(get_flagged_account_list())) # Creates PDF
-# write_PDF(sort_by_birth(temp())) # Creates PDF
+if __name__ == "__main__":
+    write_PDF(sort_by_birth(get_flagged_account_list())) # Creates PDF
+    # write_PDF(sort_by_birth(temp())) # Creates PDF
 
 
-print("--- %s seconds ---" % (time.time() - start_time))
\ No newline at end of file
+    print("--- %s seconds ---" % (time.time() - start_time))
@@ -0,0 +1,230 @@
+"""Finds accounts that add and remove similar content, using MinHash signatures and locality-sensitive hashing.
+
+Each account's edits are reduced to a set of shingles, which are runs of consecutive cleaned
+words (see text_cleaning) from the text the account added or removed. Two accounts' similarity
+is the Jaccard similarity of their shingle sets. Comparing every pair of accounts exactly is
+quadratic. Instead, each set is summarized by a MinHash signature, whose values agree between
+two sets with a probability equal to their Jaccard similarity. The signatures are split into
+bands, and accounts are only compared if they share a whole band. Pairs above the threshold
+almost always share one, and dissimilar pairs almost never do.
+
+Usage: python account_similarity.py [threshold]
+Compares the content of the accounts in tagged.json and prints the similar pairs.
+"""
+
+import sys
+import zlib
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pywikibot as pwb
+import simplejson as json
+
+from edit_warehouse import get_default_warehouse
+from get_edits import get_user_edits
+from text_cleaning import clean_changes
+
+# The number of consecutive words in a shingle
+SHINGLE_SIZE = 3
+
+# The number of hash functions in a MinHash signature
+NUM_PERM = 128
+
+# The Mersenne prime 2^31 - 1, small enough that a * x + b never overflows 64 bits
+MERSENNE_PRIME = (1 << 31) - 1
+
+def get_shingles(edits, size=SHINGLE_SIZE, labels=("added", "removed")):
+    """Gets the set of shingles in the text an account added or removed.
+
+    Shingles don't cross from one change to the next, and a change with fewer than size words
+    is one shingle of its own. Each shingle is hashed to a 32-bit integer along with its label,
+    so the same words added and removed are different shingles.
+
+    Args:
+        edits (list): The account's edit dicts, which must have their diffs.
+        size (int): The number of consecutive words in a shingle.
+        labels (tuple): The edit dict keys to read the text from.
+
+    Returns:
+        set: The hashed shingles.
+    """
+    shingles = set()
+    for label in labels:
+        for edit in edits:
+            for words in clean_changes(edit[label]):
+                words = [word.lower() for word in words]
+                for i in range(max(len(words) - size, 0) + 1):
+                    shingles.add(zlib.crc32((label + " " + " ".join(words[i:i + size])).encode()))
+    return shingles
+
+def jaccard(a, b):
+    """Gets the Jaccard similarity of two sets, which is 0 if both are empty."""
+    union = len(a | b)
+    return len(a & b) / union if union else 0.0
+
+class MinHasher:
+    """Makes MinHash signatures with num_perm universal hash functions (a * x + b) mod MERSENNE_PRIME."""
+
+    def __init__(self, num_perm=NUM_PERM, seed=0):
+        """
+        Args:
+            num_perm (int): The number of hash functions, and so the length of each signature.
+            seed (int): The seed the hash functions are drawn with. Signatures can only be compared
+                if they were made with the same num_perm and seed.
+        """
+        rng = np.random.default_rng(seed)
+        self.num_perm = num_perm
+        self.a = rng.integers(1, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+        self.b = rng.integers(0, MERSENNE_PRIME, num_perm, dtype=np.uint64)
+
+    def signature(self, shingles, chunk_size=4096):
+        """Gets the MinHash signature of a set of hashed shingles.
+
+        Args:
+            shingles (set): The shingles, as integers.
+            chunk_size (int): The number of shingles hashed at once, which bounds the memory used.
+
+        Returns:
+            numpy.ndarray: The minimum of each hash function over the shingles, as uint64. An empty
+                set's signature is all MERSENNE_PRIME.
+        """
+        signature = np.full(self.num_perm, MERSENNE_PRIME, dtype=np.uint64)
+        values = np.fromiter(shingles, dtype=np.uint64, count=len(shingles)) % np.uint64(MERSENNE_PRIME)
+        for i in range(0, len(values), chunk_size):
+            hashes = (self.a[:, None] * values[None, i:i + chunk_size] + self.b[:, None]) % np.uint64(MERSENNE_PRIME)
+            np.minimum(signature, hashes.min(axis=1), out=signature)
+        return signature
+
+def choose_bands(num_perm, threshold, recall=0.95):
+    """Chooses how to split signatures into bands for a Jaccard threshold.
+
+    Two sets with Jaccard similarity s share a band with probability 1 - (1 - s^rows)^bands.
+    Of the splits that find a pair right at the threshold with at least the given probability,
+    the one with the least chance of sharing a band below the threshold (false positives,
+    which each cost an exact comparison) is chosen.
+
+    Returns:
+        tuple: The number of bands and the number of rows in each band.
+    """
+    splits = [(num_perm // rows, rows) for rows in range(1, num_perm + 1) if num_perm % rows == 0]
+    below = np.linspace(0, threshold, 100, endpoint=False)
+
+    def probability(split, similarity):
+        bands, rows = split
+        return 1 - (1 - similarity ** rows) ** bands
+
+    eligible = [split for split in splits if probability(split, threshold) >= recall]
+    if not eligible:
+        return max(splits, key=lambda split: probability(split, threshold))
+    return min(eligible, key=lambda split: probability(split, below).sum())
+
+class LshIndex:
+    """An index of MinHash signatures that finds the keys likely to be above a Jaccard threshold
+    of each other without comparing every pair.
+    """
+
+    def __init__(self, threshold=0.5, num_perm=NUM_PERM, recall=0.95):
+        """
+        Args:
+            threshold (float): The Jaccard similarity the index is tuned to find pairs above.
+            num_perm (int): The length of the signatures that will be added.
+            recall (float): The least probability of finding a pair right at the threshold.
+                Pairs further above it are more likely to be found.
+        """
+        self.threshold = threshold
+        self.num_bands, self.rows = choose_bands(num_perm, threshold, recall)
+        # The keys whose signatures have each band's values, per band
+        self.buckets = [defaultdict(list) for _ in range(self.num_bands)]
+        self.signatures = {}
+
+    def band_keys(self, signature):
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.num_bands)]
+
+    def add(self, key, signature):
+        """Adds a key's signature. Each key must only be added once."""
+        self.signatures[key] = signature
+        for buckets, band_key in zip(self.buckets, self.band_keys(signature)):
+            buckets[band_key].append(key)
+
+    def query(self, signature):
+        """Gets the keys that share at least one band with a signature."""
+        return {key for buckets, band_key in zip(self.buckets, self.band_keys(signature)) for key in buckets.get(band_key, [])}
+
+    def candidate_pairs(self):
+        """Gets every pair of keys that share at least one band, each as a (key, key) tuple in the order they were added."""
+        pairs = set()
+        for buckets in self.buckets:
+            for keys in buckets.values():
+                # Keys are appended to buckets in the order they were added
+                if len(keys) > 1:
+                    pairs.update(combinations(keys, 2))
+        return pairs
+
+    def estimate(self, key_a, key_b):
+        """Estimates the Jaccard similarity of two keys as the share of their signatures' values that agree."""
+        return float(np.mean(self.signatures[key_a] == self.signatures[key_b]))
+
+def find_similar_accounts(shingle_sets, threshold=0.5, num_perm=NUM_PERM, seed=0):
+    """Finds the pairs of accounts whose shingle sets are at least threshold similar.
+
+    Candidate pairs are found with an LshIndex, then their exact Jaccard similarity is checked,
+    so no pair below the threshold is returned, though a few above it may be missed.
+    Accounts without any shingles are left out.
+
+    Args:
+        shingle_sets (dict): The shingle set of each account, from get_shingles, keyed by username.
+        threshold (float): The Jaccard similarity a pair must have.
+        num_perm (int): The length of the MinHash signatures.
+        seed (int): The seed the MinHash functions are drawn with.
+
+    Returns:
+        pandas.DataFrame: The pairs, with the columns account_a, account_b, jaccard and estimate
+            (the MinHash estimate), most similar first.
+    """
+    hasher = MinHasher(num_perm, seed)
+    index = LshIndex(threshold, num_perm)
+    for account, shingles in shingle_sets.items():
+        if shingles:
+            index.add(account, hasher.signature(shingles))
+
+    rows = []
+    for account_a, account_b in index.candidate_pairs():
+        similarity = jaccard(shingle_sets[account_a], shingle_sets[account_b])
+        if similarity >= threshold:
+            rows.append((account_a, account_b, similarity, index.estimate(account_a, account_b)))
+    pairs = pd.DataFrame(rows, columns=["account_a", "account_b", "jaccard", "estimate"])
+    return pairs.sort_values(["jaccard", "account_a", "account_b"], ascending=[False, True, True], ignore_index=True)
+
+def get_account_shingles(usernames, site, max_edits=500, size=SHINGLE_SIZE):
+    """Gets the shingle set of each of a list of accounts from their most recent edits, read from
+    the edit warehouse if one is set and otherwise retrieved from the API.
+
+    Returns:
+        dict: The shingle set of each account, keyed by username.
+    """
+    warehouse = get_default_warehouse()
+    shingle_sets = {}
+    for username in usernames:
+        if warehouse:
+            edits = warehouse.get_user_edits(site, username, max_edits)
+        else:
+            edits = get_user_edits(username, site, max_edits)
+        shingle_sets[username] = get_shingles(edits, size)
+    return shingle_sets
+
+def main():
+    threshold = float(sys.argv[1]) if len(sys.argv) > 1 else 0.5
+    site = pwb.Site("en", "wikipedia")
+    with open("tagged.json", "r") as tagged:
+        flags = json.load(tagged)
+
+    pairs = find_similar_accounts(get_account_shingles(list(flags), site), threshold)
+    pairs["flagged_a"] = pairs["account_a"].map(flags)
+    pairs["flagged_b"] = pairs["account_b"].map(flags)
+    pd.set_option("display.max_rows", None)
+    print(pairs)
+
+if __name__ == "__main__":
+    main()
@@ -4,6 +4,7 @@ import csv
 import numpy as np
 from datetime import datetime
 import matplotlib.pyplot as plt
+from user_info import get_user, prefetch_users
 
 site = pywikibot.Site('en', 'wikipedia')
 user_list = ['Doug butler', 'Doug', 'John']
@@ -14,9 +15,12 @@ def get_info(users):
     column_names = ['Username', 'Registered', 'Anonymous', 'Account Creation', 'Edit Count', 'Gender', 'Groups', 'Rights']
     accounts = []
 
-    for users in user_list:
-        user = pywikibot.User(site, users)
-        accounts.append([user.username, user.isRegistered(), user.isAnonymous(), user.getprops()['registration'], user.editCount(), user.gender(), user.groups(), user.rights()])
+    # Every user's information is fetched into the shared user cache in a few batched requests
+    prefetch_users(site, users)
+    for username in users:
+        user = pywikibot.User(site, username)
+        info = get_user(site, username)
+        accounts.append([user.username, info['exists'], user.isAnonymous(), info['registration'], info['editcount'], info['gender'], info['groups'], info['rights']])
 
     df = pd.DataFrame(accounts, columns = column_names)
     print(df)
@@ -0,0 +1,107 @@
+"""Summarizes when and from which kind of device accounts edit, as comparable activity fingerprints.
+
+Each account's edits are counted by device, weekday and hour of day (UTC). All of the
+accounts' timestamps are parsed into one NumPy datetime64 array, and the counts are made
+with a single bincount, so many accounts can be fingerprinted at once.
+"""
+
+import numpy as np
+
+# The kinds of device an edit can be made from, found from its tags
+DEVICES = ("non-mobile", "mobile", "app")
+MOBILE_WEB_TAG = "mobile web edit"
+APP_TAG = "mobile app edit"
+
+NUM_WEEKDAYS = 7
+NUM_HOURS = 24
+FINGERPRINT_SIZE = len(DEVICES) * NUM_WEEKDAYS * NUM_HOURS
+
+def parse_timestamps(timestamps):
+    """Parses API timestamps, e.g. "2022-04-01T12:34:56Z", into an array of datetime64[s].
+
+    Args:
+        timestamps (list): The timestamps, in UTC.
+
+    Returns:
+        numpy.ndarray: The parsed timestamps.
+    """
+    # Casting to 19 characters drops the trailing "Z", which datetime64 doesn't accept
+    return np.asarray(timestamps, dtype="U19").astype("datetime64[s]")
+
+def get_hours_and_weekdays(times):
+    """Gets the hour of day and weekday (0 for Monday) of each of an array of datetime64 times."""
+    days = times.astype("datetime64[D]")
+    hours = (times.astype("datetime64[h]") - days).astype(np.int64)
+    # 1970-01-01 was a Thursday
+    weekdays = (days.astype(np.int64) + 3) % NUM_WEEKDAYS
+    return hours, weekdays
+
+def get_device(tags):
+    """Gets the index in DEVICES of the kind of device an edit with the given tags was made from."""
+    if APP_TAG in tags:
+        return 2
+    if MOBILE_WEB_TAG in tags:
+        return 1
+    return 0
+
+class ActivityFingerprints:
+    """The number of edits each account made on each kind of device, on each weekday, in each hour."""
+
+    def __init__(self, users, counts):
+        """
+        Args:
+            users (list): The accounts' usernames.
+            counts (numpy.ndarray): The edit counts, with the shape (users, devices, weekdays, hours).
+        """
+        self.users = list(users)
+        self.index = {user: i for i, user in enumerate(self.users)}
+        self.counts = counts
+
+    @classmethod
+    def from_edits(cls, user_edits):
+        """Counts the edits of many accounts in one pass.
+
+        Args:
+            user_edits (dict): The list of each account's edit dicts, keyed by username.
+
+        Returns:
+            ActivityFingerprints: The accounts' fingerprints, in the order of user_edits.
+        """
+        edits = [edit for edit_list in user_edits.values() for edit in edit_list]
+        user_ids = np.repeat(np.arange(len(user_edits)), [len(edit_list) for edit_list in user_edits.values()])
+        hours, weekdays = get_hours_and_weekdays(parse_timestamps([edit["timestamp"] for edit in edits]))
+        devices = np.fromiter((get_device(edit["tags"]) for edit in edits), dtype=np.int64, count=len(edits))
+
+        cells = ((user_ids * len(DEVICES) + devices) * NUM_WEEKDAYS + weekdays) * NUM_HOURS + hours
+        counts = np.bincount(cells, minlength=len(user_edits) * FINGERPRINT_SIZE)
+        return cls(user_edits, counts.reshape(len(user_edits), len(DEVICES), NUM_WEEKDAYS, NUM_HOURS))
+
+    def hour_counts(self, user, devices=DEVICES):
+        """Gets the number of edits an account made in each hour of the day, on any weekday.
+
+        Args:
+            user (str): The account's username.
+            devices (tuple): The kinds of device to count edits from.
+
+        Returns:
+            numpy.ndarray: The 24 hourly counts.
+        """
+        device_indices = [DEVICES.index(device) for device in devices]
+        return self.counts[self.index[user], device_indices].sum(axis=(0, 1))
+
+    def matrix(self, normalize=True):
+        """Gets every account's fingerprint as a row of FINGERPRINT_SIZE values.
+
+        Args:
+            normalize (bool): Whether to divide each row by the account's number of edits, so that
+                accounts with different amounts of activity can be compared. Accounts without any
+                edits are left as zeros.
+
+        Returns:
+            numpy.ndarray: The fingerprints, with one row per account in the order of users.
+        """
+        matrix = self.counts.reshape(len(self.users), FINGERPRINT_SIZE).astype(np.float64)
+        if normalize:
+            totals = matrix.sum(axis=1, keepdims=True)
+            np.divide(matrix, totals, out=matrix, where=totals > 0)
+        return matrix
@@ -0,0 +1,249 @@
+"""Finds accounts whose activity fingerprints are alike, with a k-nearest-neighbor index.
+
+Each account's fingerprint (see activity_fingerprint) is the share of its edits made on each
+kind of device, on each weekday, in each hour. Accounts are compared by cosine distance or by
+Jensen-Shannon divergence, and the nearest neighbors of every account are found by comparing
+blocks of accounts against all of them at once with matrix products.
+
+Jensen-Shannon divergence (in bits) is never less than the squared Hellinger distance,
+1 - sum(sqrt(p * q)), which is a matrix product of the fingerprints' square roots. The accounts
+nearest by Hellinger distance are checked exactly, and more are only checked when that bound
+can't rule them out, so the neighbors found are exact.
+
+Usage: python activity_neighbors.py [cosine|jensenshannon [k]]
+Compares the activity of the accounts in tagged.json and prints each one's nearest neighbors.
+"""
+
+import sys
+
+import numpy as np
+import pandas as pd
+import pywikibot as pwb
+import simplejson as json
+
+from activity_fingerprint import ActivityFingerprints
+from edit_warehouse import get_default_warehouse
+from get_edits import get_contributions
+from wiki_client import get_default_client
+
+METRICS = ("cosine", "jensenshannon")
+
+# The number of values in the pairs' midpoint distributions computed at once for Jensen-Shannon
+CHUNK_VALUES = 1 << 22
+
+# Slack given to the Hellinger bound, so that rounding never rules out a neighbor
+BOUND_TOLERANCE = 1e-9
+
+def entropies(distributions):
+    """Gets the Shannon entropy, in bits, of each distribution along the last axis."""
+    logs = np.zeros_like(distributions)
+    np.log2(distributions, out=logs, where=distributions > 0)
+    return -(distributions * logs).sum(axis=-1)
+
+def jensen_shannon(p, q, p_entropies=None, q_entropies=None):
+    """Gets the Jensen-Shannon divergence, in bits, between distributions along the last axis.
+
+    The result is between 0 and 1. The distributions' entropies may be given if they are
+    already known, since the divergence is H((p + q) / 2) - (H(p) + H(q)) / 2.
+    """
+    if p_entropies is None:
+        p_entropies = entropies(p)
+    if q_entropies is None:
+        q_entropies = entropies(q)
+    divergence = entropies((p + q) / 2) - (p_entropies + q_entropies) / 2
+    # Rounding can leave identical distributions a tiny bit below 0
+    return np.maximum(divergence, 0)
+
+def smallest(values, k):
+    """Gets the column indices of the k smallest values in each row, smallest first.
+
+    Ties are broken by column index, so the order doesn't depend on how the values were partitioned.
+    """
+    k = min(k, values.shape[1])
+    if k < values.shape[1]:
+        columns = np.argpartition(values, k - 1, axis=1)[:, :k]
+    else:
+        columns = np.broadcast_to(np.arange(k), values.shape)
+    chosen = np.take_along_axis(values, columns, axis=1)
+    order = np.lexsort((columns, chosen), axis=1)
+    return np.take_along_axis(columns, order, axis=1)
+
+class FingerprintIndex:
+    """An index of accounts' activity fingerprints that finds each account's nearest neighbors."""
+
+    def __init__(self, users, matrix, metric="cosine", block_size=1024, candidates=4):
+        """
+        Args:
+            users (list): The accounts' usernames, in the order of matrix's rows.
+            matrix (numpy.ndarray): The accounts' fingerprints, from ActivityFingerprints.matrix.
+                Accounts without any edits are left out of the index.
+            metric (str): "cosine" to rank neighbors by cosine distance, or "jensenshannon" to rank
+                them by Jensen-Shannon divergence in bits. Both distances are between 0 and 1.
+            block_size (int): The number of accounts compared against every account at once, which
+                bounds the memory used to block_size * len(users) distances.
+            candidates (int): For Jensen-Shannon, how many times k accounts to check exactly per account
+                before falling back to every account the Hellinger bound can't rule out.
+        """
+        if metric not in METRICS:
+            raise ValueError("metric must be one of {}, not {!r}".format(METRICS, metric))
+        self.metric = metric
+        self.block_size = block_size
+        self.candidates = candidates
+
+        matrix = np.asarray(matrix, dtype=np.float64)
+        totals = matrix.sum(axis=1)
+        self.users = [user for user, total in zip(users, totals) if total > 0]
+        self.index = {user: i for i, user in enumerate(self.users)}
+        self.distributions = matrix[totals > 0] / totals[totals > 0, None]
+
+        if metric == "cosine":
+            self.vectors = self.distributions / np.linalg.norm(self.distributions, axis=1, keepdims=True)
+        else:
+            # Hellinger distances come from the products of the square roots
+            self.vectors = np.sqrt(self.distributions)
+            self.entropies = entropies(self.distributions)
+
+    @classmethod
+    def from_fingerprints(cls, fingerprints: ActivityFingerprints, metric="cosine", **kwargs):
+        """Makes an index of every account in an ActivityFingerprints."""
+        return cls(fingerprints.users, fingerprints.matrix(), metric, **kwargs)
+
+    def __len__(self):
+        return len(self.users)
+
+    def search(self, rows, k):
+        """Finds the k nearest neighbors of some of the indexed accounts, leaving out each account itself.
+
+        Args:
+            rows (numpy.ndarray): The indices of the accounts, at most block_size of them.
+            k (int): The number of neighbors to find for each account.
+
+        Returns:
+            tuple: The neighbors' indices and their distances, each an array of shape (len(rows), k),
+                nearest first.
+        """
+        k = max(min(k, len(self) - 1), 0)
+        if k == 0:
+            return np.empty((len(rows), 0), dtype=np.int64), np.empty((len(rows), 0))
+        products = self.vectors[rows] @ self.vectors.T
+        # An account is never its own neighbor
+        products[np.arange(len(rows)), rows] = -np.inf
+
+        if self.metric == "cosine":
+            distances = np.maximum(1 - products, 0)
+            neighbors = smallest(distances, k)
+            return neighbors, np.take_along_axis(distances, neighbors, axis=1)
+
+        hellinger = 1 - products
+        # One more than the candidates, so the nearest account left unchecked bounds the rest
+        shortlist = smallest(hellinger, min(self.candidates * k, len(self) - 1) + 1)
+        candidates, next_bound = shortlist[:, :-1], np.take_along_axis(hellinger, shortlist[:, -1:], axis=1)[:, 0]
+        divergences = self.divergences(rows, candidates)
+        order = smallest(divergences, k)
+        neighbors = np.take_along_axis(candidates, order, axis=1)
+        distances = np.take_along_axis(divergences, order, axis=1)
+
+        # An unchecked account's divergence is at least its squared Hellinger distance, so it can
+        # only be nearer than the kth neighbor if that distance is below the kth divergence
+        for i in np.flatnonzero(distances[:, -1] > next_bound - BOUND_TOLERANCE):
+            within = np.flatnonzero(hellinger[i] <= distances[i, -1] + BOUND_TOLERANCE)
+            row_divergences = self.divergences(rows[i:i + 1], within[None, :])
+            order = smallest(row_divergences, k)[0]
+            neighbors[i], distances[i] = within[order], row_divergences[0, order]
+        return neighbors, distances
+
+    def divergences(self, rows, columns):
+        """Gets the Jensen-Shannon divergence between each account in rows and the accounts in the
+        same row of columns, an array of indices with one row per account.
+        """
+        divergences = np.empty(columns.shape)
+        chunk_size = max(1, CHUNK_VALUES // max(columns.size // len(rows) * self.distributions.shape[1], 1))
+        for start in range(0, len(rows), chunk_size):
+            chunk = slice(start, start + chunk_size)
+            divergences[chunk] = jensen_shannon(self.distributions[rows[chunk], None, :], self.distributions[columns[chunk]],
+                self.entropies[rows[chunk], None], self.entropies[columns[chunk]])
+        return divergences
+
+    def query(self, user, k=10):
+        """Finds an account's k nearest neighbors.
+
+        Args:
+            user (str): The account's username, which must be indexed.
+            k (int): The number of neighbors to find.
+
+        Returns:
+            pandas.DataFrame: The neighbors, with the columns rank (starting at 1), neighbor and
+                distance, nearest first.
+        """
+        neighbors, distances = self.search(np.array([self.index[user]]), k)
+        return pd.DataFrame({
+            "rank": np.arange(1, neighbors.shape[1] + 1),
+            "neighbor": [self.users[i] for i in neighbors[0]],
+            "distance": distances[0]
+        })
+
+    def knn_join(self, k=10):
+        """Finds the k nearest neighbors of every indexed account, comparing block_size accounts at a time.
+
+        Args:
+            k (int): The number of neighbors to find for each account.
+
+        Returns:
+            pandas.DataFrame: One row per account and neighbor, with the columns account, rank
+                (starting at 1), neighbor and distance, nearest pairs first. A pair of accounts
+                appears twice if each is among the other's neighbors.
+        """
+        k = max(min(k, len(self) - 1), 0)
+        neighbors = np.empty((len(self), k), dtype=np.int64)
+        distances = np.empty((len(self), k))
+        for start in range(0, len(self), self.block_size):
+            rows = np.arange(start, min(start + self.block_size, len(self)))
+            neighbors[rows], distances[rows] = self.search(rows, k)
+
+        users = np.array(self.users, dtype=object)
+        table = pd.DataFrame({
+            "account": np.repeat(users, neighbors.shape[1]),
+            "rank": np.tile(np.arange(1, neighbors.shape[1] + 1), len(self)),
+            "neighbor": users[neighbors.ravel()],
+            "distance": distances.ravel()
+        })
+        return table.sort_values(["distance", "account", "rank"], ignore_index=True, kind="stable")
+
+def get_account_fingerprints(usernames, site, max_edits=500):
+    """Gets the activity fingerprints of a list of accounts from their most recent edits, read from
+    the edit warehouse if one is set and otherwise retrieved from the API.
+
+    Returns:
+        ActivityFingerprints: The accounts' fingerprints, in the order of usernames.
+    """
+    warehouse = get_default_warehouse()
+    if warehouse:
+        user_edits = {username: warehouse.get_user_edits(site, username, max_edits, columns=["timestamp", "tags"])
+            for username in usernames}
+        return ActivityFingerprints.from_edits(user_edits)
+
+    # Only the timestamps and tags are needed, which list=usercontribs gives without any diffs
+    client = get_default_client()
+    if client:
+        # The client sends the users' requests concurrently
+        user_edits = client.contributions_many(usernames, max_edits)
+    else:
+        user_edits = {username: get_contributions(username, site, max_edits) for username in usernames}
+    return ActivityFingerprints.from_edits(user_edits)
+
+def main():
+    metric = sys.argv[1] if len(sys.argv) > 1 else "cosine"
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    site = pwb.Site("en", "wikipedia")
+    with open("tagged.json", "r") as tagged:
+        flags = json.load(tagged)
+
+    index = FingerprintIndex.from_fingerprints(get_account_fingerprints(list(flags), site), metric)
+    neighbors = index.knn_join(k)
+    neighbors["flagged_account"] = neighbors["account"].map(flags)
+    neighbors["flagged_neighbor"] = neighbors["neighbor"].map(flags)
+    pd.set_option("display.max_rows", None)
+    print(neighbors)
+
+if __name__ == "__main__":
+    main()
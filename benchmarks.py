@@ -0,0 +1,952 @@
+"""Benchmarks run against a local fake API so that no real wiki is queried.
+
+Usage: python benchmarks.py [benchmark name ...]
+Runs every benchmark if no names are given.
+"""
+
+import collections
+import datetime
+import itertools
+import multiprocessing
+import os
+import random
+import re
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import edit_cache
+import edit_warehouse
+import get_edits
+import nltk
+import numpy as np
+import text_cleaning
+import user_info
+from fake_api import FakeWiki, diff_html
+from test_get_edits import parse_diff_html_bs4
+from wiki_client import WikiClient, normalize_username
+
+def bench_batched_diffs(num_revisions=2000, latency=0.002):
+    """Compares the requests and time needed to diff a page's history one compare
+    request per revision against fetching revision content in batches.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_revisions)
+
+    with wiki.serve(latency=latency) as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        try:
+            results = {}
+            for batch_diffs in (False, True):
+                # The revision listing is the same in both modes, so only the diffing is timed
+                edits = []
+                params = {"action": "query", "prop": "revisions", "titles": "Benchmark page",
+                    "rvprop": "ids|timestamp|user|userid|comment|tags|size|flags", "rvlimit": "max"}
+                while True:
+                    result = server.submit(None, params)
+                    for page in result["query"]["pages"].values():
+                        for rev in page["revisions"]:
+                            get_edits.get_edit_dict(rev, None, edits, diffs=False)
+                    if "continue" not in result:
+                        break
+                    params.update(result["continue"])
+
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                if batch_diffs:
+                    get_edits.add_diffs_batch(edits, None)
+                else:
+                    for edit in edits:
+                        get_edits.add_diffs(edit, None)
+                elapsed = time.perf_counter() - start
+                results[batch_diffs] = edits
+                print("{:<22} {:>6} requests  {:>8.2f} s".format(
+                    "batched diffs:" if batch_diffs else "one compare per edit:", wiki.requests - requests_before, elapsed))
+        finally:
+            get_edits.submit = original_submit
+
+    fields = ("added", "removed", "new_size", "size_delta")
+    failures = ["revision {}: {} differs between modes".format(a["revid"], f)
+        for a, b in zip(results[False], results[True]) for f in fields if a[f] != b[f]]
+    print("Edits whose diff fields differ between modes:", len(failures))
+    exit_on_failures(failures)
+
+    # Edits next to a revision with hidden text have no diff, rather than the whole page's text
+    hidden = set(rev["revid"] for rev in wiki.pages["Benchmark page"]["history"][10::100])
+    for revid in hidden:
+        wiki.revisions[revid]["texthidden"] = True
+    edits = [dict(edit, added=None, removed=None) for edit in results[True]]
+    with wiki.serve() as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        try:
+            get_edits.add_diffs_batch(edits, None)
+        finally:
+            get_edits.submit = original_submit
+    failures = ["revision {}: diff_missing={}".format(edit["revid"], edit.get("diff_missing", False)) for edit in edits
+        if edit.get("diff_missing", False) != (edit["revid"] in hidden or edit["parentid"] in hidden)]
+    print("{} revisions with hidden text, {} edits without a diff".format(
+        len(hidden), sum(edit.get("diff_missing", False) for edit in edits)))
+    exit_on_failures(failures)
+
+def bench_pagination(num_revisions=1000, latency=0.01):
+    """Compares fetching a long page history with one diff worker against several, and
+    shows how quickly the first edit arrives and how early max_edits stops the listing.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_revisions)
+
+    with wiki.serve(latency=latency) as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        try:
+            for batch_diffs in (False, True):
+                for workers in (1, 8):
+                    requests_before = wiki.requests
+                    start = time.perf_counter()
+                    first = None
+                    count = 0
+                    for _ in get_edits.get_edits_async("Benchmark page", None, batch_diffs=batch_diffs,
+                            workers=workers, use_cache=False):
+                        if first is None:
+                            first = time.perf_counter() - start
+                        count += 1
+                    print("batch_diffs={}, {} worker(s): {} edits, {} requests, first edit after {:.2f} s, all after {:.2f} s".format(
+                        batch_diffs, workers, count, wiki.requests - requests_before, first, time.perf_counter() - start))
+
+            requests_before = wiki.requests
+            edits = get_edits.get_edits("Benchmark page", None, max_edits=100, use_cache=False)
+            print("max_edits=100: {} edits, {} requests".format(len(edits), wiki.requests - requests_before))
+        finally:
+            get_edits.submit = original_submit
+
+def bench_iter_edits(revision_counts=(1000, 4000), latency=0.002):
+    """Compares materializing a page's whole history with get_edits against streaming it with
+    iter_edits: counting its edits, reading the diffs of only the newest 100, and stopping at
+    max_edits. Peak memory (including the fake server's) is traced while each history is read.
+    """
+    for num_revisions in revision_counts:
+        wiki = FakeWiki()
+        wiki.add_page("Benchmark page", num_revisions)
+        runs = {
+            "get_edits:": lambda: len(get_edits.get_edits("Benchmark page", None, use_cache=False)),
+            "iter_edits, count only:": lambda: sum(1 for _ in get_edits.iter_edits("Benchmark page", None, use_cache=False)),
+            "iter_edits, 100 diffs:": lambda: sum(len(edit["added"]) > 0 for _, edit in zip(range(100),
+                get_edits.iter_edits("Benchmark page", None, use_cache=False))),
+            "iter_edits, max_edits=10:": lambda: sum(1 for _ in get_edits.iter_edits("Benchmark page", None, max_edits=10, use_cache=False))
+        }
+
+        with wiki.serve(latency=latency) as server:
+            get_edits.submit, original_submit = server.submit, get_edits.submit
+            try:
+                for label, run in runs.items():
+                    requests_before = wiki.requests
+                    tracemalloc.start()
+                    start = time.perf_counter()
+                    count = run()
+                    elapsed = time.perf_counter() - start
+                    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+                    tracemalloc.stop()
+                    print("{} revisions, {:<26} result {}, {} requests, {:.2f} s, peak {:.1f} MiB traced".format(
+                        num_revisions, label, count, wiki.requests - requests_before, elapsed, peak))
+            finally:
+                get_edits.submit = original_submit
+
+def bench_edit_cache(num_revisions=2000, latency=0.002):
+    """Fetches the same page history twice through a fresh on-disk edit cache."""
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_revisions)
+
+    with tempfile.TemporaryDirectory() as directory, wiki.serve(latency=latency) as server:
+        cache = edit_cache.EditCache(os.path.join(directory, "edits.sqlite"))
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        original_cache = edit_cache.get_default_cache()
+        edit_cache.set_default_cache(cache)
+        try:
+            # The diffs from action=compare are cached apart from the local ones, so the last run misses
+            for run, batch_diffs in (("first", True), ("second", True), ("action=compare", False)):
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                edits = get_edits.get_edits("Benchmark page", None, batch_diffs=batch_diffs)
+                print("{} run: {} edits, {} requests, {:.2f} s, {}".format(
+                    run, len(edits), wiki.requests - requests_before, time.perf_counter() - start, cache.stats()))
+        finally:
+            get_edits.submit = original_submit
+            edit_cache.set_default_cache(original_cache)
+            cache.close()
+
+def bench_wiki_client(num_users=1000, latency=0.02, max_per_host=16):
+    """Compares fetching the contributions of many accounts one blocking request at a time
+    against the pooled asyncio client, with some requests throttled by the server.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_users * 3, num_users=num_users)
+    usernames = list(wiki.users)
+
+    with wiki.serve(latency=latency) as server:
+        start = time.perf_counter()
+        for username in usernames:
+            server.submit(None, {"action": "query", "list": "usercontribs", "ucuser": username, "uclimit": 20})
+        elapsed = time.perf_counter() - start
+        print("serial:      {} accounts in {:.2f} s ({:.0f} accounts/s)".format(len(usernames), elapsed, len(usernames) / elapsed))
+
+    with wiki.serve(latency=latency, error_rate=0.05) as server:
+        with WikiClient(server.url, max_per_host=max_per_host, backoff=0.05) as client:
+            start = time.perf_counter()
+            contribs = client.contributions_many(usernames, 20)
+            elapsed = time.perf_counter() - start
+            print("wiki_client: {} accounts in {:.2f} s ({:.0f} accounts/s), {} requests, {} retried after 429/maxlag".format(
+                len(contribs), elapsed, len(contribs) / elapsed, client.client.requests, client.client.retries))
+
+            start = time.perf_counter()
+            users = client.users(usernames)
+            print("wiki_client: user info for {} accounts in {:.2f} s".format(len(users), time.perf_counter() - start))
+
+def bench_user_prefetch(num_revisions=3000, num_users=600, latency=0.005):
+    """Compares looking up the author of each edit one user at a time against prefetching
+    every author with batched list=users requests, then checks that each user got their own
+    entry, with IP addresses (listed first by the API) and non-normalized names mixed in.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_revisions, num_users=num_users)
+    edits = [rev for rev in wiki.pages["Benchmark page"]["history"]]
+
+    with wiki.serve(latency=latency) as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        original_cache = user_info.get_default_user_cache()
+        try:
+            for prefetch in (False, True):
+                cache = user_info.UserCache()
+                user_info.set_default_user_cache(cache)
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                if prefetch:
+                    user_info.prefetch_edit_users(None, edits)
+                few_posts = sum(1 for edit in edits if edit["userid"] != 0 and user_info.get_user(None, edit["user"])["editcount"] <= 10)
+                print("{:<18} {} edits by {} users ({} by users with few posts), {} requests, {:.2f} s".format(
+                    "batched prefetch:" if prefetch else "one user at a time:", len(edits), cache.stats()["size"], few_posts,
+                    wiki.requests - requests_before, time.perf_counter() - start))
+
+            cache = user_info.UserCache()
+            user_info.set_default_user_cache(cache)
+            # Every author, and some again with a lowercase first letter, which the API capitalizes
+            usernames = list(dict.fromkeys(edit["user"] for edit in edits))
+            usernames += [username[0].lower() + username[1:] for username in usernames[::3] if wiki.users[username]["userid"]]
+            user_info.prefetch_users(None, usernames)
+            failures = []
+            for username in usernames:
+                found = user_info.get_user(None, username)
+                user = wiki.users[normalize_username(username)]
+                expected = (user["userid"] != 0, user["editcount"] if user["userid"] else 0)
+                if (found["exists"], found["editcount"]) != expected:
+                    failures.append("{}: got exists={}, editcount={}, expected {}".format(
+                        username, found["exists"], found["editcount"], expected))
+            print("{} users checked ({} IP addresses), {} wrong".format(
+                len(usernames), sum(wiki.users[normalize_username(username)]["userid"] == 0 for username in usernames), len(failures)))
+            exit_on_failures(failures)
+        finally:
+            get_edits.submit = original_submit
+            user_info.set_default_user_cache(original_cache)
+
+def bench_user_cache(num_users=500, latency=0.005):
+    """Looks up a report's users the way each module does (sorting by registration, the graph
+    titles, the user metrics and the account table), first with a separate cache per module,
+    then with one shared cache, then from a persisted cache in a later run, before and after
+    its entries expire.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_users * 4, num_users=num_users)
+    usernames = [username for username, user in wiki.users.items() if user["userid"] != 0]
+    lookups = {
+        "sort_by_birth": lambda: [user_info.get_user(None, username)["registration"] for username in usernames],
+        "graph titles": lambda: [user_info.get_user(None, username)["registration"] for username in usernames],
+        "user metrics": lambda: [user_info.get_user(None, username)["editcount"] <= 10 for username in usernames],
+        "account table": lambda: [user_info.get_user(None, username)["rights"] for username in usernames]
+    }
+
+    def run(label, make_cache, per_module):
+        requests_before = wiki.requests
+        start = time.perf_counter()
+        cache = make_cache()
+        for lookup in lookups.values():
+            if per_module:
+                cache.close()
+                cache = make_cache()
+            user_info.set_default_user_cache(cache)
+            user_info.prefetch_users(None, usernames)
+            lookup()
+        stats = cache.stats()
+        cache.close()
+        print("{:<24} {} users, {} requests, {:.2f} s, hit rate {:.0%} ({} evictions)".format(
+            label, len(usernames), wiki.requests - requests_before, time.perf_counter() - start, stats["hit_rate"], stats["evictions"]))
+
+    with tempfile.TemporaryDirectory() as directory, wiki.serve(latency=latency) as server:
+        path = os.path.join(directory, "users.sqlite")
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        original_cache = user_info.get_default_user_cache()
+        try:
+            run("cache per module:", user_info.UserCache, True)
+            run("shared cache:", lambda: user_info.UserCache(path=path), False)
+            run("persisted, next run:", lambda: user_info.UserCache(path=path), False)
+            # Let the persisted entries outlive a one second TTL
+            time.sleep(1.1)
+            run("persisted, expired:", lambda: user_info.UserCache(path=path, ttl=1), False)
+        finally:
+            get_edits.submit = original_submit
+            user_info.set_default_user_cache(original_cache)
+
+def bench_user_edits(num_users=50, num_contribs=20, latency=0.005):
+    """Compares retrieving each user's report edits with one get_edits query per contribution
+    (done twice, for the bar graph and the word clouds) against one usercontribs query and
+    batched revision requests per user.
+    """
+    wiki = FakeWiki()
+    for i in range(5):
+        wiki.add_page("Benchmark page %d" % i, 1000, num_users=num_users)
+    usernames = [username for username, user in wiki.users.items() if len(user["contribs"]) >= num_contribs][:num_users]
+
+    with wiki.serve(latency=latency) as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        try:
+            requests_before = wiki.requests
+            start = time.perf_counter()
+            for username in usernames:
+                contribs = get_edits.get_contributions(username, None, num_contribs)
+                for _ in ("bar graph", "word clouds"):
+                    for contrib in contribs:
+                        timestamp = datetime.datetime.strptime(contrib["timestamp"], "%Y-%m-%dT%H:%M:%SZ")
+                        get_edits.get_edits(contrib["title"], None, start_time=timestamp + datetime.timedelta(seconds=1),
+                            end_time=timestamp - datetime.timedelta(seconds=1), use_cache=False)[0]
+            print("per contribution: {} users, {} requests, {:.2f} s".format(
+                len(usernames), wiki.requests - requests_before, time.perf_counter() - start))
+
+            requests_before = wiki.requests
+            start = time.perf_counter()
+            for username in usernames:
+                get_edits.get_user_edits(username, None, num_contribs, use_cache=False)
+            print("per user:         {} users, {} requests, {:.2f} s".format(
+                len(usernames), wiki.requests - requests_before, time.perf_counter() - start))
+        finally:
+            get_edits.submit = original_submit
+
+def bench_diff_parsing(num_revisions=1000, repeats=3):
+    """Compares the throughput of parse_diff_html and the original BeautifulSoup parser over the
+    compare output of a fake page's history. Their results are checked in test_get_edits.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_revisions)
+    diffs = [diff_html(wiki.revisions[rev["parentid"]]["text"] if rev["parentid"] else "", rev["text"])
+        for rev in wiki.pages["Benchmark page"]["history"]]
+
+    size = sum(len(diff.encode()) for diff in diffs) / 2 ** 20
+    for name, parse in (("BeautifulSoup:", parse_diff_html_bs4), ("parse_diff_html:", get_edits.parse_diff_html)):
+        elapsed = min(timed(lambda: [parse(diff) for diff in diffs]) for _ in range(repeats))
+        print("{:<17} {:.3f} s, {:.0f} diffs/s, {:.1f} MiB/s".format(name, elapsed, len(diffs) / elapsed, size / elapsed))
+
+def exit_on_failures(failures):
+    """Prints a check's failures and exits with status 1 if there were any."""
+    for failure in failures:
+        print("FAILED:", failure)
+    if failures:
+        sys.exit(1)
+
+def timed(function):
+    start = time.perf_counter()
+    function()
+    return time.perf_counter() - start
+
+def bench_text_cleaning(num_revisions=1000):
+    """Compares the per-edit cost of the original clean_edits, which rebuilt the vocabulary
+    set on every call, against text_cleaning on the diffs of a generated page history.
+    """
+    wiki = FakeWiki()
+    wiki.add_page("Benchmark page", num_revisions)
+    edits = []
+    for rev in wiki.pages["Benchmark page"]["history"]:
+        parent = wiki.revisions.get(rev["parentid"], {"text": ""})
+        added, removed = get_edits.diff_texts(parent["text"], rev["text"])
+        edits.append({"added": added, "removed": removed})
+
+    def original_clean_edits(edits):
+        words = set(nltk.corpus.words.words())
+        cleanedEdit = []
+        for change in edits:
+            edit = " ".join(w for w in nltk.wordpunct_tokenize(change) if w.lower() in words or not w.isalpha())
+            edit = re.sub(r'[^a-zA-Z ]', '', edit)
+            if(edits and edit.strip()):
+                wordList = re.sub(r"[^\w]", " ",  edit).split()
+                cleanedEdit.append(wordList)
+        return cleanedEdit
+
+    sample = edits[:50]
+    start = time.perf_counter()
+    for edit in sample:
+        for label in ("added", "removed"):
+            original_clean_edits(edit[label])
+    print("original clean_edits: {:.3f} ms per edit".format((time.perf_counter() - start) / len(sample) * 1000))
+
+    text_cleaning.get_vocabulary()
+    start = time.perf_counter()
+    for label in ("added", "removed"):
+        text_cleaning.get_changes_batch(edits, label)
+    print("text_cleaning:        {:.3f} ms per edit".format((time.perf_counter() - start) / len(edits) * 1000))
+
+def measure_report_memory(num_users, streamed):
+    """Writes a report of synthetic users' images and gets the process's peak RSS, in MiB,
+    before and after. Run in a fresh process so that each measurement starts from the same baseline.
+
+    The report is either streamed with SP500.write_pages, or written the original way: every
+    user's images kept in a list, then laid out with matplotlib and saved with PdfPages.
+    """
+    import matplotlib
+    matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
+    from matplotlib.backends.backend_pdf import PdfPages
+    import SP500
+    from report_pdf import StreamingPdf
+
+    def images():
+        # The sizes that make_bar_graph and make_word_cloud render at, different images for each user
+        for i in range(num_users):
+            yield [np.full((480, 640, 3), i % 256, dtype=np.uint8),
+                np.full((400, 800, 3), (i + 85) % 256, dtype=np.uint8),
+                np.full((400, 800, 3), (i + 170) % 256, dtype=np.uint8)]
+
+    # ru_maxrss is in KiB on Linux
+    before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "info.pdf")
+        if streamed:
+            with StreamingPdf(path) as pdf:
+                pages = SP500.write_pages(pdf, images())
+        else:
+            imageList = list(images())
+            pages = 0
+            with PdfPages(path) as pdf:
+                for i in range(0, num_users, 3):
+                    fig, axarr = plt.subplots(3, 3, figsize=(50, 30))
+                    for row in range(i, min(i + 3, num_users)):
+                        for column in range(3):
+                            axarr[row % 3][column].imshow(imageList[row][column])
+                            axarr[row % 3][column].axis("off")
+                    pdf.savefig(fig, orientation="landscape")
+                    plt.close(fig)
+                    pages += 1
+    after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return before, after, pages, time.perf_counter() - start
+
+def bench_report_memory(user_counts=(10, 100, 1000), max_original=100):
+    """Records the peak memory of writing the report for growing numbers of synthetic users,
+    streamed page by page against the original way (only up to max_original users, since
+    its memory grows with every user).
+    """
+    context = multiprocessing.get_context("spawn")
+    for num_users in user_counts:
+        for streamed in (False, True):
+            if not streamed and num_users > max_original:
+                continue
+            with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                before, after, pages, elapsed = executor.submit(measure_report_memory, num_users, streamed).result()
+            print("{:>5} users, {:<10} {:>4} pages in {:>6.1f} s, peak RSS {:>7.1f} MiB ({:+.1f} MiB while writing)".format(
+                num_users, "streamed:" if streamed else "original:", pages, elapsed, after, after - before))
+
+def bench_warehouse(num_pages=20, num_revisions=500, num_new=20, latency=0.002):
+    """Syncs pages into a fresh edit warehouse, syncs them again after new edits are made,
+    and compares reading the stored edits with and without their diff text.
+    """
+    wiki = FakeWiki()
+    titles = ["Benchmark page %d" % i for i in range(num_pages)]
+    for title in titles:
+        wiki.add_page(title, num_revisions)
+
+    with tempfile.TemporaryDirectory() as directory, wiki.serve(latency=latency) as server:
+        warehouse = edit_warehouse.EditWarehouse(os.path.join(directory, "warehouse"))
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        try:
+            for run in ("first sync:", "unchanged:", "new edits:"):
+                if run == "new edits:":
+                    for title in titles:
+                        wiki.add_revisions(title, num_new)
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                stored = sum(warehouse.sync_pages(titles, None, use_cache=False).values())
+                print("{:<12} {:>6} edits stored, {:>5} requests, {:.2f} s".format(
+                    run, stored, wiki.requests - requests_before, time.perf_counter() - start))
+
+            requests_before = wiki.requests
+            start = time.perf_counter()
+            for title in titles:
+                get_edits.get_edits(title, None, use_cache=False)
+            print("refetching every page from the API: {} requests, {:.2f} s".format(
+                wiki.requests - requests_before, time.perf_counter() - start))
+        finally:
+            get_edits.submit = original_submit
+
+        newest = datetime.datetime.strptime(wiki.pages[titles[0]]["history"][0]["timestamp"], "%Y-%m-%dT%H:%M:%SZ")
+        for name, columns in (("every column", None), ("metadata only", edit_warehouse.METADATA_COLUMNS)):
+            start = time.perf_counter()
+            edit_dicts = warehouse.get_edit_dicts(None, titles, columns=columns)
+            print("reading {:<13} {:>6} edits in {:.3f} s".format(
+                name + ":", sum(len(edits) for edits in edit_dicts.values()), time.perf_counter() - start))
+        start = time.perf_counter()
+        recent = warehouse.query(None, titles=titles[:5], start_time=newest, end_time=newest - datetime.timedelta(days=60),
+            columns=["revid", "user", "timestamp"])
+        print("last 60 days of 5 pages, 3 columns: {} edits in {:.3f} s".format(len(recent), time.perf_counter() - start))
+
+def make_synthetic_shingle_sets(num_accounts, rng, group_size=4, shared=0.6, set_size=300, vocabulary=10 ** 7):
+    """Makes shingle sets for accounts in groups of sock puppets, where every account in a group
+    shares a pool of shingles (a Jaccard similarity of about shared / (2 - shared)) and draws the
+    rest at random.
+    """
+    shingle_sets = {}
+    num_shared = int(set_size * shared)
+    for group in range(0, num_accounts, group_size):
+        pool = rng.integers(0, vocabulary, num_shared)
+        for account in range(group, min(group + group_size, num_accounts)):
+            shingles = np.concatenate([pool, rng.integers(0, vocabulary, set_size - num_shared)])
+            shingle_sets["Account %d" % account] = set(shingles.tolist())
+    return shingle_sets
+
+def bench_account_similarity(account_counts=(1137, 20000), threshold=0.4, max_exact=2000):
+    """Compares finding similar accounts with MinHash and LSH against comparing every pair exactly,
+    on synthetic accounts in groups that share content.
+    """
+    import account_similarity
+
+    rng = np.random.default_rng(0)
+    for num_accounts in account_counts:
+        shingle_sets = make_synthetic_shingle_sets(num_accounts, rng)
+        start = time.perf_counter()
+        pairs = account_similarity.find_similar_accounts(shingle_sets, threshold)
+        lsh_time = time.perf_counter() - start
+        found = set(zip(pairs["account_a"], pairs["account_b"]))
+        print("{} accounts, MinHash/LSH:  {} pairs in {:.2f} s".format(num_accounts, len(found), lsh_time))
+
+        if num_accounts > max_exact:
+            continue
+        start = time.perf_counter()
+        exact = {(a, b) for a, b in itertools.combinations(shingle_sets, 2)
+            if account_similarity.jaccard(shingle_sets[a], shingle_sets[b]) >= threshold}
+        exact_time = time.perf_counter() - start
+        print("{} accounts, exact pairs: {} pairs in {:.2f} s ({:.1f}x slower), recall {:.1%}, no false positives: {}".format(
+            num_accounts, len(exact), exact_time, exact_time / lsh_time, len(found & exact) / max(len(exact), 1), found <= exact))
+
+def bench_metadata_scoring(num_pages=10, num_revisions=500, latency=0.002):
+    """Compares scoring pages from edits retrieved with their diffs, as get_edits returns them,
+    against get_pages_suspiciousness, which only lists the metadata when no metric reads the diffs.
+    """
+    # sus_metrics connects to the wiki on import, so it is only imported when this benchmark runs
+    import outlier_edits
+    import sus_metrics
+
+    wiki = FakeWiki()
+    titles = ["Benchmark page %d" % i for i in range(num_pages)]
+    for title in titles:
+        wiki.add_page(title, num_revisions)
+
+    with wiki.serve(latency=latency) as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        original_cache = user_info.get_default_user_cache()
+        try:
+            results = {}
+            for run in ("with diffs:", "metadata only:"):
+                # Every run looks the users up again
+                user_info.set_default_user_cache(user_info.UserCache())
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                if run == "with diffs:":
+                    edit_dicts = {title: get_edits.get_edits(title, None, use_cache=False) for title in titles}
+                    user_info.prefetch_edit_users(sus_metrics.default_site, [edit for edits in edit_dicts.values() for edit in edits])
+                    percents, averages, sds = outlier_edits.get_suspicious_statistics_table(edit_dicts, sus_metrics.metrics)
+                    results[run] = (percents - averages) / sds
+                else:
+                    results[run] = outlier_edits.get_pages_suspiciousness(titles, None, sus_metrics.metrics)
+                print("{:<15} {} pages, {} requests, {:.2f} s".format(
+                    run, len(results[run]), wiki.requests - requests_before, time.perf_counter() - start))
+            print("same scores:", np.allclose(results["with diffs:"].to_numpy(), results["metadata only:"].to_numpy(), equal_nan=True))
+        finally:
+            get_edits.submit = original_submit
+            user_info.set_default_user_cache(original_cache)
+
+def bench_page_sweep(num_pages=40, num_revisions=200, latency=0.05, threads=8, sweep_pages=500):
+    """Compares get_pages_suspiciousness retrieving pages one at a time against retrieving them
+    with threads (and diffing them in processes), with a metric that reads the diffs, and
+    estimates how long a sweep of sweep_pages pages would take each way.
+    """
+    # sus_metrics connects to the wiki on import, so it is only imported when this benchmark runs
+    import outlier_edits
+    import sus_metrics
+
+    metrics = dict(sus_metrics.metrics, cites=lambda edit: any("citation" in text for text in edit["added"]))
+    wiki = FakeWiki()
+    titles = ["Benchmark page %d" % i for i in range(num_pages)]
+    for title in titles:
+        wiki.add_page(title, num_revisions)
+
+    with tempfile.TemporaryDirectory() as directory, wiki.serve(latency=latency) as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        original_cache = edit_cache.get_default_cache()
+        original_user_cache = user_info.get_default_user_cache()
+        try:
+            results = {}
+            for run, run_threads in (("one at a time:", None), ("{} threads:".format(threads), threads)):
+                # Every run starts without any cached edits or users
+                edit_cache.set_default_cache(edit_cache.EditCache(os.path.join(directory, "edits%d.sqlite" % len(results))))
+                user_info.set_default_user_cache(user_info.UserCache())
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                results[run] = outlier_edits.get_pages_suspiciousness(titles, None, metrics, min_edits=10, threads=run_threads)
+                elapsed = time.perf_counter() - start
+                print("{:<15} {} pages, {} requests, {:.2f} s, about {:.0f} s for {} pages".format(
+                    run, len(results[run]), wiki.requests - requests_before, elapsed, elapsed / num_pages * sweep_pages, sweep_pages))
+            first, second = results.values()
+            print("same page_stats:", first.index.equals(second.index) and np.allclose(first.to_numpy(), second.to_numpy(), equal_nan=True))
+        finally:
+            get_edits.submit = original_submit
+            edit_cache.set_default_cache(original_cache)
+            user_info.set_default_user_cache(original_user_cache)
+
+def make_synthetic_edits(num_edits, rng, start=datetime.datetime(2022, 1, 1)):
+    """Makes edit dicts with only the metadata, for benchmarks that don't need the diffs."""
+    edits = []
+    for i in range(num_edits):
+        usernum = rng.randrange(1000)
+        anon = usernum % 5 == 0
+        edits.append({
+            "revid": rng.randrange(1, 10 ** 9), "parentid": 0,
+            "user": "10.0.0.%d" % usernum if anon else "User%d" % usernum,
+            "userid": 0 if anon else usernum + 1,
+            "comment": "" if rng.random() < 0.3 else "copyedit",
+            "timestamp": (start + datetime.timedelta(minutes=i)).strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "tags": ["mobile edit"] if rng.random() < 0.2 else [],
+            "minor": rng.random() < 0.1,
+            "size_delta": rng.randrange(-500, 500)
+        })
+    return edits
+
+def make_synthetic_user_edits(num_users, edits_per_user, rng, start=datetime.datetime(2022, 1, 1)):
+    """Makes the timestamps and tags of many users' edits, each user keeping their own hours and devices."""
+    device_tags = [[], ["mobile edit", "mobile web edit"], ["mobile edit", "mobile app edit"]]
+    user_edits = {}
+    for user in range(num_users):
+        hours = rng.choice(24, size=4, replace=False)
+        devices = rng.dirichlet(np.ones(3))
+        offsets = (rng.integers(0, 365, edits_per_user) * 24 + rng.choice(hours, edits_per_user)) * 3600 + rng.integers(0, 3600, edits_per_user)
+        times = np.datetime64(start, "s") + offsets.astype("timedelta64[s]")
+        user_edits["User%d" % user] = [{"timestamp": str(time) + "Z", "tags": device_tags[device]}
+            for time, device in zip(times, rng.choice(3, edits_per_user, p=devices))]
+    return user_edits
+
+def get_hours_original(edits):
+    """The original get_hours and get_tags from the report modules, for one list of edits."""
+    hourData = {"Mobile": [0] * 24, "Non-Mobile": [0] * 24}
+    for label in hourData:
+        for contrib in edits:
+            if (label == "Mobile") != ("mobile web edit" in contrib["tags"]):
+                continue
+            time = contrib["timestamp"].replace("T", " ").replace("Z", ".0")
+            hourData[label][datetime.datetime.strptime(time, "%Y-%m-%d %H:%M:%S.%f").hour] += 1
+    return hourData
+
+def bench_fingerprints(num_users=5000, edits_per_user=200):
+    """Compares counting each user's edits per hour the original way, one strptime per edit and one
+    pass per device, against ActivityFingerprints, which counts every user at once.
+    """
+    from activity_fingerprint import ActivityFingerprints
+
+    user_edits = make_synthetic_user_edits(num_users, edits_per_user, np.random.default_rng(0))
+    start = time.perf_counter()
+    original = {user: get_hours_original(edits) for user, edits in user_edits.items()}
+    original_time = time.perf_counter() - start
+    print("get_hours and get_tags:   {} users, {} edits in {:.2f} s".format(num_users, num_users * edits_per_user, original_time))
+
+    start = time.perf_counter()
+    fingerprints = ActivityFingerprints.from_edits(user_edits)
+    matrix = fingerprints.matrix()
+    fingerprint_time = time.perf_counter() - start
+    same = all(list(fingerprints.hour_counts(user, ("mobile",))) == hours["Mobile"]
+        and list(fingerprints.hour_counts(user, ("non-mobile", "app"))) == hours["Non-Mobile"] for user, hours in original.items())
+    print("ActivityFingerprints:     {} users, {} edits in {:.2f} s ({:.0f}x faster), {} matrix, same hourly counts: {}".format(
+        num_users, num_users * edits_per_user, fingerprint_time, original_time / fingerprint_time, matrix.shape, same))
+
+def bench_activity_neighbors(account_counts=(5000, 20000), edits_per_user=100, k=10, num_checked=200):
+    """Times the k-nearest-neighbor self-join over activity fingerprints by cosine distance and
+    Jensen-Shannon divergence, and checks a sample of accounts' neighbors against comparing them
+    with every other account one at a time.
+    """
+    from activity_fingerprint import ActivityFingerprints
+    from activity_neighbors import METRICS, FingerprintIndex, jensen_shannon
+
+    rng = np.random.default_rng(0)
+    for num_users in account_counts:
+        fingerprints = ActivityFingerprints.from_edits(make_synthetic_user_edits(num_users, edits_per_user, rng))
+        for metric in METRICS:
+            index = FingerprintIndex.from_fingerprints(fingerprints, metric)
+            start = time.perf_counter()
+            neighbors = index.knn_join(k)
+            join_time = time.perf_counter() - start
+
+            found = neighbors.groupby("account")["distance"].apply(list)
+            checked = rng.choice(len(index), min(num_checked, len(index)), replace=False)
+            start = time.perf_counter()
+            exact = 0
+            for row in checked:
+                if metric == "cosine":
+                    distances = 1 - index.vectors @ index.vectors[row]
+                else:
+                    distances = jensen_shannon(index.distributions[row], index.distributions)
+                distances[row] = np.inf
+                exact += np.allclose(np.sort(distances)[:k], found[index.users[row]], atol=1e-9)
+            brute_time = (time.perf_counter() - start) / len(checked) * len(index)
+            print("{:>13}: {} accounts, top {} in {:.2f} s (one at a time: ~{:.1f} s), {}/{} sampled accounts exact".format(
+                metric, len(index), k, join_time, brute_time, exact, len(checked)))
+
+def make_synthetic_coedits(num_edits, rng, num_groups=50, group_size=5, group_pages=8, start=datetime.datetime(2022, 1, 1)):
+    """Makes the users, pages and timestamps of background edits spread over a year, with a few
+    popular pages and users, plus groups of accounts that each edit the same pages within minutes.
+
+    Returns:
+        tuple: The users, pages and timestamps arrays, and the list of each group's usernames.
+    """
+    num_background = num_edits - num_groups * group_size * group_pages
+    num_users, num_pages = max(num_edits // 10, 1), max(num_edits // 20, 1)
+    user_weights = 1 / np.arange(1, num_users + 1) ** 0.8
+    page_weights = 1 / np.arange(1, num_pages + 1) ** 0.8
+    users = ["User%d" % i for i in rng.choice(num_users, num_background, p=user_weights / user_weights.sum())]
+    pages = ["Page%d" % i for i in rng.choice(num_pages, num_background, p=page_weights / page_weights.sum())]
+    offsets = [rng.integers(0, 365 * 86400, num_background)]
+
+    groups = []
+    for group in range(num_groups):
+        members = ["Sock%d_%d" % (group, i) for i in range(group_size)]
+        groups.append(members)
+        for page in rng.choice(num_pages, group_pages, replace=False):
+            users += members
+            pages += ["Page%d" % page] * group_size
+            offsets.append(rng.integers(0, 365 * 86400) + rng.integers(0, 20 * 60, group_size))
+    timestamps = np.datetime64(start, "s") + np.concatenate(offsets).astype("timedelta64[s]")
+    return np.array(users, dtype=object), np.array(pages, dtype=object), timestamps, groups
+
+def bench_coedit_graph(edit_counts=(100000, 300000, 1000000)):
+    """Times building the sparse co-editing graph, its connected components and its communities
+    on synthetic edits, and counts the planted groups that come out as their own community.
+    """
+    from coedit_graph import CoeditGraph, modularity
+
+    def size_of(matrix):
+        return (matrix.data.nbytes + matrix.indices.nbytes + matrix.indptr.nbytes) / 2 ** 20
+
+    rng = np.random.default_rng(0)
+    for num_edits in edit_counts:
+        users, pages, timestamps, groups = make_synthetic_coedits(num_edits, rng)
+        start = time.perf_counter()
+        graph = CoeditGraph(users, pages, timestamps)
+        build_time = time.perf_counter() - start
+        start = time.perf_counter()
+        components = graph.components()
+        component_time = time.perf_counter() - start
+        start = time.perf_counter()
+        communities = graph.communities()
+        community_time = time.perf_counter() - start
+
+        index = {user: i for i, user in enumerate(graph.users)}
+        sizes = np.bincount(communities)
+        found = 0
+        for members in groups:
+            labels = {communities[index[member]] for member in members}
+            found += len(labels) == 1 and sizes[labels.pop()] == len(members)
+        print("{} edits, {} users: incidence {:.1f} MB, graph {} edges {:.1f} MB, built in {:.2f} s".format(
+            num_edits, len(graph.users), size_of(graph.incidence), graph.graph.nnz // 2, size_of(graph.graph), build_time))
+        print("    {} components in {:.2f} s, {} communities in {:.2f} s (modularity {:.2f}), {}/{} planted groups found exactly".format(
+            components.max() + 1, component_time, communities.max() + 1, community_time,
+            modularity(graph.graph, communities), found, len(groups)))
+
+def count_close_pairs_pairwise(edit_dicts, window):
+    """Counts each pair of accounts' close pairs of edits by comparing every pair of edits on each page."""
+    counts = collections.Counter()
+    for edits in edit_dicts.values():
+        times = [datetime.datetime.strptime(edit["timestamp"], "%Y-%m-%dT%H:%M:%SZ") for edit in edits]
+        for i, j in itertools.combinations(range(len(edits)), 2):
+            if edits[i]["user"] != edits[j]["user"] and abs(times[i] - times[j]) <= window:
+                counts[tuple(sorted((edits[i]["user"], edits[j]["user"])))] += 1
+    return counts
+
+def make_synthetic_history(num_revisions, rng, num_users=50, start=datetime.datetime(2020, 1, 1)):
+    """Makes the metadata of a page history like FakeWiki's: num_users editors (a fifth of them
+    IP addresses), with 1 minute to 6 hours between revisions. Newest first, like get_edits.
+    """
+    edits = []
+    timestamp = start
+    for _ in range(num_revisions):
+        usernum = rng.randrange(num_users)
+        user = "10.0.0.%d" % usernum if usernum % 5 == 0 else "User%d" % usernum
+        edits.append({"user": user, "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ")})
+        timestamp += datetime.timedelta(minutes=rng.randrange(1, 6 * 60))
+    return edits[::-1]
+
+def bench_co_occurrence(revision_counts=(2000, 20000, 100000), num_pages=10, num_bursts=20, max_pairwise=2000):
+    """Plants a pair of accounts that edit long page histories (like the SP500 company pages')
+    within minutes of each other, and times finding the close pairs of accounts with the sorted
+    sweep against comparing every pair of edits on each page.
+    """
+    from co_occurrence import DEFAULT_WINDOW, find_close_edit_pairs
+
+    rng = random.Random(0)
+    for num_revisions in revision_counts:
+        edit_dicts = {"SP500 company {}".format(i): make_synthetic_history(num_revisions, rng) for i in range(num_pages)}
+        for edits in edit_dicts.values():
+            first, last = (datetime.datetime.strptime(edits[i]["timestamp"], "%Y-%m-%dT%H:%M:%SZ") for i in (-1, 0))
+            for _ in range(num_bursts):
+                burst = first + (last - first) * rng.random()
+                for user, delay in (("Sock puppet A", 0), ("Sock puppet B", rng.randrange(30, 300))):
+                    edits.append({"user": user, "timestamp": (burst + datetime.timedelta(seconds=delay)).strftime("%Y-%m-%dT%H:%M:%SZ")})
+
+        start = time.perf_counter()
+        pairs = find_close_edit_pairs(edit_dicts, min_pairs=1)
+        sweep_time = time.perf_counter() - start
+        top = pairs.iloc[0]
+        print("{} pages x {} revisions: sweep {:.2f} s, {} pairs of accounts, top pair {} / {} with {} close pairs on {} pages".format(
+            num_pages, num_revisions, sweep_time, len(pairs), top["user_a"], top["user_b"], top["close_pairs"], top["pages"]))
+
+        if num_revisions <= max_pairwise:
+            start = time.perf_counter()
+            counts = count_close_pairs_pairwise(edit_dicts, DEFAULT_WINDOW)
+            pairwise_time = time.perf_counter() - start
+            same = counts == {(a, b): count for a, b, count in pairs[["user_a", "user_b", "close_pairs"]].itertuples(index=False)}
+            print("    every pair of edits: {:.2f} s ({:.0f}x slower), same counts: {}".format(pairwise_time, pairwise_time / sweep_time, same))
+
+def bench_incremental_scoring(num_pages=5000, edits_per_page=40, num_updates=50, pages_per_update=5):
+    """Compares keeping page scores and outliers up to date with an IncrementalScorer as new edits
+    arrive on a few pages at a time against recomputing them from every page's edits.
+    """
+    # sus_metrics connects to the wiki when it is imported
+    import outlier_edits
+    import sus_metrics
+    from outlier_monitor import IncrementalScorer
+
+    metrics = {name: func for name, func in sus_metrics.metrics.items() if func not in sus_metrics.user_metrics}
+    rng = random.Random(0)
+    titles = ["Benchmark page %d" % i for i in range(num_pages)]
+    edit_dicts = {title: make_synthetic_edits(rng.randrange(1, 2 * edits_per_page), rng) for title in titles}
+    updates = [{title: make_synthetic_edits(rng.randrange(1, 10), rng) for title in rng.sample(titles, pages_per_update)}
+        for _ in range(num_updates)]
+
+    start = time.perf_counter()
+    scorer = IncrementalScorer.from_edit_dicts(edit_dicts, metrics)
+    print("initial scoring of {} pages: {:.2f} s".format(num_pages, time.perf_counter() - start))
+
+    start = time.perf_counter()
+    for update in updates:
+        scorer.add_edits(update)
+        outliers = scorer.find_outliers()
+    incremental = (time.perf_counter() - start) / num_updates
+
+    start = time.perf_counter()
+    for update in updates:
+        for title, edits in update.items():
+            edit_dicts[title] = edit_dicts[title] + edits
+        percents, averages, sds = outlier_edits.get_suspicious_statistics_table(edit_dicts, metrics)
+        full_outliers = outlier_edits.find_outliers((percents - averages) / sds, metrics)
+    full = (time.perf_counter() - start) / num_updates
+
+    same = all(set(outliers[name]) == set(full_outliers[name]) for name in metrics)
+    print("per update of {} pages: incremental {:.4f} s, full recomputation {:.4f} s ({:.0f}x), same outliers: {}".format(
+        pages_per_update, incremental, full, full / incremental, same))
+
+def bench_recent_changes(num_pages=100, num_revisions=300, speed=10 ** 6):
+    """Records a recent-changes feed from the fake API, then replays it through a
+    RecentChangesMonitor as fast as possible and paced at an accelerated speed.
+    """
+    # sus_metrics connects to the wiki when it is imported
+    import sus_metrics
+    import recent_changes
+
+    wiki = FakeWiki()
+    for i in range(num_pages):
+        wiki.add_page("Benchmark page %d" % i, num_revisions, num_users=200)
+    metrics = {name: func for name, func in sus_metrics.metrics.items() if func not in sus_metrics.user_metrics}
+
+    with tempfile.TemporaryDirectory() as directory, wiki.serve() as server:
+        path = os.path.join(directory, "feed.jsonl")
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        try:
+            start = time.perf_counter()
+            count = recent_changes.record_feed(recent_changes.iter_recent_changes(
+                None, start_time=datetime.datetime(2019, 1, 1), follow=False), path)
+            print("recorded {} changes in {:.2f} s".format(count, time.perf_counter() - start))
+        finally:
+            get_edits.submit = original_submit
+
+        for name, replay_speed in (("as fast as possible:", None), ("{:g}x real time:".format(speed), speed)):
+            monitor = recent_changes.RecentChangesMonitor(metrics, window=datetime.timedelta(days=7))
+            start = time.perf_counter()
+            alerts = sum(1 for _ in monitor.run(recent_changes.replay_feed(path, replay_speed)))
+            stats = monitor.stats()
+            print("{:<22} {} events, {} alerts in {:.2f} s, {:.0f} events/s of processing, max latency {:.1f} ms".format(
+                name, stats["events"], alerts, time.perf_counter() - start, stats["events_per_second"], stats["max_latency"] * 1000))
+        # With a short window, most pages go without edits in it at some point
+        monitor = recent_changes.RecentChangesMonitor(metrics, window=datetime.timedelta(hours=1))
+        for _ in monitor.run(recent_changes.replay_feed(path)):
+            pass
+        in_window = len({page for _, page, _ in monitor.recent})
+        print("pages kept by the scorer with a 1 hour window: {} ({} with edits in the window)".format(
+            len(monitor.scorer.counts), in_window))
+        exit_on_failures([] if len(monitor.scorer.counts) == in_window else
+            ["the scorer kept {} pages with no edits in the window".format(len(monitor.scorer.counts) - in_window)])
+
+    # With the user metrics, each new account is looked up as its first change arrives, or
+    # in bulk for each response's changes
+    with wiki.serve() as server:
+        get_edits.submit, original_submit = server.submit, get_edits.submit
+        original_cache = user_info.get_default_user_cache()
+        try:
+            for name, batched in (("user metrics, per change:", False), ("user metrics, batched:", True)):
+                user_info.set_default_user_cache(user_info.UserCache())
+                monitor = recent_changes.RecentChangesMonitor(window=datetime.timedelta(days=7))
+                requests_before = wiki.requests
+                start = time.perf_counter()
+                source = recent_changes.iter_recent_change_batches(None, start_time=datetime.datetime(2019, 1, 1), follow=False)
+                if batched:
+                    alerts = sum(1 for _ in monitor.run_batches(source))
+                else:
+                    alerts = sum(1 for _ in monitor.run(change for changes in source for change in changes))
+                print("{:<26} {} events, {} alerts, {} requests in {:.2f} s".format(
+                    name, monitor.stats()["events"], alerts, wiki.requests - requests_before, time.perf_counter() - start))
+        finally:
+            get_edits.submit = original_submit
+            user_info.set_default_user_cache(original_cache)
+
+benchmarks = {
+    "batched_diffs": bench_batched_diffs,
+    "pagination": bench_pagination,
+    "iter_edits": bench_iter_edits,
+    "edit_cache": bench_edit_cache,
+    "wiki_client": bench_wiki_client,
+    "user_prefetch": bench_user_prefetch,
+    "user_cache": bench_user_cache,
+    "user_edits": bench_user_edits,
+    "diff_parsing": bench_diff_parsing,
+    "text_cleaning": bench_text_cleaning,
+    "report_memory": bench_report_memory,
+    "warehouse": bench_warehouse,
+    "metadata_scoring": bench_metadata_scoring,
+    "incremental_scoring": bench_incremental_scoring,
+    "fingerprints": bench_fingerprints,
+    "activity_neighbors": bench_activity_neighbors,
+    "coedit_graph": bench_coedit_graph,
+    "co_occurrence": bench_co_occurrence,
+    "page_sweep": bench_page_sweep,
+    "recent_changes": bench_recent_changes,
+    "account_similarity": bench_account_similarity
+}
+
+def main():
+    names = sys.argv[1:] or list(benchmarks)
+    for name in names:
+        print("==", name)
+        benchmarks[name]()
+
+if __name__ == "__main__":
+    main()
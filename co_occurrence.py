@@ -0,0 +1,127 @@
+"""Finds pairs of accounts that repeatedly edit the same page within minutes of each other.
+
+Every page's edits are sorted by timestamp once (all pages in one sort), and a window of
+length window is swept along them: the edits within window after each edit are found with a
+binary search, so the cost is O(n log n) plus the number of close pairs, rather than
+comparing every pair of edits on a page. The close pairs are counted per pair of accounts.
+
+Usage: python co_occurrence.py title [title ...]
+Reads the English Wikipedia pages' histories (without their diffs) and prints the pairs of
+accounts that edited them within DEFAULT_WINDOW of each other most often.
+"""
+
+import datetime
+import sys
+
+import numpy as np
+import pandas as pd
+import pywikibot as pwb
+
+from activity_fingerprint import parse_timestamps
+from get_edits import iter_edits
+
+# The longest time between two accounts' edits on a page for them to count as close
+DEFAULT_WINDOW = datetime.timedelta(minutes=10)
+
+# The most close pairs of edits expanded at once, which bounds the memory used
+MAX_MATCHES = 1 << 22
+
+COLUMNS = ["user_a", "user_b", "close_pairs", "pages", "min_gap", "mean_gap", "edits_a", "edits_b"]
+
+def find_close_pairs(users, pages, timestamps, window=DEFAULT_WINDOW, min_pairs=2, max_matches=MAX_MATCHES):
+    """Counts, for each pair of accounts, the pairs of their edits on the same page within window of each other.
+
+    Args:
+        users (array-like): The username of each edit.
+        pages (array-like): The page of each edit.
+        timestamps (numpy.ndarray): The time of each edit, as datetime64.
+        window (datetime.timedelta): The longest time between two edits for them to count as close.
+        min_pairs (int): The fewest close pairs of edits a pair of accounts needs to be included.
+        max_matches (int): The most close pairs of edits expanded at once.
+
+    Returns:
+        pandas.DataFrame: One row per pair of accounts, with the columns user_a and user_b (in
+            alphabetical order), close_pairs (the number of close pairs of their edits), pages (the
+            number of pages they were on), min_gap and mean_gap (the time between the close pairs'
+            edits), and edits_a and edits_b (each account's number of edits), most close pairs first.
+    """
+    user_codes, user_names = pd.factorize(np.asarray(users, dtype=object), sort=True)
+    page_codes, _ = pd.factorize(np.asarray(pages, dtype=object))
+    seconds = np.asarray(timestamps, dtype="datetime64[s]").astype(np.int64)
+    window_seconds = int(window.total_seconds())
+    if len(seconds):
+        seconds -= seconds.min()
+
+    # Pages are spaced further apart than the window, so one sorted array holds every page's
+    # edits in time order and a window never reaches into the next page
+    keys = page_codes.astype(np.int64) * (seconds.max(initial=0) + window_seconds + 1) + seconds
+    order = np.argsort(keys, kind="stable")
+    keys, user_codes, page_codes = keys[order], user_codes[order], page_codes[order]
+    # Each edit is paired with the edits after it up to the end of its window
+    ends = np.searchsorted(keys, keys + window_seconds, side="right")
+    match_counts = ends - np.arange(len(keys)) - 1
+    match_totals = np.cumsum(match_counts)
+
+    groups = []
+    start = 0
+    while start < len(keys):
+        done = match_totals[start - 1] if start else 0
+        stop = max(int(np.searchsorted(match_totals, done + max_matches, side="right")), start + 1)
+        counts = match_counts[start:stop]
+        left = np.repeat(np.arange(start, stop), counts)
+        right = left + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        different = user_codes[left] != user_codes[right]
+        left, right = left[different], right[different]
+        pairs = pd.DataFrame({
+            "user_a": np.minimum(user_codes[left], user_codes[right]),
+            "user_b": np.maximum(user_codes[left], user_codes[right]),
+            "page": page_codes[left],
+            "gap": keys[right] - keys[left]
+        })
+        groups.append(pairs.groupby(["user_a", "user_b", "page"]).agg(
+            close_pairs=("gap", "size"), min_gap=("gap", "min"), total_gap=("gap", "sum")))
+        start = stop
+
+    if not groups:
+        return pd.DataFrame(columns=COLUMNS)
+    # Windows from different chunks can cover the same pair of accounts on the same page
+    page_pairs = pd.concat(groups).groupby(level=[0, 1, 2]).agg(
+        {"close_pairs": "sum", "min_gap": "min", "total_gap": "sum"})
+    table = page_pairs.groupby(level=[0, 1]).agg(
+        close_pairs=("close_pairs", "sum"), pages=("close_pairs", "size"),
+        min_gap=("min_gap", "min"), total_gap=("total_gap", "sum")).reset_index()
+    table = table[table["close_pairs"] >= min_pairs]
+
+    edit_counts = np.bincount(user_codes, minlength=len(user_names))
+    table = pd.DataFrame({
+        "user_a": user_names[table["user_a"].to_numpy()],
+        "user_b": user_names[table["user_b"].to_numpy()],
+        "close_pairs": table["close_pairs"].to_numpy(),
+        "pages": table["pages"].to_numpy(),
+        "min_gap": pd.to_timedelta(table["min_gap"].to_numpy(), unit="s"),
+        "mean_gap": pd.to_timedelta(table["total_gap"].to_numpy() / table["close_pairs"].to_numpy(), unit="s").round("s"),
+        "edits_a": edit_counts[table["user_a"].to_numpy()],
+        "edits_b": edit_counts[table["user_b"].to_numpy()]
+    })
+    return table.sort_values(["close_pairs", "pages", "user_a", "user_b"], ascending=[False, False, True, True], ignore_index=True)
+
+def find_close_edit_pairs(edit_dicts: dict, window=DEFAULT_WINDOW, min_pairs=2, max_matches=MAX_MATCHES) -> pd.DataFrame:
+    """Finds the pairs of accounts that edited the same pages within window of each other, like find_close_pairs.
+
+    Args:
+        edit_dicts (dict): The dict containing the page names as keys and the list of each
+            page's edits as values, like get_pages_suspiciousness gathers.
+    """
+    # Edits whose user has been hidden have no username
+    edits = [(page, edit) for page, edit_list in edit_dicts.items() for edit in edit_list if edit["user"]]
+    return find_close_pairs([edit["user"] for _, edit in edits], [page for page, _ in edits],
+        parse_timestamps([edit["timestamp"] for _, edit in edits]), window, min_pairs, max_matches)
+
+def main():
+    site = pwb.Site("en", "wikipedia")
+    edit_dicts = {title: list(iter_edits(title, site, diffs=False)) for title in sys.argv[1:]}
+    pd.set_option("display.max_rows", 100)
+    print(find_close_edit_pairs(edit_dicts))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""Finds clusters of accounts that edit the same pages at the same times, such as sock-puppet groups.
+
+The edits are first stored as sparse user x page incidence matrices in CSR form, so a million
+edits take a few MB. Projecting them onto the users gives a user-user graph whose edge weights
+measure how many of their pages two accounts both edited, and how many they both edited within
+window of each other. The projection is made a block of users at a time, dropping light edges
+as it goes. The graph's connected components and its communities, found by label propagation,
+are the candidate clusters.
+
+Pages edited by more than max_page_users accounts are left out of the projection, since every
+pair of their editors would be linked (a page with 10,000 editors alone adds 50 million edges)
+and they say little about coordination.
+
+Usage: python coedit_graph.py search_term [max_pages]
+Scores the pages found by the search like outlier_edits does and prints the clusters of
+accounts among the suspicious edits on each metric's outlier pages.
+"""
+
+import datetime
+import sys
+from pprint import pprint
+
+import numpy as np
+import pandas as pd
+import pywikibot as pwb
+from scipy import sparse
+from scipy.sparse import csgraph
+
+from activity_fingerprint import parse_timestamps
+
+# The longest time between two accounts' edits on a page for them to count as close
+DEFAULT_WINDOW = datetime.timedelta(hours=1)
+
+# The most accounts a page can have been edited by and still link its editors
+DEFAULT_MAX_PAGE_USERS = 1000
+
+# The least weight an edge needs to be kept, out of 1 + time_weight for two users who edited
+# exactly the same pages at the same times
+DEFAULT_MIN_WEIGHT = 0.1
+
+def get_incidence(rows, columns, shape):
+    """Makes a CSR matrix counting how many times each (row, column) pair occurs."""
+    counts = sparse.coo_matrix((np.ones(len(rows), dtype=np.int32), (rows, columns)), shape=shape)
+    # Duplicates are summed when converting to CSR
+    return counts.tocsr()
+
+def scale_cosine(counts, row_offset, scales):
+    """Turns a block of a co-occurrence matrix into cosine similarities, dividing each count by
+    the square roots of its row's and column's set sizes, given as scales = 1 / sqrt(sizes).
+
+    The two scales are multiplied first, so both halves of a symmetric matrix get the same values.
+    """
+    rows = np.repeat(np.arange(counts.shape[0]), np.diff(counts.indptr)) + row_offset
+    return sparse.csr_matrix((counts.data * (scales[rows] * scales[counts.indices]), counts.indices, counts.indptr),
+        shape=counts.shape)
+
+def stack_blocks(blocks, shape, dtype):
+    """Stacks blocks of rows into one CSR matrix, which may have no rows."""
+    if not blocks:
+        return sparse.csr_matrix(shape, dtype=dtype)
+    return sparse.vstack(blocks, format="csr").astype(dtype)
+
+def get_values(matrix, rows, columns):
+    """Gets a sparse matrix's values at pairs of rows and columns, as a 1D array."""
+    if len(rows) == 0:
+        return np.zeros(0, dtype=matrix.dtype)
+    return np.asarray(matrix[rows, columns]).ravel()
+
+def label_propagation(graph, max_iter=100, seed=0):
+    """Finds communities in a weighted undirected graph by label propagation.
+
+    Every node starts in its own community, then repeatedly joins the community its
+    neighbors' edge weights add up most for, until no node would move. Each round, a
+    random half of the nodes move, which stops pairs of nodes from swapping labels forever.
+
+    Args:
+        graph (scipy.sparse.csr_matrix): The symmetric matrix of edge weights, without self-loops.
+        max_iter (int): The most rounds to run.
+        seed (int): The seed for choosing which nodes move each round.
+
+    Returns:
+        numpy.ndarray: Each node's community, numbered from 0 in order of decreasing size.
+    """
+    num_nodes = graph.shape[0]
+    rng = np.random.default_rng(seed)
+    edges = graph.tocoo()
+    labels = np.arange(num_nodes)
+    nodes = np.arange(num_nodes)
+    for _ in range(max_iter if num_nodes else 0):
+        # The total weight each node's edges give each label
+        votes = sparse.csr_matrix((edges.data, (edges.row, labels[edges.col])), shape=graph.shape)
+        best = np.asarray(votes.argmax(axis=1)).ravel()
+        best_votes = votes.max(axis=1).toarray().ravel()
+        current_votes = get_values(votes, nodes, labels)
+        # Nodes stay put on ties, and nodes without edges have no votes at all
+        new_labels = np.where(current_votes >= best_votes, labels, best)
+        if np.array_equal(new_labels, labels):
+            break
+        labels = np.where(rng.random(num_nodes) < 0.5, new_labels, labels)
+
+    _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+    # Ties in size keep the order of the labels, so the numbering is deterministic
+    ranks = np.empty(len(sizes), dtype=np.int64)
+    ranks[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+    return ranks[labels]
+
+def modularity(graph, labels):
+    """Gets the modularity of a division of a weighted undirected graph into communities.
+
+    It is the share of edge weight within communities minus the share expected if edges
+    were placed at random between nodes with the same weighted degrees. 0 means no more
+    structure than chance, and values near 1 mean dense communities with few links between.
+    """
+    degrees = np.asarray(graph.sum(axis=1)).ravel()
+    total = degrees.sum()
+    if total == 0:
+        return 0.0
+    edges = graph.tocoo()
+    within = edges.data[labels[edges.row] == labels[edges.col]].sum()
+    community_degrees = np.bincount(labels, weights=degrees)
+    return float(within / total - (community_degrees ** 2).sum() / total ** 2)
+
+class CoeditGraph:
+    """A user-user graph weighted by the pages two accounts both edited and by how close in time they edited them.
+
+    Each edge's weight is the cosine similarity of the two users' sets of linked pages, plus
+    time_weight times the cosine similarity of their sets of (page, window of time) pairs.
+    Normalizing by how many pages each user edited keeps prolific editors, who share a few
+    pages with almost everyone, from outweighing small accounts that share all of theirs.
+
+    Attributes:
+        users (numpy.ndarray): The usernames, in the order of the matrices' rows.
+        pages (numpy.ndarray): The page names, in the order of incidence's columns.
+        incidence (scipy.sparse.csr_matrix): The number of edits each user made on each page.
+        graph (scipy.sparse.csr_matrix): The symmetric edge weights, without edges lighter than min_weight.
+        shared_pages (scipy.sparse.csr_matrix): The number of linked pages each pair of users in
+            graph both edited.
+        close_edits (scipy.sparse.csr_matrix): How many times each pair of users in graph edited a
+            linked page within window of each other. Edits are grouped by page and window of time,
+            and for each of the two users this counts their groups that are in or next to one of
+            the other's. The smaller of the two counts is kept, so each group is counted once.
+    """
+
+    def __init__(self, users, pages, timestamps, window=DEFAULT_WINDOW, time_weight=1.0,
+            max_page_users=DEFAULT_MAX_PAGE_USERS, min_shared_pages=2, min_weight=DEFAULT_MIN_WEIGHT, block_size=4096):
+        """
+        Args:
+            users (array-like): The username of each edit.
+            pages (array-like): The page (or page-month, or any other edit set) of each edit.
+            timestamps (numpy.ndarray): The time of each edit, as datetime64.
+            window (datetime.timedelta): How close in time two edits on a page must be to count
+                towards close_edits. Edits up to twice window apart can count, depending on where
+                they fall in the windows of time the edits are grouped into.
+            time_weight (float): How much editing pages close in time weighs compared to editing the same pages.
+            max_page_users (int): The most accounts a page can have been edited by and still link
+                its editors. None links the editors of every page.
+            min_shared_pages (int): The fewest linked pages two users must both have edited to be
+                linked. Sharing a single page, even at the same time, is often chance.
+            min_weight (float): The least weight an edge needs to be kept in the graph.
+            block_size (int): The number of users projected at once. Edges lighter than min_weight
+                are dropped from each block, so the memory used is about that of the final graph.
+        """
+        user_codes, self.users = pd.factorize(np.asarray(users, dtype=object), sort=True)
+        page_codes, self.pages = pd.factorize(np.asarray(pages, dtype=object), sort=True)
+        self.incidence = get_incidence(user_codes, page_codes, (len(self.users), len(self.pages)))
+
+        edited = self.incidence.astype(bool).astype(np.int32)
+        linked = np.ones(len(self.pages), dtype=bool)
+        if max_page_users is not None:
+            linked = edited.getnnz(axis=0) <= max_page_users
+        edited = edited[:, linked]
+
+        # Edits are grouped by page and window of time, and edits close in time share a
+        # group or fall in groups next to each other
+        keep = linked[page_codes]
+        buckets = np.asarray(timestamps, dtype="datetime64[s]").astype(np.int64) // max(int(window.total_seconds()), 1)
+        if len(buckets):
+            buckets -= buckets.min()
+        keys = page_codes.astype(np.int64) * (buckets.max(initial=0) + 2) + buckets
+        cells, cell_codes = np.unique(keys[keep], return_inverse=True)
+        in_cell = get_incidence(user_codes[keep], cell_codes, (len(self.users), len(cells))).astype(bool).astype(np.int32)
+        # Each group's following group on the same page, if any edits fall in it
+        following = np.searchsorted(cells, cells + 1)
+        has_following = following < len(cells)
+        has_following[has_following] = cells[following[has_following]] == cells[has_following] + 1
+        to_following = sparse.csr_matrix((np.ones(has_following.sum(), dtype=np.int32),
+            (np.flatnonzero(has_following), following[has_following])), shape=(len(cells), len(cells)))
+        # The groups each user edited in or next to
+        in_or_near = (in_cell + in_cell @ to_following + in_cell @ to_following.T).astype(bool).astype(np.int32).tocsr()
+
+        page_scales = 1 / np.sqrt(np.maximum(edited.getnnz(axis=1), 1))
+        cell_scales = 1 / np.sqrt(np.maximum(in_cell.getnnz(axis=1), 1))
+        graph_blocks, shared_blocks, close_blocks = [], [], []
+        for start in range(0, len(self.users), block_size):
+            rows = slice(start, start + block_size)
+            shared = (edited[rows] @ edited.T).tocsr()
+            shared.data[shared.data < min_shared_pages] = 0
+            shared.eliminate_zeros()
+            # The number of the other user's groups each user edited in or next to, and of each
+            # user's groups the other edited in or next to. Taking the smaller makes the counts
+            # symmetric and at most either user's number of groups. Users are only close if they
+            # also share enough pages.
+            close = (in_or_near[rows] @ in_cell.T).minimum(in_cell[rows] @ in_or_near.T)
+            close = close.multiply(shared.astype(bool)).tocsr()
+            weights = scale_cosine(shared, start, page_scales) + time_weight * scale_cosine(close, start, cell_scales)
+            # A user isn't linked to themselves
+            weights = weights.tocoo()
+            weights.data[(weights.data < min_weight) | (weights.row + start == weights.col)] = 0
+            weights = weights.tocsr()
+            weights.eliminate_zeros()
+            kept = weights.astype(bool)
+            graph_blocks.append(weights)
+            shared_blocks.append(shared.multiply(kept).tocsr())
+            close_blocks.append(close.multiply(kept).tocsr())
+
+        shape = (len(self.users), len(self.users))
+        self.graph = stack_blocks(graph_blocks, shape, np.float64)
+        self.shared_pages = stack_blocks(shared_blocks, shape, np.int32)
+        self.close_edits = stack_blocks(close_blocks, shape, np.int32)
+
+    @classmethod
+    def from_edit_dicts(cls, edit_dicts: dict, **kwargs) -> "CoeditGraph":
+        """Makes a co-editing graph from the edits on several pages, like those get_pages_suspiciousness gathers.
+
+        Args:
+            edit_dicts (dict): The dict containing the page (or page-month) names as keys and the
+                list of each page's edits as values.
+            **kwargs: Passed on to CoeditGraph, e.g. window.
+        """
+        # Edits whose user has been hidden have no username
+        edits = [(page, edit) for page, edit_list in edit_dicts.items() for edit in edit_list if edit["user"]]
+        return cls([edit["user"] for _, edit in edits], [page for page, _ in edits],
+            parse_timestamps([edit["timestamp"] for _, edit in edits]), **kwargs)
+
+    def components(self):
+        """Gets each user's connected component, numbered from 0 in order of decreasing size."""
+        _, labels = csgraph.connected_components(self.graph, directed=False)
+        _, labels, sizes = np.unique(labels, return_inverse=True, return_counts=True)
+        ranks = np.empty(len(sizes), dtype=np.int64)
+        ranks[np.argsort(-sizes, kind="stable")] = np.arange(len(sizes))
+        return ranks[labels]
+
+    def communities(self, max_iter=100, seed=0):
+        """Gets each user's community, found by label_propagation and numbered from 0 in order of decreasing size."""
+        return label_propagation(self.graph, max_iter=max_iter, seed=seed)
+
+    def edge_table(self):
+        """Gets the graph's edges, with the columns user_a, user_b, shared_pages, close_edits and
+        weight, heaviest first. Each pair of users appears once, in alphabetical order.
+        """
+        edges = sparse.triu(self.graph, k=1).tocoo()
+        table = pd.DataFrame({
+            "user_a": self.users[edges.row],
+            "user_b": self.users[edges.col],
+            "shared_pages": get_values(self.shared_pages, edges.row, edges.col),
+            "close_edits": get_values(self.close_edits, edges.row, edges.col),
+            "weight": edges.data
+        })
+        return table.sort_values(["weight", "user_a", "user_b"], ascending=[False, True, True], ignore_index=True)
+
+    def cluster_table(self, min_size=2, max_iter=100, seed=0):
+        """Gets the graph's communities, with the connected component each is in.
+
+        Args:
+            min_size (int): The fewest users a community needs to be included.
+            max_iter (int): The most rounds of label propagation to run.
+            seed (int): The seed for label propagation.
+
+        Returns:
+            pandas.DataFrame: One row per community, with the columns community, component, size,
+                weight (the total weight of the edges within it) and users (a sorted list),
+                largest first.
+        """
+        communities = self.communities(max_iter, seed)
+        components = self.components()
+        edges = sparse.triu(self.graph, k=1).tocoo()
+        within = communities[edges.row] == communities[edges.col]
+        weights = np.bincount(communities[edges.row[within]], weights=edges.data[within], minlength=communities.max(initial=-1) + 1)
+
+        order = np.argsort(communities, kind="stable")
+        starts = np.flatnonzero(np.diff(communities[order], prepend=-1))
+        rows = []
+        for community, members in zip(communities[order[starts]], np.split(order, starts[1:])):
+            if len(members) >= min_size:
+                rows.append((community, components[members[0]], len(members), weights[community], sorted(self.users[members])))
+        return pd.DataFrame(rows, columns=["community", "component", "size", "weight", "users"])
+
+def find_suspicious_clusters(sus_edits: dict, sus_stats: dict, sus_metrics: dict, min_size: int = 2, **kwargs) -> dict:
+    """Finds clusters of users among the suspicious edits on each metric's outlier pages.
+
+    This groups the users find_suspicious_users finds into the accounts that edited the same
+    outlier pages at around the same times.
+
+    Args:
+        sus_edits (dict): The edits made on suspicious pages, from get_pages_suspiciousness.
+        sus_stats (dict): The outlier pages of each metric, from find_outliers.
+        sus_metrics (dict): The metrics used to rate edits' suspiciousness.
+        min_size (int, optional): The fewest users a cluster needs to be included.
+        **kwargs: Passed on to CoeditGraph, e.g. window.
+
+    Returns:
+        dict: The DataFrame of each metric's clusters, from CoeditGraph.cluster_table.
+    """
+    clusters = {}
+    for metric_name in sus_metrics:
+        edit_dicts = {page_name: page for page_name, page in sus_edits[metric_name].items() if page_name in sus_stats[metric_name]}
+        clusters[metric_name] = CoeditGraph.from_edit_dicts(edit_dicts, **kwargs).cluster_table(min_size)
+    return clusters
+
+def main():
+    from outlier_edits import find_outliers, get_pages_suspiciousness, search_wiki
+    from sus_metrics import metrics as suspiciousness_metrics
+
+    site = pwb.Site("en", "wikipedia")
+    titles = search_wiki(site, sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 5)
+    print("Found pages:", titles)
+
+    sus_stats, sus_edits = get_pages_suspiciousness(titles, site, suspiciousness_metrics, min_edits=10,
+        start_month=pwb.Timestamp(2021, 10, 1), end_month=pwb.Timestamp(2021, 12, 1), get_sus_edits=True)
+    stats = find_outliers(sus_stats, suspiciousness_metrics)
+    print("\nSuspicious pages by metric:")
+    pprint(stats)
+
+    pd.set_option("display.max_colwidth", None)
+    for metric_name, clusters in find_suspicious_clusters(sus_edits, stats, suspiciousness_metrics).items():
+        print("\nClusters of users by {}:".format(metric_name))
+        print(clusters)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Persistent on-disk cache of edits, keyed by site, diff mode and revision ID.
+
+Revisions never change once they are saved, so an edit's metadata and diff only ever
+need to be retrieved from the API once. Diffs made locally from the revisions' content and
+diffs from action=compare can differ, so they are stored separately.
+
+The cache is opt-in: nothing is cached until a cache is set with set_default_cache.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+
+# The file a cache is stored in if no path is given, relative to the working directory
+DEFAULT_PATH = "edit_cache.sqlite"
+
+# How an edit's diff was made: locally from the revisions' content (get_edits.add_diffs_batch),
+# or by the API's action=compare (get_edits.add_diffs)
+LOCAL_DIFFS = "local"
+COMPARE_DIFFS = "compare"
+
+# The version of the table layout, stored in the file's user_version. Files with an older
+# layout are emptied, since their diffs' mode isn't known
+SCHEMA_VERSION = 2
+
+# SQLite's limit on the number of parameters in a single statement is at least 999
+QUERY_BATCH_SIZE = 500
+
+class EditCache:
+    """A SQLite store of edit dicts (including their added and removed text) that counts
+    its hits and misses.
+
+    Safe to share between threads. Each process opens its own connection to the file.
+    """
+
+    def __init__(self, path=DEFAULT_PATH):
+        """
+        Args:
+            path (str): The path of the SQLite file, which is created if it doesn't exist.
+        """
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self):
+        # A cache sent to a spawned process opens its own connection, with its own counts
+        return {"path": self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state["path"])
+
+    @property
+    def connection(self):
+        # Connections can't be shared with forked processes, so reconnect in a new process
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            if self._connection.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._connection.execute("DROP TABLE IF EXISTS edits")
+                self._connection.execute("PRAGMA user_version = %d" % SCHEMA_VERSION)
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS edits (
+                site TEXT NOT NULL,
+                mode TEXT NOT NULL,
+                revid INTEGER NOT NULL,
+                edit TEXT NOT NULL,
+                PRIMARY KEY (site, mode, revid)
+            )""")
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def get(self, site, revid, mode=LOCAL_DIFFS):
+        """Gets a cached edit.
+
+        Args:
+            site (pywikibot.Site): The site the edit was made on.
+            revid (int): The revision ID of the edit.
+            mode (str): How the edit's diff was made, LOCAL_DIFFS or COMPARE_DIFFS.
+
+        Returns:
+            dict: The edit, or None if it isn't cached.
+        """
+        return self.get_many(site, [revid], mode).get(revid)
+
+    def get_many(self, site, revids, mode=LOCAL_DIFFS):
+        """Gets every cached edit out of a list of revision IDs.
+
+        Args:
+            site (pywikibot.Site): The site the edits were made on.
+            revids (list): The revision IDs of the edits.
+            mode (str): How the edits' diffs were made, LOCAL_DIFFS or COMPARE_DIFFS.
+
+        Returns:
+            dict: The edits that were cached, keyed by revision ID.
+        """
+        revids = list(revids)
+        found = {}
+        with self.lock:
+            for i in range(0, len(revids), QUERY_BATCH_SIZE):
+                batch = revids[i:i + QUERY_BATCH_SIZE]
+                rows = self.connection.execute(
+                    "SELECT revid, edit FROM edits WHERE site = ? AND mode = ? AND revid IN (%s)" % ",".join("?" * len(batch)),
+                    [site_key(site), mode] + batch)
+                found.update((revid, json.loads(edit)) for revid, edit in rows)
+            self.hits += len(found)
+            self.misses += len(revids) - len(found)
+        return found
+
+    def put(self, site, edit, mode=LOCAL_DIFFS):
+        """Caches an edit.
+
+        Args:
+            site (pywikibot.Site): The site the edit was made on.
+            edit (dict): The edit, which must already have its diffs.
+            mode (str): How the edit's diff was made, LOCAL_DIFFS or COMPARE_DIFFS.
+        """
+        self.put_many(site, [edit], mode)
+
+    def put_many(self, site, edits, mode=LOCAL_DIFFS):
+        """Caches a list of edits, replacing any that were already cached.
+
+        Args:
+            site (pywikibot.Site): The site the edits were made on.
+            edits (list): The edits, which must already have their diffs.
+            mode (str): How the edits' diffs were made, LOCAL_DIFFS or COMPARE_DIFFS.
+        """
+        key = site_key(site)
+        with self.lock:
+            self.connection.executemany("INSERT OR REPLACE INTO edits (site, mode, revid, edit) VALUES (?, ?, ?, ?)",
+                [(key, mode, edit["revid"], json.dumps(edit)) for edit in edits])
+            self.connection.commit()
+
+    def stats(self):
+        """Gets the number of hits and misses since the cache was opened, and the number of edits stored.
+
+        Returns:
+            dict: The hits, misses, hit rate and number of stored edits.
+        """
+        with self.lock:
+            size = self.connection.execute("SELECT COUNT(*) FROM edits").fetchone()[0]
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "size": size
+            }
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+def site_key(site):
+    """Gets the string that identifies a site in the cache, e.g. "wikipedia:en"."""
+    return str(site)
+
+def diff_mode(batch_diffs):
+    """Gets the mode of the diffs get_edits.get_diffs makes, given its batch_diffs argument."""
+    return LOCAL_DIFFS if batch_diffs else COMPARE_DIFFS
+
+_default_cache = None
+
+def set_default_cache(cache):
+    """Sets the cache shared by every module, e.g. EditCache(path), or None to not cache edits."""
+    global _default_cache
+    _default_cache = cache
+
+def get_default_cache():
+    """Gets the cache set with set_default_cache, or None if edits aren't cached."""
+    return _default_cache
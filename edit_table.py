@@ -0,0 +1,68 @@
+"""Converts edit dicts to a columnar edit table that metrics can be evaluated over all at once."""
+
+import numpy as np
+import pandas as pd
+
+# The number of tags each column of tag bits holds
+TAG_WORD_BITS = 64
+
+def make_edit_table(edit_dicts: dict) -> pd.DataFrame:
+    """Makes a table with one row per edit out of the edits on several pages.
+
+    Rows are in the same order as the edits when the edit lists are joined in page order,
+    so a row's position can be used to find its edit dict.
+
+    Args:
+        edit_dicts (dict): The dict containing the page names as keys and the
+            list of each page's edits as values.
+
+    Returns:
+        pandas.DataFrame: The table, with the columns page (categorical, in the order of
+            edit_dicts), revid, user, userid, timestamp, size_delta, comment_empty and minor,
+            then the tags as bitmasks of TAG_WORD_BITS tags each, in the columns tags_0,
+            tags_1 and so on. The bit of each tag is given by the dict in table.attrs["tag_bits"].
+    """
+    edits = [edit for edit_list in edit_dicts.values() for edit in edit_list]
+    tag_bits = {}
+    for edit in edits:
+        for tag in edit["tags"]:
+            if tag not in tag_bits:
+                tag_bits[tag] = len(tag_bits)
+    # Page histories can have hundreds of distinct tags (OAuth, abuse filter and so on), so
+    # they are spread over as many words as they need
+    tag_words = np.zeros(((len(tag_bits) + TAG_WORD_BITS - 1) // TAG_WORD_BITS, len(edits)), dtype=np.uint64)
+    for row, edit in enumerate(edits):
+        for tag in edit["tags"]:
+            word, bit = divmod(tag_bits[tag], TAG_WORD_BITS)
+            tag_words[word, row] |= np.uint64(1 << bit)
+
+    table = pd.DataFrame({
+        "page": pd.Categorical(
+            [page for page, edit_list in edit_dicts.items() for _ in edit_list],
+            categories=list(edit_dicts)),
+        "revid": np.array([edit["revid"] for edit in edits], dtype=np.int64),
+        "user": [edit["user"] for edit in edits],
+        "userid": np.array([edit["userid"] for edit in edits], dtype=np.int64),
+        "timestamp": pd.to_datetime([edit["timestamp"] for edit in edits], utc=True),
+        "size_delta": np.array([edit.get("size_delta", 0) for edit in edits], dtype=np.int64),
+        "comment_empty": np.array([edit["comment"] == "" for edit in edits], dtype=bool),
+        "minor": np.array([edit["minor"] for edit in edits], dtype=bool),
+        **{"tags_{}".format(word): words for word, words in enumerate(tag_words)}
+    })
+    table.attrs["tag_bits"] = tag_bits
+    return table
+
+def has_tag(table: pd.DataFrame, tag: str) -> pd.Series:
+    """Gets whether each edit in an edit table has a tag.
+
+    Args:
+        table (pandas.DataFrame): The edit table.
+        tag (str): The tag, e.g. "mobile web edit".
+
+    Returns:
+        pandas.Series: A boolean for each edit.
+    """
+    if tag not in table.attrs["tag_bits"]:
+        return pd.Series(False, index=table.index)
+    word, bit = divmod(table.attrs["tag_bits"][tag], TAG_WORD_BITS)
+    return (table["tags_{}".format(word)] & np.uint64(1 << bit)) != 0
@@ -0,0 +1,250 @@
+"""A local warehouse of edits stored as Parquet files, partitioned by site, page and month.
+
+Syncing a page only retrieves the revisions newer than the newest one already stored, so once
+a set of pages has been synced, investigations can read their edits offline. Queries only read
+the columns they ask for, and only the partitions and row groups that can match their filters.
+
+Usage: python edit_warehouse.py title [title ...]
+Syncs the given English Wikipedia pages into the warehouse at DEFAULT_ROOT.
+"""
+
+import datetime
+import os
+import sys
+import uuid
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pywikibot as pwb
+
+import get_edits
+from edit_cache import site_key
+
+# The directory the shared warehouse is stored in, relative to the working directory
+DEFAULT_ROOT = "edit_warehouse"
+
+PARTITION_SCHEMA = pa.schema([
+    ("site", pa.string()),
+    ("page", pa.string()),
+    ("month", pa.string())
+])
+
+SCHEMA = pa.schema(list(PARTITION_SCHEMA) + [
+    ("revid", pa.int64()),
+    ("parentid", pa.int64()),
+    ("user", pa.string()),
+    ("userid", pa.int64()),
+    ("timestamp", pa.timestamp("s", tz="UTC")),
+    ("comment", pa.string()),
+    ("tags", pa.list_(pa.string())),
+    ("minor", pa.bool_()),
+    ("new_size", pa.int64()),
+    ("size_delta", pa.int64()),
+    ("added", pa.list_(pa.string())),
+    ("removed", pa.list_(pa.string())),
+    ("diff_missing", pa.bool_())
+])
+
+# The columns of an edit dict, and those without the diff text, which is most of the data.
+# Files written before diff_missing was added read it as null, which to_edit_dicts treats as False.
+EDIT_COLUMNS = [name for name in SCHEMA.names if name not in PARTITION_SCHEMA.names]
+METADATA_COLUMNS = [name for name in EDIT_COLUMNS if name not in ("added", "removed")]
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+class EditWarehouse:
+    """A directory of Parquet files holding edit dicts (including their added and removed text),
+    in Hive-style site=/page=/month= partitions.
+
+    Each sync appends new files, so a page's edits are never rewritten.
+    """
+
+    def __init__(self, root=DEFAULT_ROOT):
+        """
+        Args:
+            root (str): The warehouse's directory, which is created if it doesn't exist.
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def dataset(self):
+        # Rediscovered on each query so that files written by a sync are picked up
+        return ds.dataset(self.root, schema=SCHEMA, format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"))
+
+    def add_edits(self, site, title, edits):
+        """Stores a page's edits.
+
+        Args:
+            site (pywikibot.Site): The site the page is on.
+            title (str): The title of the page.
+            edits (list): The edits, which must already have their diffs.
+        """
+        if not edits:
+            return
+        key = site_key(site)
+        table = pa.Table.from_pylist([dict(
+            {column: edit.get(column) for column in EDIT_COLUMNS},
+            site=key,
+            page=title,
+            month=edit["timestamp"][:7],
+            diff_missing=edit.get("diff_missing", False),
+            timestamp=datetime.datetime.strptime(edit["timestamp"], TIMESTAMP_FORMAT).replace(tzinfo=datetime.timezone.utc)
+        ) for edit in edits], schema=SCHEMA)
+
+        # Files from each write get their own names, so a sync only ever adds files
+        ds.write_dataset(table, self.root, format="parquet",
+            partitioning=ds.partitioning(PARTITION_SCHEMA, flavor="hive"),
+            basename_template="part-{}-{{i}}.parquet".format(uuid.uuid4().hex),
+            existing_data_behavior="overwrite_or_ignore")
+
+    def get_high_water_mark(self, site, title):
+        """Gets the newest stored revision of a page.
+
+        Returns:
+            tuple: The revision ID and timestamp (datetime.datetime) of the newest stored edit,
+                or None if none of the page's edits are stored.
+        """
+        table = self.dataset().to_table(columns=["revid", "timestamp"],
+            filter=(ds.field("site") == site_key(site)) & (ds.field("page") == title))
+        if table.num_rows == 0:
+            return None
+        newest = table.sort_by([("revid", "descending")]).slice(0, 1).to_pylist()[0]
+        return newest["revid"], newest["timestamp"]
+
+    def sync_page(self, title, site, **kwargs):
+        """Retrieves and stores the edits on a page that are newer than its high-water mark.
+
+        Args:
+            title (str): The title of the page.
+            site (pywikibot.Site): The site the page is on.
+            **kwargs: Passed on to get_edits.get_edits_async, e.g. workers or end_time.
+
+        Returns:
+            int: The number of edits stored.
+        """
+        high_water_mark = self.get_high_water_mark(site, title)
+        if high_water_mark is not None:
+            # The listing stops at the high-water mark's timestamp, which edits made in the same
+            # second share, so they are told apart by revision ID. A later end_time is kept.
+            revid, timestamp = high_water_mark
+            if kwargs.get("end_time") is None or to_utc(kwargs["end_time"]) <= timestamp:
+                kwargs = dict(kwargs, end_time=timestamp, newer_than=revid)
+        edits = list(get_edits.get_edits_async(title, site, **kwargs))
+        self.add_edits(site, title, edits)
+        return len(edits)
+
+    def sync_pages(self, titles, site, **kwargs):
+        """Syncs each of a list of pages with sync_page.
+
+        Returns:
+            dict: The number of edits stored for each page, keyed by title.
+        """
+        return {title: self.sync_page(title, site, **kwargs) for title in titles}
+
+    def query(self, site=None, titles=None, users=None, start_time=None, end_time=None, columns=None):
+        """Reads the stored edits that match every given filter.
+
+        Args:
+            site (pywikibot.Site): The site the edits were made on.
+            titles (list): The titles of the pages the edits were made on.
+            users (list): The names of the users who made the edits.
+            start_time (datetime.datetime): The newest timestamp to include, as in get_edits.
+            end_time (datetime.datetime): The oldest timestamp to include, as in get_edits.
+            columns (list): The columns to read, e.g. METADATA_COLUMNS. Defaults to every column.
+
+        Returns:
+            pandas.DataFrame: One row per edit, in no particular order.
+        """
+        conditions = []
+        if site is not None:
+            conditions.append(ds.field("site") == site_key(site))
+        if titles is not None:
+            conditions.append(ds.field("page").isin(list(titles)))
+        if users is not None:
+            conditions.append(ds.field("user").isin(list(users)))
+        # The month filters skip whole partitions, the timestamp filters skip row groups and rows
+        if start_time is not None:
+            start_time = to_utc(start_time)
+            conditions.append(ds.field("month") <= start_time.strftime("%Y-%m"))
+            conditions.append(ds.field("timestamp") <= pa.scalar(start_time, SCHEMA.field("timestamp").type))
+        if end_time is not None:
+            end_time = to_utc(end_time)
+            conditions.append(ds.field("month") >= end_time.strftime("%Y-%m"))
+            conditions.append(ds.field("timestamp") >= pa.scalar(end_time, SCHEMA.field("timestamp").type))
+
+        condition = None
+        for expression in conditions:
+            condition = expression if condition is None else condition & expression
+        return self.dataset().to_table(columns=columns, filter=condition).to_pandas()
+
+    def get_edit_dicts(self, site, titles, start_time=None, end_time=None, columns=None):
+        """Reads the stored edits on several pages as edit dicts.
+
+        Args:
+            site (pywikibot.Site): The site the pages are on.
+            titles (list): The titles of the pages.
+            start_time (datetime.datetime): The newest timestamp to include, as in get_edits.
+            end_time (datetime.datetime): The oldest timestamp to include, as in get_edits.
+            columns (list): The edit dict keys to read. Defaults to EDIT_COLUMNS.
+
+        Returns:
+            dict: The list of each page's edits, sorted by most recent first, keyed by title.
+                Pages with no stored edits are left out.
+        """
+        columns = list(columns or EDIT_COLUMNS)
+        table = self.query(site=site, titles=titles, start_time=start_time, end_time=end_time,
+            columns=["page"] + [column for column in columns if column != "page"])
+        edit_dicts = {}
+        for title, edits in table.sort_values("revid", ascending=False).groupby("page", sort=False, observed=True):
+            edit_dicts[title] = to_edit_dicts(edits, columns)
+        return edit_dicts
+
+    def get_user_edits(self, site, username, max_edits=500, columns=None):
+        """Reads a user's most recent stored edits across all pages.
+
+        Returns:
+            list: The edits, sorted by most recent first.
+        """
+        columns = list(columns or EDIT_COLUMNS)
+        table = self.query(site=site, users=[username], columns=columns)
+        return to_edit_dicts(table.sort_values("revid", ascending=False).head(max_edits), columns)
+
+def to_utc(timestamp):
+    """Treats a timestamp without a timezone as UTC, like the API does."""
+    if timestamp.tzinfo is None:
+        return timestamp.replace(tzinfo=datetime.timezone.utc)
+    return timestamp
+
+def to_edit_dicts(table, columns):
+    """Converts rows read from the warehouse back to edit dicts like get_edits returns."""
+    edits = table[columns].to_dict("records")
+    for edit in edits:
+        if "timestamp" in edit:
+            edit["timestamp"] = edit["timestamp"].strftime(TIMESTAMP_FORMAT)
+        for column in ("tags", "added", "removed"):
+            if column in edit:
+                edit[column] = list(edit[column])
+        if "diff_missing" in edit:
+            edit["diff_missing"] = bool(edit["diff_missing"])
+    return edits
+
+_default_warehouse = None
+
+def set_default_warehouse(warehouse):
+    """Sets the warehouse that the report modules read users' edits from, or None to use the API."""
+    global _default_warehouse
+    _default_warehouse = warehouse
+
+def get_default_warehouse():
+    """Gets the warehouse set with set_default_warehouse, or None if edits come from the API."""
+    return _default_warehouse
+
+def main():
+    site = pwb.Site("en", "wikipedia")
+    warehouse = EditWarehouse()
+    for title, count in warehouse.sync_pages(sys.argv[1:], site).items():
+        print("{}: {} new edits".format(title, count))
+
+if __name__ == "__main__":
+    main()
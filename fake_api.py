@@ -0,0 +1,424 @@
+"""A synthetic MediaWiki API served locally, for benchmarking without touching a real wiki."""
+
+import datetime
+import difflib
+import html
+import json
+import random
+import threading
+import time
+import urllib.parse
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from get_edits import TOKEN_PATTERN
+from wiki_client import normalize_username
+
+VOCABULARY = ("company", "revenue", "founded", "headquarters", "products", "chief", "executive",
+    "officer", "board", "directors", "market", "shares", "acquired", "subsidiary", "lawsuit",
+    "settlement", "employees", "annual", "report", "history", "controversy", "award", "brand",
+    "retail", "global", "operations", "citation", "needed", "reference", "source", "early", "life")
+
+class FakeWiki:
+    """An in-memory wiki with generated page histories that answers a subset of the API."""
+
+    def __init__(self, seed=0):
+        self.random = random.Random(seed)
+        self.pages = {}
+        self.revisions = {}
+        self.users = {}
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.next_revid = 1
+
+    def add_page(self, title, num_revisions, start=datetime.datetime(2020, 1, 1), num_users=50):
+        """Generates a page with a history of num_revisions revisions.
+
+        Args:
+            title (str): The title of the page.
+            num_revisions (int): The number of revisions in the page's history.
+            start (datetime.datetime): The time of the page's first revision.
+            num_users (int): The number of distinct editors to draw revisions from.
+        """
+        self.pages[title] = {"pageid": len(self.pages) + 1, "title": title, "history": []}
+        self.add_revisions(title, num_revisions, start, num_users)
+
+    def add_revisions(self, title, num_revisions, start=None, num_users=50):
+        """Generates num_revisions more revisions of a page, continuing its history.
+
+        Args:
+            title (str): The title of the page, which must have been added with add_page.
+            num_revisions (int): The number of revisions to add.
+            start (datetime.datetime): The time of the first new revision. Defaults to
+                a few hours after the page's latest revision.
+            num_users (int): The number of distinct editors to draw revisions from.
+        """
+        rng = self.random
+        page = self.pages[title]
+        latest = page["history"][0] if page["history"] else None
+        lines = latest["text"].split("\n") if latest and latest["text"] else []
+        history = []
+        parentid = latest["revid"] if latest else 0
+        timestamp = start
+        if timestamp is None:
+            timestamp = (datetime.datetime.strptime(latest["timestamp"], "%Y-%m-%dT%H:%M:%SZ") +
+                datetime.timedelta(minutes=rng.randrange(1, 6 * 60)))
+        for _ in range(num_revisions):
+            self.mutate(lines)
+            text = "\n".join(lines)
+            usernum = rng.randrange(num_users)
+            anon = usernum % 5 == 0
+            rev = {
+                "revid": self.next_revid,
+                "parentid": parentid,
+                "user": "10.0.0.%d" % usernum if anon else "User%d" % usernum,
+                "userid": 0 if anon else usernum + 1,
+                "timestamp": timestamp.strftime("%Y-%m-%dT%H:%M:%SZ"),
+                "comment": "" if rng.random() < 0.3 else "copyedit",
+                "tags": ["mobile edit", "mobile web edit"] if rng.random() < 0.2 else [],
+                "size": len(text.encode()),
+                "text": text
+            }
+            if rng.random() < 0.1:
+                rev["minor"] = ""
+            rev["title"] = title
+            self.add_user(rev["user"], rev["userid"], timestamp)
+            self.users[rev["user"]]["contribs"].append(rev)
+            self.revisions[rev["revid"]] = rev
+            history.append(rev)
+            parentid = rev["revid"]
+            self.next_revid += 1
+            timestamp += datetime.timedelta(minutes=rng.randrange(1, 6 * 60))
+        page["history"] = history[::-1] + page["history"]
+
+    def add_user(self, username, userid, first_edit=datetime.datetime(2020, 1, 1)):
+        """Registers a user a random number of days before their first edit, if they don't exist yet."""
+        if username in self.users:
+            return
+        rng = self.random
+        registration = first_edit - datetime.timedelta(days=rng.randrange(0, 3000))
+        groups = ["*", "user", "autoconfirmed"] if rng.random() < 0.8 else ["*", "user"]
+        self.users[username] = {
+            "userid": userid,
+            "name": username,
+            "registration": registration.strftime("%Y-%m-%dT%H:%M:%SZ"),
+            "editcount": rng.randrange(0, 5000),
+            "groups": groups,
+            "gender": rng.choice(["unknown", "male", "female"]),
+            "rights": ["read", "edit", "createpage"] + (["move", "autoconfirmed"] if "autoconfirmed" in groups else []),
+            "contribs": []
+        }
+
+    def mutate(self, lines):
+        """Applies a random edit (adding, changing or removing a line) to a page's lines."""
+        rng = self.random
+        op = rng.random()
+        if not lines or op < 0.5:
+            lines.insert(rng.randrange(len(lines) + 1), " ".join(rng.choices(VOCABULARY, k=rng.randrange(4, 16))))
+        elif op < 0.85:
+            i = rng.randrange(len(lines))
+            words = lines[i].split()
+            words[rng.randrange(len(words))] = rng.choice(VOCABULARY)
+            lines[i] = " ".join(words)
+        else:
+            del lines[rng.randrange(len(lines))]
+
+    def handle(self, params):
+        """Answers an API request.
+
+        Args:
+            params (dict): The API request parameters.
+
+        Returns:
+            dict: The API response.
+        """
+        with self.lock:
+            self.requests += 1
+        action = params.get("action")
+        if action == "compare":
+            return self.compare(params)
+        if action == "query" and params.get("prop") == "revisions":
+            if "revids" in params:
+                return self.revisions_by_id(params)
+            return self.page_revisions(params)
+        if action == "query" and params.get("list") == "users":
+            return self.list_users(params)
+        if action == "query" and params.get("list") == "usercontribs":
+            return self.user_contribs(params)
+        if action == "query" and params.get("list") == "search":
+            return self.search(params)
+        if action == "query" and params.get("list") == "recentchanges":
+            return self.recent_changes(params)
+        return {"error": {"code": "badvalue", "info": "Unsupported request: %r" % params}}
+
+    def page_revisions(self, params):
+        page = self.pages.get(params["titles"])
+        if page is None:
+            return {"query": {"pages": {"-1": {"title": params["titles"], "missing": ""}}}}
+        history = page["history"]
+        # Revisions are listed newest first, so rvstart is the newest and rvend the oldest bound
+        if "rvstart" in params:
+            history = [rev for rev in history if rev["timestamp"] <= params["rvstart"]]
+        if "rvend" in params:
+            history = [rev for rev in history if rev["timestamp"] >= params["rvend"]]
+        limit = 500 if params.get("rvlimit", "max") == "max" else int(params["rvlimit"])
+        offset = int(params.get("rvcontinue", 0))
+        fields = params.get("rvprop", "ids").split("|")
+        result = {"query": {"pages": {str(page["pageid"]): {
+            "pageid": page["pageid"],
+            "title": page["title"],
+            "revisions": [self.format_revision(rev, fields) for rev in history[offset:offset + limit]]
+        }}}}
+        if offset + limit < len(history):
+            result["continue"] = {"rvcontinue": str(offset + limit), "continue": "||"}
+        return result
+
+    def revisions_by_id(self, params):
+        revids = [int(revid) for revid in str(params["revids"]).split("|")]
+        if len(revids) > 50:
+            return {"error": {"code": "toomanyvalues", "info": "Too many values supplied for parameter \"revids\"."}}
+        fields = params.get("rvprop", "ids").split("|")
+        pages = {}
+        for revid in revids:
+            rev = self.revisions[revid]
+            page = self.page_of(rev)
+            entry = pages.setdefault(str(page["pageid"]), {"pageid": page["pageid"], "title": page["title"], "revisions": []})
+            entry["revisions"].append(self.format_revision(rev, fields))
+        return {"query": {"pages": pages}}
+
+    def page_of(self, rev):
+        return self.pages[rev["title"]]
+
+    def list_users(self, params):
+        usernames = str(params["ususers"]).split("|")
+        if len(usernames) > 50:
+            return {"error": {"code": "toomanyvalues", "info": "Too many values supplied for parameter \"ususers\"."}}
+        fields = params.get("usprop", "").split("|")
+        # Like MediaWiki, invalid names (IP addresses) come first, then the rest by name, with
+        # the names normalized and duplicates dropped
+        invalid, users = [], {}
+        for username in usernames:
+            user = self.users.get(normalize_username(username))
+            if user is not None and user["userid"] == 0:
+                invalid.append({"name": username, "invalid": ""})
+            elif user is None:
+                users[normalize_username(username)] = {"name": normalize_username(username), "missing": ""}
+            else:
+                users[user["name"]] = {"userid": user["userid"], "name": user["name"],
+                    **{field: user[field] for field in ("registration", "editcount", "groups", "gender", "rights") if field in fields}}
+        return {"batchcomplete": "", "query": {"users": invalid + [users[name] for name in sorted(users)]}}
+
+    def user_contribs(self, params):
+        user = self.users.get(params["ucuser"])
+        contribs = sorted(user["contribs"], key=lambda rev: rev["timestamp"], reverse=True) if user else []
+        limit = 500 if params.get("uclimit", "max") == "max" else int(params["uclimit"])
+        offset = int(params.get("uccontinue", 0))
+        result = {"query": {"usercontribs": [dict({
+            "userid": rev["userid"],
+            "user": rev["user"],
+            "pageid": self.pages[rev["title"]]["pageid"],
+            "revid": rev["revid"],
+            "parentid": rev["parentid"],
+            "ns": 0,
+            "title": rev["title"],
+            "timestamp": rev["timestamp"],
+            "comment": rev["comment"],
+            "size": rev["size"],
+            "tags": rev["tags"]
+        }, **({"minor": ""} if "minor" in rev else {})) for rev in contribs[offset:offset + limit]]}}
+        if offset + limit < len(contribs):
+            result["continue"] = {"uccontinue": str(offset + limit), "continue": "-||"}
+        return result
+
+    def recent_changes(self, params):
+        # Only rcdir=newer is supported, which lists changes oldest first from rcstart
+        changes = sorted(self.revisions.values(), key=lambda rev: (rev["timestamp"], rev["revid"]))
+        if "rcstart" in params:
+            changes = [rev for rev in changes if rev["timestamp"] >= params["rcstart"]]
+        if "rccontinue" in params:
+            timestamp, rcid = params["rccontinue"].split("|")
+            changes = [rev for rev in changes if (rev["timestamp"], rev["revid"]) >= (timestamp, int(rcid))]
+        limit = 500 if params.get("rclimit", "max") == "max" else int(params["rclimit"])
+        result = {"query": {"recentchanges": [dict({
+            "type": "edit" if rev["parentid"] else "new",
+            "ns": 0,
+            "title": rev["title"],
+            "pageid": self.pages[rev["title"]]["pageid"],
+            "revid": rev["revid"],
+            "old_revid": rev["parentid"],
+            "rcid": rev["revid"],
+            "user": rev["user"],
+            "userid": rev["userid"],
+            "oldlen": self.revisions[rev["parentid"]]["size"] if rev["parentid"] else 0,
+            "newlen": rev["size"],
+            "timestamp": rev["timestamp"],
+            "comment": rev["comment"],
+            "tags": rev["tags"]
+        }, **({"minor": ""} if "minor" in rev else {})) for rev in changes[:limit]]}}
+        if len(changes) > limit:
+            result["continue"] = {"rccontinue": "%s|%d" % (changes[limit]["timestamp"], changes[limit]["revid"]), "continue": "-||"}
+        return result
+
+    def search(self, params):
+        titles = [title for title in self.pages if params["srsearch"].lower() in title.lower()]
+        limit = int(params.get("srlimit", 10))
+        offset = int(params.get("sroffset", 0))
+        result = {"query": {"search": [{"ns": 0, "title": title, "pageid": self.pages[title]["pageid"]}
+            for title in titles[offset:offset + limit]]}}
+        if offset + limit < len(titles):
+            result["continue"] = {"sroffset": offset + limit, "continue": "-||"}
+        return result
+
+    def format_revision(self, rev, fields):
+        formatted = {}
+        if "ids" in fields:
+            formatted["revid"] = rev["revid"]
+            formatted["parentid"] = rev["parentid"]
+        for field in ("timestamp", "user", "userid", "comment", "tags", "size"):
+            if field in fields:
+                formatted[field] = rev[field]
+        if "flags" in fields and "minor" in rev:
+            formatted["minor"] = ""
+        if "content" in fields:
+            formatted["slots"] = {"main": {"contentmodel": "wikitext", "contentformat": "text/x-wiki"}}
+            if rev.get("texthidden"):
+                # Like a revision deleted by an administrator, whose size is still listed
+                formatted["texthidden"] = formatted["slots"]["main"]["texthidden"] = ""
+            else:
+                formatted["slots"]["main"]["*"] = rev["text"]
+        return formatted
+
+    def compare(self, params):
+        rev = self.revisions[int(params["fromrev"])]
+        parent = self.revisions.get(rev["parentid"], {"text": "", "size": 0})
+        return {"compare": {
+            "fromsize": parent["size"],
+            "tosize": rev["size"],
+            "*": diff_html(parent["text"], rev["text"])
+        }}
+
+    def serve(self, latency=0.0, error_rate=0.0):
+        """Starts serving the API over HTTP on a free local port.
+
+        Args:
+            latency (float): The number of seconds to wait before answering each request.
+            error_rate (float): The fraction of requests to turn away, alternately with an
+                HTTP 429 or a maxlag error, to exercise clients' backoff.
+
+        Returns:
+            FakeWikiServer: The running server, which should be closed when done.
+        """
+        return FakeWikiServer(self, latency, error_rate)
+
+class FakeWikiServer:
+    """A running HTTP server for a FakeWiki. Can be used as a context manager."""
+
+    def __init__(self, wiki, latency=0.0, error_rate=0.0):
+        self.wiki = wiki
+        self.latency = latency
+        self.error_rate = error_rate
+        self.errors = 0
+        self.random = random.Random(0)
+
+        server = self
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                self.respond(urllib.parse.urlsplit(self.path).query)
+
+            def do_POST(self):
+                self.respond(self.rfile.read(int(self.headers.get("Content-Length", 0))).decode())
+
+            def respond(self, query):
+                params = dict(urllib.parse.parse_qsl(query))
+                time.sleep(server.latency)
+                status = 200
+                headers = {"Content-Type": "application/json"}
+                with server.wiki.lock:
+                    error = server.random.random() < server.error_rate
+                    if error:
+                        server.errors += 1
+                if error and server.errors % 2:
+                    status = 429
+                    headers["Retry-After"] = "0"
+                    result = {"error": {"code": "ratelimited", "info": "Too many requests."}}
+                elif error:
+                    headers["Retry-After"] = "0"
+                    result = {"error": {"code": "maxlag", "info": "Waiting for a database server: 6 seconds lagged.", "lag": 6}}
+                else:
+                    result = server.wiki.handle(params)
+                body = json.dumps(result).encode()
+                self.send_response(status)
+                for header, value in headers.items():
+                    self.send_header(header, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self.url = "http://127.0.0.1:%d/w/api.php" % self.httpd.server_address[1]
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+
+    def submit(self, site, params):
+        """Sends an API request to the server. Has the same signature as get_edits.submit."""
+        data = urllib.parse.urlencode({key: str(value) for key, value in params.items()}).encode()
+        with urllib.request.urlopen(self.url, data=data) as response:
+            return json.loads(response.read())
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def diff_html(old_text, new_text):
+    """Renders the diff between two texts as the table rows of a MediaWiki compare response."""
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    rows = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_lines, new_lines).get_opcodes():
+        if tag == "equal":
+            continue
+        old_block = old_lines[i1:i2]
+        new_block = new_lines[j1:j2]
+        if tag == "replace":
+            for old_line, new_line in zip(old_block, new_block):
+                rows.append(changed_row(old_line, new_line))
+            paired = min(len(old_block), len(new_block))
+            old_block = old_block[paired:]
+            new_block = new_block[paired:]
+        for line in new_block:
+            rows.append('<tr><td colspan="2" class="diff-empty diff-side-deleted"></td><td class="diff-marker" data-marker="+"></td>'
+                '<td class="diff-addedline diff-side-added">%s</td></tr>' % (line and "<div>%s</div>" % html.escape(line)))
+        for line in old_block:
+            rows.append('<tr><td class="diff-marker" data-marker="−"></td><td class="diff-deletedline diff-side-deleted">%s</td>'
+                '<td colspan="2" class="diff-empty diff-side-added"></td></tr>' % (line and "<div>%s</div>" % html.escape(line)))
+    return "".join(rows)
+
+def changed_row(old_line, new_line):
+    old_tokens = TOKEN_PATTERN.findall(old_line)
+    new_tokens = TOKEN_PATTERN.findall(new_line)
+    old_html = []
+    new_html = []
+    for tag, i1, i2, j1, j2 in difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False).get_opcodes():
+        old_part = html.escape("".join(old_tokens[i1:i2]))
+        new_part = html.escape("".join(new_tokens[j1:j2]))
+        if tag == "equal":
+            old_html.append(old_part)
+            new_html.append(new_part)
+            continue
+        if old_part:
+            old_html.append('<del class="diffchange diffchange-inline">%s</del>' % old_part)
+        if new_part:
+            new_html.append('<ins class="diffchange diffchange-inline">%s</ins>' % new_part)
+    return ('<tr><td class="diff-marker" data-marker="−"></td><td class="diff-deletedline diff-side-deleted"><div>%s</div></td>'
+        '<td class="diff-marker" data-marker="+"></td><td class="diff-addedline diff-side-added"><div>%s</div></td></tr>'
+        % ("".join(old_html), "".join(new_html)))
@@ -4,10 +4,42 @@ import pywikibot as pwb # pip install pywikibot "wikitextparser>=0.47.5"
 import pywikibot.data.api as api
 import pandas as pd
 import datetime
-from bs4 import BeautifulSoup
+from concurrent.futures import ThreadPoolExecutor, wait, as_completed, FIRST_COMPLETED
+import difflib
+import html
+import re
 import threading
+import edit_cache
+import wiki_client
 
-def get_edits(title, site, start_time=None, end_time=None, past_n_days=None, max_edits=None):
+# The most revisions whose content the API will return in a single request
+DIFF_BATCH_SIZE = 50
+
+# The default number of threads retrieving diffs for a page at once
+DEFAULT_WORKERS = 5
+
+# The most revision IDs the API accepts in a single request
+IDS_BATCH_SIZE = 50
+
+# The edit dict keys that are only known once an edit's diff has been retrieved
+DIFF_FIELDS = ("added", "removed")
+
+# Splits a line into words, runs of whitespace, and single punctuation characters
+# so that inline changes are reported at roughly the granularity MediaWiki uses
+TOKEN_PATTERN = re.compile(r"\w+|\s+|[^\w\s]")
+
+# The parts of a MediaWiki diff table that parse_diff_html reads. Rows and cells that aren't
+# closed end where the next one starts, as they would in a browser.
+ROW_PATTERN = re.compile(r"<tr\b[^>]*>(.*?)(?:</tr\s*>|(?=<tr\b)|\Z)", re.S | re.I)
+CELL_PATTERN = re.compile(r"<td\b([^>]*)>(.*?)(?:</td\s*>|(?=<td\b)|(?=<th\b)|\Z)", re.S | re.I)
+CLASS_PATTERN = re.compile(r"""\bclass\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.I)
+INS_PATTERN = re.compile(r"<ins\b[^>]*>(.*?)</ins\s*>", re.S | re.I)
+DEL_PATTERN = re.compile(r"<del\b[^>]*>(.*?)</del\s*>", re.S | re.I)
+DIV_TAG_PATTERN = re.compile(r"<(/?)div\b[^>]*>", re.I)
+TAG_PATTERN = re.compile(r"<[^>]*>")
+
+def get_edits(title, site, start_time=None, end_time=None, past_n_days=None, max_edits=None, batch_diffs=True,
+        workers=DEFAULT_WORKERS, use_cache=True, newer_than=None):
     """Gets the list of edits on a page, optionally between two timestamps.
 
     See get_edits_async for a description of the parameters.
@@ -17,13 +49,19 @@ def get_edits(title, site, start_time=None, end_time=None, past_n_days=None, max
     """
     return sorted(
         get_edits_async(title, site, start_time=start_time, end_time=end_time, 
-            past_n_days=past_n_days, max_edits=max_edits),
+            past_n_days=past_n_days, max_edits=max_edits, batch_diffs=batch_diffs, workers=workers,
+            use_cache=use_cache, newer_than=newer_than),
         key=lambda edit: edit['timestamp'],
         reverse=True
     )
 
-def get_edits_async(title, site, start_time=None, end_time=None, past_n_days=None, max_edits=None):
-    """Gets the list of edits on a page asynchronously, optionally between two timestamps.
+def get_edits_async(title, site, start_time=None, end_time=None, past_n_days=None, max_edits=None, batch_diffs=True,
+        workers=DEFAULT_WORKERS, use_cache=True, newer_than=None):
+    """Yields the edits on a page as their diffs are retrieved, optionally between two timestamps.
+
+    Revisions are listed by following the API's continue tokens in order, while the diffs of
+    the revisions already listed are retrieved on a pool of worker threads. Edits found in the
+    shared edit cache are yielded straight away without retrieving their diffs.
 
     Args:
         title (str): The title of the page.
@@ -32,13 +70,239 @@ def get_edits_async(title, site, start_time=None, end_time=None, past_n_days=Non
         end_time (datetime.datetime): The end timestamp for the edits.
         past_n_days (int): The number of days in the past to retrieve edits for.
         max_edits (int): The maximum number of edits to retrieve.
+        batch_diffs (bool): Whether to fetch the content of many revisions per request and
+            compute the diffs locally instead of making one compare request per revision.
+        workers (int): The number of threads retrieving diffs at once.
+        use_cache (bool): Whether to look edits up in and save them to the shared edit cache.
+        newer_than (int): If given, revisions with this revision ID or lower are skipped
+            before their diffs are retrieved, e.g. ones that are already stored.
 
-    Returns:
-        list: The list of the page's edits, sorted by most recent first.
+    Yields:
+        dict: Each of the page's edits, in the order their diffs finish.
     """
+    params = get_revision_params(title, start_time, end_time, past_n_days, max_edits)
+
+    # Each revision's parent is usually the next one listed, so one slot of each content
+    # batch is left for the parent of the batch's oldest revision
+    chunk_size = DIFF_BATCH_SIZE - 1 if batch_diffs else 1
+    listed = 0
+    pending = set()
+    cache = edit_cache.get_default_cache() if use_cache else None
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        try:
+            for revs in get_revisions(site, params):
+                if max_edits is not None:
+                    revs = revs[:max_edits - listed]
+                listed += len(revs)
+                if newer_than is not None:
+                    revs = [rev for rev in revs if rev["revid"] > newer_than]
+
+                edits = [get_edit_dict(rev, site, [], diffs=False) for rev in revs]
+                if cache:
+                    cached = cache.get_many(site, [edit["revid"] for edit in edits], edit_cache.diff_mode(batch_diffs))
+                    yield from cached.values()
+                    edits = [edit for edit in edits if edit["revid"] not in cached]
+
+                for i in range(0, len(edits), chunk_size):
+                    # Don't let listing get too far ahead of the workers
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        yield from (edit for future in done for edit in future.result())
+                    pending.add(executor.submit(get_diffs, edits[i:i + chunk_size], site, batch_diffs, cache))
+
+                done = {future for future in pending if future.done()}
+                pending -= done
+                yield from (edit for future in done for edit in future.result())
+
+                if max_edits is not None and listed >= max_edits:
+                    break
+
+            for future in as_completed(pending):
+                yield from future.result()
+        finally:
+            # If the caller stops early, don't retrieve diffs that will never be used
+            for future in pending:
+                future.cancel()
+
+def iter_edits(title, site, start_time=None, end_time=None, past_n_days=None, max_edits=None,
+        use_cache=True, newer_than=None, diffs=True):
+    """Lazily yields the edits on a page, newest first, in the order the API lists them.
+
+    Nothing is retrieved until the first edit is asked for, and only one response of revisions
+    is held at a time, so memory use doesn't grow with the length of the page's history. Each
+    edit's size_delta is worked out from the rvprop=size of its parent, which is usually the
+    next revision listed. The edits are LazyEdits: their added and removed text is only
+    retrieved when one of those keys is first read, for the whole batch of edits listed
+    alongside it at once. Listing stops as soon as max_edits edits have been yielded or the
+    caller stops iterating.
+
+    Args:
+        title (str): The title of the page.
+        site (pywikibot.Site): The site object for the wiki.
+        start_time (datetime.datetime): The start timestamp for the edits.
+        end_time (datetime.datetime): The end timestamp for the edits.
+        past_n_days (int): The number of days in the past to retrieve edits for.
+        max_edits (int): The maximum number of edits to retrieve.
+        use_cache (bool): Whether to look edits up in and save them to the shared edit cache.
+            Cached edits are yielded as plain edit dicts with their diffs.
+        newer_than (int): If given, revisions with this revision ID or lower are skipped.
+        diffs (bool): Whether the edits' diffs can be retrieved. If False, the edits are plain
+            edit dicts with only the metadata (see sus_metrics.needs_diffs), and the edit cache
+            isn't used.
+
+    Yields:
+        dict: Each of the page's edits, most recent first.
+    """
+    params = get_revision_params(title, start_time, end_time, past_n_days, max_edits)
+    cache = edit_cache.get_default_cache() if use_cache and diffs else None
+    listed = 0
+    # The edits at the end of the last response whose parents weren't listed in it
+    held = []
+
+    for revs in get_revisions(site, params):
+        # The sizes of the revisions left out below are still needed for their children
+        sizes = {rev["revid"]: rev.get("size", 0) for rev in revs}
+        if max_edits is not None:
+            revs = revs[:max_edits - listed]
+        listed += len(revs)
+        if newer_than is not None:
+            revs = [rev for rev in revs if rev["revid"] > newer_than]
+        edits = make_listed_edits(revs, site, cache, diffs)
+        finished = max_edits is not None and listed >= max_edits
+
+        # The parent of a response's oldest revision is usually the first revision of the next
+        # response, so the edits from the first one with an unlisted parent are held back until then
+        cut = len(edits)
+        if not finished:
+            cut = next((i for i, edit in enumerate(edits) if not has_parent_size(edit, sizes)), len(edits))
+        yield from add_size_deltas(held + edits[:cut], sizes, site)
+        held = edits[cut:]
+        if finished:
+            return
+
+    yield from add_size_deltas(held, {}, site)
+
+def make_listed_edits(revs, site, cache=None, diffs=True):
+    """Makes the edits yielded by iter_edits out of a response's revisions, reading any that are cached."""
     edits = []
-    threads = []
+    for rev in revs:
+        edit = get_edit_dict(rev, site, [], diffs=False)
+        edit["new_size"] = rev.get("size", 0)
+        edits.append(edit)
+    return make_lazy_edits(edits, site, cache) if diffs else edits
+
+def make_lazy_edits(edits, site, cache=None):
+    """Turns edit dicts without their diffs into LazyEdits, so that the diffs are only retrieved
+    if they are read, reading any edits that are cached instead.
+
+    Args:
+        edits (list): The edit dicts, with only their metadata.
+        site (pywikibot.Site): The site object for the wiki.
+        cache (edit_cache.EditCache): The cache to read edits from and save their diffs to, if any.
+
+    Returns:
+        list: The cached edits and LazyEdits, in the same order as edits.
+    """
+    cached = cache.get_many(site, [edit["revid"] for edit in edits]) if cache else {}
+    edits = [cached[edit["revid"]] if edit["revid"] in cached else LazyEdit(edit) for edit in edits]
 
+    # Each batch's diffs are retrieved together, in as few requests as add_diffs_batch needs
+    lazy_edits = [edit for edit in edits if isinstance(edit, LazyEdit)]
+    for i in range(0, len(lazy_edits), DIFF_BATCH_SIZE - 1):
+        DiffBatch(lazy_edits[i:i + DIFF_BATCH_SIZE - 1], site, cache)
+    return edits
+
+def has_parent_size(edit, sizes):
+    # Cached edits already have their size_delta, and page creations have no parent
+    return "size_delta" in edit or not edit["parentid"] or edit["parentid"] in sizes
+
+def add_size_deltas(edits, sizes, site):
+    """Sets the size_delta of edits from their parents' sizes, requesting the sizes of any
+    parents that aren't in sizes, and returns the edits.
+    """
+    missing = sorted({edit["parentid"] for edit in edits if not has_parent_size(edit, sizes)})
+    if missing:
+        sizes = {**sizes, **get_sizes(site, missing)}
+    for edit in edits:
+        if "size_delta" not in edit:
+            # As with the diffs, a missing or hidden parent counts as an empty page
+            edit["size_delta"] = edit["new_size"] - sizes.get(edit["parentid"], 0)
+    return edits
+
+def get_sizes(site, revids):
+    """Gets the byte sizes of revisions, IDS_BATCH_SIZE revisions per request.
+
+    Returns:
+        dict: The size of each revision, keyed by revision ID.
+    """
+    sizes = {}
+    for i in range(0, len(revids), IDS_BATCH_SIZE):
+        result = submit(site, {
+            "action": "query",
+            "format": "json",
+            "prop": "revisions",
+            "revids": "|".join(str(revid) for revid in revids[i:i + IDS_BATCH_SIZE]),
+            "rvprop": "ids|size"
+        })
+        for page in result.get("query", {}).get("pages", {}).values():
+            for rev in page.get("revisions", []):
+                sizes[rev["revid"]] = rev.get("size", 0)
+    return sizes
+
+class LazyEdit(dict):
+    """An edit dict whose diff is retrieved the first time added or removed is read,
+    through either edit[key] or edit.get(key).
+
+    Once the diff has been retrieved it is an ordinary edit dict with every key.
+    """
+
+    def __init__(self, edit):
+        super().__init__(edit)
+        self.batch = None
+
+    def __missing__(self, key):
+        if key in DIFF_FIELDS and self.batch is not None:
+            self.batch.load()
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def has_diffs(self):
+        """Whether the edit's diff has been retrieved."""
+        return self.batch is None
+
+    def __reduce__(self):
+        # Only the edit dict is pickled, e.g. when sending edits to another process
+        return dict, (dict(self),)
+
+class DiffBatch:
+    """A batch of LazyEdits whose diffs are retrieved together when any of them needs its diff."""
+
+    def __init__(self, edits, site, cache=None):
+        self.edits = edits
+        self.site = site
+        self.cache = cache
+        self.lock = threading.Lock()
+        for edit in edits:
+            edit.batch = self
+
+    def load(self):
+        with self.lock:
+            if self.edits is None:
+                return
+            get_diffs(self.edits, self.site, cache=self.cache)
+            for edit in self.edits:
+                edit.batch = None
+            self.edits = None
+
+def get_revision_params(title, start_time=None, end_time=None, past_n_days=None, max_edits=None):
+    """Gets the prop=revisions parameters that list a page's revisions, newest first, between two timestamps."""
     if past_n_days is not None and start_time is None:
         start_time = datetime.datetime.now() - datetime.timedelta(days=past_n_days)
 
@@ -48,39 +312,132 @@ def get_edits_async(title, site, start_time=None, end_time=None, past_n_days=Non
         "prop": "revisions",
         "titles": title,
         "rvprop": "ids|timestamp|user|userid|comment|tags|size|flags",
-        "rvlimit": "max"
+        "rvlimit": max_edits if max_edits is not None and max_edits < 500 else "max"
     }
     if start_time:
         params["rvstart"] = start_time.strftime("%Y-%m-%dT%H:%M:%SZ")
     if end_time:
         params["rvend"] = end_time.strftime("%Y-%m-%dT%H:%M:%SZ")
+    return params
 
-    def get_revisions(params):
-        req = api.Request(site, parameters=params)
-        result = req.submit()
-        if 'query' in result and 'pages' in result['query']:
-            for page_id in result['query']['pages']:
-                page = result['query']['pages'][page_id]
-                if 'revisions' in page:
-                    for rev in page['revisions']:
-                        get_edit_dict(rev, site, edits)
-
-    with ThreadPoolExecutor(max_workers=5) as executor:
-        while True:
-            params['rvcontinue'] = edits[-1]['revid'] if edits else 0
-            thread = threading.Thread(target=get_revisions, args=(params,))
-            threads.append(thread)
-            thread.start()
-            for t in threads:
-                t.join()
-            if len(edits) >= max_edits or 'continue' not in params:
-                break
+def get_revisions(site, params):
+    """Yields the revisions returned by a prop=revisions query one response at a time,
+    following the API's continue tokens.
+
+    Args:
+        site (pywikibot.Site): The site object for the wiki.
+        params (dict): The API request parameters.
+
+    Yields:
+        list: The revisions in each response.
+    """
+    params = dict(params)
+    while True:
+        result = submit(site, params)
+        for page in result.get("query", {}).get("pages", {}).values():
+            if "revisions" in page:
+                yield page["revisions"]
+        if "continue" not in result:
+            return
+        params.update(result["continue"])
+
+def get_user_edits(username, site, max_edits=500, use_cache=True):
+    """Gets a user's most recent edits across all pages.
+
+    The edits are listed with list=usercontribs and their diffs are retrieved with batched
+    revision content requests, rather than querying each edit's page separately.
+
+    Args:
+        username (str): The name of the user.
+        site (pywikibot.Site): The site object for the wiki.
+        max_edits (int): The maximum number of edits to retrieve.
+        use_cache (bool): Whether to look edits up in and save them to the shared edit cache.
+
+    Returns:
+        list: The list of the user's edits, sorted by most recent first.
+    """
+    return get_edits_from_contribs(get_contributions(username, site, max_edits), site, use_cache=use_cache)
+
+def get_contributions(username, site, max_edits=500):
+    """Gets a user's most recent list=usercontribs entries, following the API's continue tokens.
+
+    Args:
+        username (str): The name of the user.
+        site (pywikibot.Site): The site object for the wiki.
+        max_edits (int): The maximum number of contributions to retrieve.
+
+    Returns:
+        list: The contributions, sorted by most recent first.
+    """
+    contribs = []
+    params = {
+        "action": "query",
+        "format": "json",
+        "list": "usercontribs",
+        "ucuser": username,
+        "ucprop": "ids|title|timestamp|comment|size|flags|tags",
+        "uclimit": min(max_edits, 500)
+    }
+    while len(contribs) < max_edits:
+        result = submit(site, params)
+        contribs += result["query"]["usercontribs"]
+        if "continue" not in result:
+            break
+        params.update(result["continue"])
+    return contribs[:max_edits]
+
+def get_edits_from_contribs(contribs, site, use_cache=True):
+    """Converts list=usercontribs entries to edits, retrieving the diffs of any that aren't cached.
 
+    Args:
+        contribs (list): The contributions, which must include the user and user ID of the
+            contributor (list=usercontribs always does).
+        site (pywikibot.Site): The site object for the wiki.
+        use_cache (bool): Whether to look edits up in and save them to the shared edit cache.
+
+    Returns:
+        list: The edits, in the same order as the contributions.
+    """
+    edits = [get_edit_dict(contrib, site, [], diffs=False) for contrib in contribs]
+    cache = edit_cache.get_default_cache() if use_cache else None
+    if cache:
+        cached = cache.get_many(site, [edit["revid"] for edit in edits])
+        get_diffs([edit for edit in edits if edit["revid"] not in cached], site, cache=cache)
+        edits = [cached.get(edit["revid"], edit) for edit in edits]
+    else:
+        get_diffs(edits, site)
     return edits
 
-def get_edit_dict(rev, site, edits):
+def get_diffs(edits, site, batch_diffs=True, cache=None):
+    """Adds the diffs to a list of edits, saves them to the cache if one is given, and returns them."""
+    if batch_diffs:
+        add_diffs_batch(edits, site)
+    else:
+        for edit in edits:
+            add_diffs(edit, site)
+    if cache and edits:
+        cache.put_many(site, edits, edit_cache.diff_mode(batch_diffs))
+    return edits
+
+def submit(site, params):
+    """Submits a request to a site's API, through the default wiki_client if one is set.
+
+    Args:
+        site (pywikibot.Site): The site object for the wiki.
+        params (dict): The API request parameters.
+
+    Returns:
+        dict: The parsed API response.
+    """
+    client = wiki_client.get_default_client()
+    if client is not None:
+        return client.submit(site, params)
+    return api.Request(site, parameters=params).submit()
+
+def get_edit_dict(rev, site, edits, diffs=True):
     edit = {
         "revid": rev["revid"],
+        "parentid": rev.get("parentid", 0),
         "user": rev["user"],
         "userid": rev["userid"] if rev["user"] != "" else -1,
         "comment": rev["comment"] if "comment" in rev else "",
@@ -88,42 +445,245 @@ def get_edit_dict(rev, site, edits):
         "tags": rev["tags"],
         "minor": "minor" in rev
     }
-    add_diffs(edit, site)
+    if diffs:
+        add_diffs(edit, site)
     edits.append(edit)
+    return edit
 
 def add_diffs(edit, site):
-    req = api.Request(site, parameters={
+    result = submit(site, {
         "action": "compare",
         "fromrev": edit["revid"],
         "torelative": "prev",
         "prop": "diff|size"
     })
-    result = req.submit()
     compare = result["compare"]
-    diff = compare["*"]
-    soup = BeautifulSoup(diff, features="html.parser")
-    added = []
-    removed = []
-    for tr in soup.find_all("tr"):
-        added_line = tr.find("td", class_="diff-addedline")
-        deleted_line = tr.find("td", class_="diff-deletedline")
-        if added_line and deleted_line:
-            added += [text.get_text() for text in added_line.find_all("ins")]
-            removed += [text.get_text() for text in deleted_line.find_all("del")]
-        elif added_line:
-            div = added_line.find("div")
-            if div:
-                added.append(div.get_text())
-        elif deleted_line:
-            div = deleted_line.find("div")
-            if div:
-                removed.append(div.get_text())
-
+    added, removed = parse_diff_html(compare["*"])
     edit["added"] = added
     edit["removed"] = removed
     edit["new_size"] = compare["tosize"]
     edit["size_delta"] = compare["tosize"] - compare["fromsize"]
 
+def parse_diff_html(diff):
+    """Gets the added and removed text out of the diff table of a MediaWiki compare response.
+
+    The table is scanned once with regular expressions rather than parsed into a tree. In a row
+    with both an added and a deleted line, only the <ins> and <del> runs inside them were changed.
+    A row with only one of them added or removed the whole line in its <div>.
+
+    Args:
+        diff (str): The compare response's diff HTML (its "*" key).
+
+    Returns:
+        tuple: The list of added strings and the list of removed strings.
+    """
+    added = []
+    removed = []
+    for row in ROW_PATTERN.finditer(diff):
+        added_line = deleted_line = None
+        for cell in CELL_PATTERN.finditer(row.group(1)):
+            attributes = cell.group(1)
+            if "diff-" not in attributes:
+                continue
+            classes = get_classes(attributes)
+            if added_line is None and "diff-addedline" in classes:
+                added_line = cell.group(2)
+            if deleted_line is None and "diff-deletedline" in classes:
+                deleted_line = cell.group(2)
+
+        if added_line is not None and deleted_line is not None:
+            added += [get_text(text) for text in INS_PATTERN.findall(added_line)]
+            removed += [get_text(text) for text in DEL_PATTERN.findall(deleted_line)]
+        elif added_line is not None:
+            div = get_first_div(added_line)
+            if div is not None:
+                added.append(get_text(div))
+        elif deleted_line is not None:
+            div = get_first_div(deleted_line)
+            if div is not None:
+                removed.append(get_text(div))
+    return added, removed
+
+def get_classes(attributes):
+    match = CLASS_PATTERN.search(attributes)
+    if match is None:
+        return []
+    return next(group for group in match.groups() if group is not None).split()
+
+def get_first_div(cell):
+    """Gets the inner HTML of the first <div> in a table cell, including any nested divs, or None if there isn't one."""
+    depth = 0
+    start = None
+    for tag in DIV_TAG_PATTERN.finditer(cell):
+        if not tag.group(1):
+            if depth == 0:
+                start = tag.end()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                return cell[start:tag.start()]
+    # An unclosed div runs to the end of the cell
+    return cell[start:] if start is not None else None
+
+def get_text(fragment):
+    """Gets the text of an HTML fragment, without its tags and with its character references decoded."""
+    return html.unescape(TAG_PATTERN.sub("", fragment))
+
+def add_diffs_batch(edits, site, batch_size=DIFF_BATCH_SIZE):
+    """Adds the added/removed text and size change to many edits at once.
+
+    Instead of one compare request per edit, the content of every edit and of its parent
+    revision is fetched batch_size revisions at a time and the diffs are computed locally.
+    Within a page history most parents are themselves in the batch, so a page's N edits
+    cost about N / batch_size requests.
+
+    Edits whose revision or parent revision has hidden or deleted text can't be diffed, and
+    are marked with diff_missing instead (see get_diff_texts).
+
+    Args:
+        edits (list): The edit dicts to add the diffs to.
+        site (pywikibot.Site): The site object for the wiki.
+        batch_size (int): The number of revisions to request the content of at once.
+    """
+    revids = {edit["revid"] for edit in edits} | {edit["parentid"] for edit in edits if edit["parentid"]}
+    contents = get_contents(site, sorted(revids), batch_size)
+
+    for edit in edits:
+        texts = get_diff_texts(edit, contents)
+        if texts is None:
+            mark_diff_missing(edit)
+        else:
+            edit["added"], edit["removed"] = diff_texts(*texts)
+        add_content_sizes(edit, contents)
+
+def get_diff_texts(edit, contents):
+    """Gets the old and new wikitext to diff an edit with, out of the contents get_contents retrieved.
+
+    Page creations have no parent, so they are diffed against an empty page. A revision whose
+    text is hidden (or suppressed) or that has been deleted has no text to diff with, and
+    diffing against an empty page instead would count the whole page as added or removed.
+
+    Returns:
+        tuple: The old and new text, or None if either can't be read.
+    """
+    new_text = contents.get(edit["revid"], (None, 0))[0]
+    old_text = contents.get(edit["parentid"], (None, 0))[0] if edit["parentid"] else ""
+    if old_text is None or new_text is None:
+        return None
+    return old_text, new_text
+
+def mark_diff_missing(edit):
+    """Marks an edit as having no diff, with nothing added or removed, so that its text isn't counted."""
+    edit["added"], edit["removed"] = [], []
+    edit["diff_missing"] = True
+
+def add_content_sizes(edit, contents):
+    """Sets an edit's new size and size change from the sizes get_contents retrieved, keeping
+    any it already has when its revision or parent revision wasn't returned (e.g. it was deleted).
+    """
+    if edit["revid"] not in contents:
+        edit.setdefault("new_size", 0)
+        edit.setdefault("size_delta", 0)
+        return
+    new_size = contents[edit["revid"]][1]
+    edit["new_size"] = new_size
+    if not edit["parentid"]:
+        edit["size_delta"] = new_size
+    elif edit["parentid"] in contents:
+        edit["size_delta"] = new_size - contents[edit["parentid"]][1]
+    else:
+        edit.setdefault("size_delta", 0)
+
+def get_contents(site, revids, batch_size=DIFF_BATCH_SIZE):
+    """Gets the wikitext and byte size of revisions, batch_size revisions per request.
+
+    Args:
+        site (pywikibot.Site): The site object for the wiki.
+        revids (list): The IDs of the revisions.
+        batch_size (int): The number of revisions to request the content of at once.
+
+    Returns:
+        dict: The (text, size) tuple of each revision that was returned, keyed by revision ID.
+            The text is None if it is hidden.
+    """
+    contents = {}
+    for i in range(0, len(revids), batch_size):
+        params = {
+            "action": "query",
+            "format": "json",
+            "prop": "revisions",
+            "revids": "|".join(str(revid) for revid in revids[i:i + batch_size]),
+            "rvprop": "ids|size|content",
+            "rvslots": "main"
+        }
+        while True:
+            result = submit(site, params)
+            for page in result.get("query", {}).get("pages", {}).values():
+                for rev in page.get("revisions", []):
+                    contents[rev["revid"]] = (get_rev_text(rev), rev.get("size", 0))
+            # Large batches can be split across several responses
+            if "continue" not in result:
+                break
+            params.update(result["continue"])
+    return contents
+
+def get_rev_text(rev):
+    """Gets the wikitext of a revision returned by prop=revisions, or None if it is hidden."""
+    if "slots" in rev:
+        rev = rev["slots"]["main"]
+    return rev.get("*", rev.get("content"))
+
+def diff_texts(old_text, new_text):
+    """Diffs two revisions' wikitext the way MediaWiki's compare output reports it.
+
+    Lines that only appear on one side are reported whole. Changed lines are paired up
+    and only the inline words that changed are reported.
+
+    Args:
+        old_text (str): The wikitext of the older revision.
+        new_text (str): The wikitext of the newer revision.
+
+    Returns:
+        tuple: The list of added strings and the list of removed strings.
+    """
+    old_lines = old_text.splitlines()
+    new_lines = new_text.splitlines()
+    added = []
+    removed = []
+    matcher = difflib.SequenceMatcher(None, old_lines, new_lines)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            continue
+        old_block = old_lines[i1:i2]
+        new_block = new_lines[j1:j2]
+        if tag == "replace":
+            paired = min(len(old_block), len(new_block))
+            for old_line, new_line in zip(old_block, new_block):
+                line_added, line_removed = diff_words(old_line, new_line)
+                added += line_added
+                removed += line_removed
+            old_block = old_block[paired:]
+            new_block = new_block[paired:]
+        # Empty lines have no text in the compare output, so they are skipped
+        added += [line for line in new_block if line]
+        removed += [line for line in old_block if line]
+    return added, removed
+
+def diff_words(old_line, new_line):
+    """Gets the runs of inline text that were inserted into and deleted from a changed line."""
+    old_tokens = TOKEN_PATTERN.findall(old_line)
+    new_tokens = TOKEN_PATTERN.findall(new_line)
+    added = []
+    removed = []
+    matcher = difflib.SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag in ("replace", "insert"):
+            added.append("".join(new_tokens[j1:j2]))
+        if tag in ("replace", "delete"):
+            removed.append("".join(old_tokens[i1:i2]))
+    return added, removed
+
 def get_edit_desc(edit):
     return "Edit by {user} ({userid}) at {timestamp}, size {new_size} ({size_delta}): \"{comment}\"".format(**edit)
 
@@ -1,12 +1,20 @@
 """Checks suspiciousness of pages."""
 
-from get_edits import get_edits
+from get_edits import iter_edits, make_lazy_edits
+import edit_cache
 import pandas as pd
+import numpy as np
 from statistics import stdev
 import pywikibot as pwb
-import wikibot_extensions
+import datetime
 from pprint import pprint
 from sus_metrics import metrics as suspiciousness_metrics # renamed to avoid variable overwriting
+from sus_metrics import user_metrics, vectorized_metrics, needs_diffs, default_site as metrics_site
+from edit_table import make_edit_table
+from user_info import prefetch_edit_users
+from wiki_client import get_default_client
+from edit_warehouse import METADATA_COLUMNS
+from page_sweep import sweep_pages
 
 # TODO: Add functionality to check suspiciousness of users that make the edits
 
@@ -75,11 +83,69 @@ def search_wiki(site, search_term: str, max_pages: int) -> list:
     Returns:
         list: The list of string titles found by the search.
     """
+    client = get_default_client()
+    if client:
+        return client.search(search_term, max_pages)
     return [p.title() for p in site.search(search_term, total = max_pages)]
 
+def get_month_start(timestamp: datetime.datetime, months_later: int = 0) -> datetime.datetime:
+    """Gets the start of the month a timestamp is in, or of a month after it.
+
+    Args:
+        timestamp (datetime.datetime): The timestamp.
+        months_later (int, optional): The number of months after the timestamp's month to get the start of.
+
+    Returns:
+        datetime.datetime: Midnight on the first day of the month.
+    """
+    month_index = timestamp.year * 12 + timestamp.month - 1 + months_later
+    return timestamp.replace(year=month_index // 12, month=month_index % 12 + 1, day=1,
+        hour=0, minute=0, second=0, microsecond=0)
+
+def get_months_between(start_month: datetime.datetime, end_month: datetime.datetime) -> list:
+    """Gets each month from start_month to end_month, inclusive.
+
+    Args:
+        start_month (datetime.datetime): A timestamp in the first month.
+        end_month (datetime.datetime): A timestamp in the last month.
+
+    Returns:
+        list: The months as "YYYY-MM" strings, e.g. "2022-04".
+    """
+    months = []
+    month = get_month_start(start_month)
+    while month <= end_month:
+        months.append(month.strftime("%Y-%m"))
+        month = get_month_start(month, 1)
+    return months
+
+def get_edit_sets(title: str, edits: list, months: list = None, min_edits: int = 0) -> dict:
+    """Splits a page's edits into the edit sets get_pages_suspiciousness scores.
+
+    Args:
+        title (str): The title of the page.
+        edits (list): The page's edits.
+        months (list): The months to split the edits into, e.g. "2022-04", or None to keep the page whole.
+        min_edits (int, optional): The minimum number of edits an edit set needs to be included.
+
+    Returns:
+        dict: The edits of each edit set with at least min_edits edits, keyed by the page's title,
+            or by page-month titles e.g. "Title1 2022-04".
+    """
+    if months is None:
+        return {title: edits} if len(edits) >= min_edits else {}
+
+    # Split the page's edits into months locally so that months without edits cost no requests
+    month_edits = {month: [] for month in months}
+    for edit in edits:
+        month = edit["timestamp"][:7]
+        if month in month_edits:
+            month_edits[month].append(edit)
+    return {title + " " + month: edits for month, edits in month_edits.items() if len(edits) >= min_edits}
+
 def get_pages_suspiciousness(titles: list, site: pwb.APISite, sus_metrics: dict, min_edits: int = 0,
         start_month: pwb.Timestamp = None, end_month: pwb.Timestamp = None, 
-        get_sus_edits: bool = False) -> "pd.DataFrame | tuple":
+        get_sus_edits: bool = False, warehouse=None, threads: int = None, processes: int = None) -> "pd.DataFrame | tuple":
     """Gets a DataFrame representing the suspiciousness of each edit set according to each provided metric.
 
     If the start_month and end_month are both specified, the edit sets will be each page-month. If either
@@ -97,6 +163,13 @@ def get_pages_suspiciousness(titles: list, site: pwb.APISite, sus_metrics: dict,
             or end_month is None, both will be disregarded and all pages' full edit history will be recorded.
         get_sus_edits (bool, optional): Whether to additionally return the edits marked
             suspicious by the provided metric.
+        warehouse (edit_warehouse.EditWarehouse, optional): A warehouse to read the pages' edits from
+            instead of the API. Only the edits already synced into it are used.
+        threads (int, optional): If given, the number of pages retrieved from the API at once,
+            with page_sweep.sweep_pages, which reports its progress as pages finish. By default
+            the pages are retrieved one at a time.
+        processes (int, optional): With threads, the number of processes working out the edits'
+            diffs. Defaults to the number of CPUs.
 
     Returns:
         pandas.DataFrame: A DataFrame representing each edit set's suspiciousness. Columns represent the 
@@ -104,54 +177,148 @@ def get_pages_suspiciousness(titles: list, site: pwb.APISite, sus_metrics: dict,
         or, if get_sus_edits, tuple: the above suspiciousness DataFrame,
             the edits matching each metric by page.
     """
-    page_stats = pd.DataFrame()
-
     # Get dict of pages' edit dicts
     edit_dicts = {}
-    if start_month is None or end_month is None:
-        # Get the edit dict for each page if there are enough to meet the minimum
-        for title in titles:
-            edits = get_edits(title, site)
-            if len(edits) >= min_edits:
-                edit_dicts[title] = edits
-        
-        # Make the row names equal the page titles
-        page_stats.index = edit_dicts.keys()
-    else:
-        # Get the months
-        month_sets = wikibot_extensions.get_months_between(start_month, end_month)
-        # Assign the page-month titles e.g. "Title1 2022-04"
-        page_months = wikibot_extensions.get_titles_months(titles, month_sets)
+    months = None
+    range_start = range_end = None
+    if start_month is not None and end_month is not None:
+        # Get the months, e.g. "2022-04"
+        months = get_months_between(start_month, end_month)
+        # The API lists revisions newest first, so the range starts at the end of the last month
+        range_start = get_month_start(end_month, 1) - datetime.timedelta(seconds=1)
+        range_end = get_month_start(start_month)
+
+    # Metadata-only metrics (see sus_metrics.metric_fields) never need the diffs
+    diffs = needs_diffs(sus_metrics)
+    if warehouse is not None:
+        # Read every page's edits at once, leaving out the diff text if nothing reads it
+        columns = None if diffs or get_sus_edits else METADATA_COLUMNS
+        stored_edits = warehouse.get_edit_dicts(site, titles, start_time=range_start, end_time=range_end, columns=columns)
+    elif threads:
+        # Retrieve the pages in parallel, only diffing the edits in edit sets that will be scored
+        def select(title, edits):
+            return [edit for set_edits in get_edit_sets(title, edits, months, min_edits).values() for edit in set_edits]
+        swept_edits = dict(sweep_pages(titles, site, start_time=range_start, end_time=range_end, diffs=diffs,
+            select=select, threads=threads, processes=processes))
+
+    for title in titles:
+        # Fetch the page's whole range once
+        if warehouse is not None:
+            edits = stored_edits.get(title, [])
+        elif threads:
+            edits = swept_edits[title]
+        else:
+            # The edits' diffs are only retrieved if a metric reads them, so pages and
+            # page-months with fewer than min_edits edits never retrieve any
+            edits = list(iter_edits(title, site, start_time=range_start, end_time=range_end, diffs=diffs))
 
-        for title, month_set in page_months.items():
-            # Get the edit dicts for each page-month if there are enough to meet the minimum
-            edits = get_edits(title[:-8], site, start_time=month_set[0], end_time=month_set[1])
-            if len(edits) >= min_edits:
-                edit_dicts[title] = edits
+        # Get the edit dict for each page or page-month if there are enough to meet the minimum
+        edit_dicts.update(get_edit_sets(title, edits, months, min_edits))
 
-        # Make the row names equal the page-month strings
-        page_stats.index = edit_dicts.keys()
+    # Look up every author at once, 50 per request, if a metric needs information on them
+    if any(metric_func in user_metrics for metric_func in sus_metrics.values()):
+        prefetch_edit_users(metrics_site, (edit for edits in edit_dicts.values() for edit in edits))
 
-    if get_sus_edits:
-        sus_edits = {}
-
-    # For each suspiciousness metric,
-    for metric_name, metric_func in sus_metrics.items():
-        # Calculate the percent of edits that are suspicious according to this 
-        # metric for each page along with the avg and SD of the percent for all pages
-        result = get_suspicious_statistics(edit_dicts, metric_func, get_sus_edits=get_sus_edits)
-        edit_sus_percents, avg, sd = result[0:3]
-        # Get suspicious edits if specified by user
-        if get_sus_edits:
-            sus_edits[metric_name] = result[3]
-        # For this metric, set each page's suspiciousness as the number of SDs from the mean
-        page_stats[metric_name] = [(percent - avg) / sd for _, percent in edit_sus_percents.items()]
+    # Calculate the percent of edits that are suspicious according to each metric for
+    # each page along with the avg and SD of the percents for all pages, in one pass
+    result = get_suspicious_statistics_table(edit_dicts, sus_metrics, get_sus_edits=get_sus_edits)
+    percents, averages, sds = result[0:3]
+    # Set each page's suspiciousness as the number of SDs from the mean for each metric
+    page_stats = (percents - averages) / sds
 
     if get_sus_edits:
+        sus_edits = result[3]
+        if not diffs and warehouse is None:
+            sus_edits = make_lazy_sus_edits(sus_edits, site)
         return page_stats, sus_edits
     else:
         return page_stats
 
+def make_lazy_sus_edits(sus_edits: dict, site: pwb.APISite) -> dict:
+    """Turns the suspicious edits of each metric into LazyEdits, so that only the diffs of the
+    edits that are read are retrieved, rather than those of every edit on every page.
+
+    An edit that meets several metrics becomes the same LazyEdit in each of them.
+
+    Args:
+        sus_edits (dict): The edits (with only their metadata) matching each metric by page.
+        site (pywikibot.APISite): The site containing the pages.
+
+    Returns:
+        dict: The same edits, in the same format.
+    """
+    edits = list({id(edit): edit for pages in sus_edits.values() for page_edits in pages.values() for edit in page_edits}.values())
+    lazy_edits = dict(zip(map(id, edits), make_lazy_edits(edits, site, edit_cache.get_default_cache())))
+    return {metric_name: {page: [lazy_edits[id(edit)] for edit in page_edits] for page, page_edits in pages.items()}
+        for metric_name, pages in sus_edits.items()}
+
+def get_suspicious_statistics_table(edit_dicts: dict, sus_metrics: dict, get_sus_edits: bool = False) -> tuple:
+    """Gets the suspiciousness of each page evaluated by every metric at once.
+
+    The edits are converted to an edit table and each metric with a vectorized version in
+    sus_metrics.vectorized_metrics is evaluated over the whole table as a column expression.
+    Any other metric is evaluated edit by edit. The percents of all metrics are then
+    computed in one grouped pass.
+
+    Args:
+        edit_dicts (dict): The dict containing the page names as keys and the 
+            list of each page's edits as values.
+        sus_metrics (dict): The metrics to evaluate each edit by,
+            in the format {metric_name: metric_function}
+        get_sus_edits (bool, optional): Whether to additionally return the edits marked
+            suspicious by each metric.
+
+    Returns:
+        tuple: The DataFrame of the percent of each page's edits that met each metric
+            (rows are pages and columns are metrics), the Series of the average percent
+            of each metric, the Series of the standard deviation of each metric's percents,
+            (optional, dependent on parameter get_sus_edits) the edits matching each metric by page.
+    """
+    table = make_edit_table(edit_dicts)
+    edits = [edit for edit_list in edit_dicts.values() for edit in edit_list]
+    flags = get_metric_flags(table, edits, sus_metrics)
+
+    # Pages without any edits count as 0% suspicious
+    percents = flags.groupby(table["page"], observed=False).mean().fillna(0)
+    percents.index = list(edit_dicts)
+    averages = percents.mean()
+    sds = percents.std()
+
+    # If the sd is 0 (all percents are the same), we can set it
+    # to 1 so that when we divide by SD the result will be 0 still
+    # but we won't get a ZeroDivisionError.
+    sds[sds == 0] = 1
+
+    if get_sus_edits:
+        sus_edits = {}
+        pages = table["page"].to_numpy()
+        for metric_name in sus_metrics:
+            sus_edits[metric_name] = {page: [] for page, edit_list in edit_dicts.items() if edit_list}
+            for i in np.flatnonzero(flags[metric_name].to_numpy()):
+                sus_edits[metric_name][pages[i]].append(edits[i])
+        return percents, averages, sds, sus_edits
+    else:
+        return percents, averages, sds
+
+def get_metric_flags(table: pd.DataFrame, edits: list, sus_metrics: dict) -> pd.DataFrame:
+    """Evaluates every metric on every edit, as a column expression over the edit table for
+    each metric with a vectorized version and edit by edit for any other metric.
+
+    Args:
+        table (pandas.DataFrame): The edit table of the edits, from make_edit_table.
+        edits (list): The edit dicts, in the same order as the table's rows.
+        sus_metrics (dict): The metrics to evaluate each edit by,
+            in the format {metric_name: metric_function}
+
+    Returns:
+        pandas.DataFrame: One boolean column per metric, one row per edit.
+    """
+    return pd.DataFrame({
+        metric_name: vectorized_metrics[metric_func](table) if metric_func in vectorized_metrics
+            else pd.Series([bool(metric_func(edit)) for edit in edits], index=table.index, dtype=bool)
+        for metric_name, metric_func in sus_metrics.items()
+    }, index=table.index)
+
 def get_suspicious_statistics(edit_dicts: dict, metric, get_sus_edits: bool = False) -> tuple:
     """Gets the suspiciousness of each page evaluated by the specified metric.
 
@@ -216,6 +383,8 @@ def main():
     max_pages = 5
     # min edits an edit set must have to be considered
     min_edits = 10
+    # number of pages to retrieve at once
+    threads = 8
 
     site = pwb.Site("en", "wikipedia")
 
@@ -236,7 +405,7 @@ def main():
 
     # Gets the DF for the suspiciousness level of each page for each metric
     sus_stats, sus_edits = get_pages_suspiciousness(titles, site, suspiciousness_metrics,
-        min_edits=min_edits, start_month=start_month, end_month=end_month, get_sus_edits=True)
+        min_edits=min_edits, start_month=start_month, end_month=end_month, get_sus_edits=True, threads=threads)
 
     # Find outliers in the suspiciousness stats
     stats = find_outliers(sus_stats, suspiciousness_metrics, suspicious_marker)
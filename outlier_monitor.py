@@ -0,0 +1,205 @@
+"""Keeps pages' suspiciousness scores up to date as new edits arrive, without recomputing them.
+
+get_pages_suspiciousness scores a fixed set of pages from scratch. IncrementalScorer instead
+keeps running statistics: each page's edit count and suspicious edit count for every metric,
+and for every metric the mean and variance of the pages' percents, updated with Welford's
+algorithm. Adding edits to a page only updates that page's entries, and the pages past the
+outlier threshold are found in a sorted list of percents rather than by scoring every page.
+"""
+
+import bisect
+
+import numpy as np
+import pandas as pd
+
+from edit_table import make_edit_table
+from outlier_edits import get_metric_flags
+from sus_metrics import user_metrics, default_site as metrics_site
+from user_info import prefetch_edit_users
+
+class IncrementalScorer:
+    """Scores edit sets (pages or page-months) by how far the percent of their edits that meet
+    each metric is from the average edit set, in standard deviations.
+
+    The scores are the same as get_pages_suspiciousness gives for the same edit sets.
+    """
+
+    def __init__(self, sus_metrics: dict, min_edits: int = 0):
+        """
+        Args:
+            sus_metrics (dict): The metrics to judge each edit set's suspiciousness,
+                in the format {metric_name: metric_function}
+            min_edits (int, optional): The number of edits an edit set needs before it is scored
+                and counted in the averages.
+        """
+        self.sus_metrics = sus_metrics
+        self.metric_names = list(sus_metrics)
+        self.min_edits = min_edits
+
+        # The number of edits and suspicious edits per metric on every edit set seen
+        self.counts = {}
+        self.sus_counts = {}
+        # The percents of the scored edit sets
+        self.percents = {}
+
+        # Welford's running mean and sum of squared differences of the scored percents, per metric
+        self.num_scored = 0
+        self.mean = np.zeros(len(sus_metrics))
+        self.m2 = np.zeros(len(sus_metrics))
+
+        # The scored edit sets' (percent, edit set) pairs in ascending order, per metric
+        self.sorted_percents = {metric_name: [] for metric_name in self.metric_names}
+
+    @classmethod
+    def from_edit_dicts(cls, edit_dicts: dict, sus_metrics: dict, min_edits: int = 0) -> "IncrementalScorer":
+        """Makes a scorer that starts out with edit sets' edits, like those get_pages_suspiciousness gathers."""
+        scorer = cls(sus_metrics, min_edits=min_edits)
+        scorer.add_edits(edit_dicts)
+        return scorer
+
+    def add_edits(self, edit_dicts: dict) -> set:
+        """Adds new edits to edit sets, which are created if they haven't been seen before.
+
+        Each edit must only be added once. An edit set with no new edits may be given to add it
+        with no edits, like get_pages_suspiciousness does for pages with no edits.
+
+        Args:
+            edit_dicts (dict): The dict containing the edit set names as keys and the
+                list of each edit set's new edits as values.
+
+        Returns:
+            set: The names of the edit sets whose percents changed.
+        """
+        edits = [edit for edit_list in edit_dicts.values() for edit in edit_list]
+        if any(metric_func in user_metrics for metric_func in self.sus_metrics.values()):
+            prefetch_edit_users(metrics_site, edits)
+
+        table = make_edit_table(edit_dicts)
+        flags = get_metric_flags(table, edits, self.sus_metrics)
+        new_counts = table.groupby("page", observed=False).size()
+        new_sus_counts = flags.groupby(table["page"], observed=False).sum()
+
+        changed = set()
+        for name, count, sus_counts in zip(edit_dicts, new_counts.to_numpy(), new_sus_counts.to_numpy()):
+            if self.update_counts(name, int(count), sus_counts):
+                changed.add(name)
+        return changed
+
+    def update_counts(self, name, count: int, sus_counts: np.ndarray) -> bool:
+        """Adds to an edit set's counts, or subtracts from them when edits leave a sliding window,
+        and updates its percents and the running statistics.
+
+        Args:
+            name (str): The name of the edit set, which is created if it hasn't been seen before.
+            count (int): The change in the number of edits.
+            sus_counts (numpy.ndarray): The change in the number of edits that meet each metric,
+                in the order of sus_metrics.
+
+        An edit set whose edits have all been subtracted is forgotten, so that a stream of edits
+        doesn't keep an entry for every edit set it has ever seen.
+
+        Returns:
+            bool: Whether the edit set's percents changed (or it started or stopped being scored).
+        """
+        self.counts[name] = self.counts.get(name, 0) + count
+        self.sus_counts[name] = self.sus_counts.get(name, 0) + sus_counts
+        old_percent = self.percents.get(name)
+        if self.counts[name] == 0 and count != 0:
+            del self.counts[name]
+            del self.sus_counts[name]
+            if old_percent is None:
+                return False
+            self.remove_percent(name, old_percent)
+            return True
+        if self.counts[name] < self.min_edits:
+            if old_percent is None:
+                return False
+            self.remove_percent(name, old_percent)
+            return True
+
+        # Pages without any edits count as 0% suspicious
+        percent = self.sus_counts[name] / self.counts[name] if self.counts[name] else np.zeros(len(self.metric_names))
+        if old_percent is not None:
+            if np.array_equal(percent, old_percent):
+                return False
+            self.remove_percent(name, old_percent)
+        self.add_percent(name, percent)
+        return True
+
+    def add_percent(self, name, percent):
+        self.percents[name] = percent
+        self.num_scored += 1
+        delta = percent - self.mean
+        self.mean += delta / self.num_scored
+        self.m2 += delta * (percent - self.mean)
+        for metric_name, value in zip(self.metric_names, percent):
+            bisect.insort(self.sorted_percents[metric_name], (value, name))
+
+    def remove_percent(self, name, percent):
+        del self.percents[name]
+        if self.num_scored == 1:
+            self.num_scored = 0
+            self.mean[:] = 0
+            self.m2[:] = 0
+        else:
+            old_mean = self.mean.copy()
+            self.mean = (self.num_scored * self.mean - percent) / (self.num_scored - 1)
+            # Removing values can leave a tiny negative sum through rounding
+            self.m2 = np.maximum(self.m2 - (percent - old_mean) * (percent - self.mean), 0)
+            self.num_scored -= 1
+        for metric_name, value in zip(self.metric_names, percent):
+            entries = self.sorted_percents[metric_name]
+            del entries[bisect.bisect_left(entries, (value, name))]
+
+    def get_averages(self) -> pd.Series:
+        """Gets the average percent of the scored edit sets for each metric."""
+        return pd.Series(self.mean if self.num_scored else np.nan, index=self.metric_names)
+
+    def get_sds(self) -> pd.Series:
+        """Gets the sample standard deviation of the scored edit sets' percents for each metric.
+
+        An SD of 0 is given as 1, as in get_suspicious_statistics_table, so that scores are 0 rather
+        than undefined when every percent is the same.
+        """
+        return pd.Series(self.sd_values(), index=self.metric_names)
+
+    def sd_values(self) -> np.ndarray:
+        if self.num_scored < 2:
+            return np.full(len(self.metric_names), np.nan)
+        sds = np.sqrt(self.m2 / (self.num_scored - 1))
+        sds[sds == 0] = 1
+        return sds
+
+    def get_score(self, name) -> pd.Series:
+        """Gets one edit set's suspiciousness for each metric, or None if it isn't scored."""
+        scores = self.score_values(name)
+        return None if scores is None else pd.Series(scores, index=self.metric_names)
+
+    def score_values(self, name) -> np.ndarray:
+        if name not in self.percents:
+            return None
+        return (self.percents[name] - self.mean) / self.sd_values()
+
+    def get_page_stats(self) -> pd.DataFrame:
+        """Gets every scored edit set's suspiciousness, in the format get_pages_suspiciousness returns."""
+        percents = pd.DataFrame(list(self.percents.values()), index=list(self.percents), columns=self.metric_names, dtype=float)
+        return (percents - self.get_averages()) / self.get_sds()
+
+    def find_outliers(self, sus_marker: float = 2) -> dict:
+        """Finds the edit sets more than sus_marker SDs from the mean, in the format outlier_edits.find_outliers returns.
+
+        Only the edit sets past the threshold are visited.
+        """
+        outliers = {metric_name: {} for metric_name in self.metric_names}
+        averages = self.get_averages()
+        sds = self.get_sds()
+        for metric_name in self.metric_names:
+            mean, sd = averages[metric_name], sds[metric_name]
+            if np.isnan(sd):
+                continue
+            entries = self.sorted_percents[metric_name]
+            low = bisect.bisect_left(entries, mean - sus_marker * sd, key=lambda entry: entry[0])
+            high = bisect.bisect_right(entries, mean + sus_marker * sd, key=lambda entry: entry[0])
+            for value, name in entries[:low] + entries[high:]:
+                outliers[metric_name][name] = (value - mean) / sd
+        return outliers
@@ -0,0 +1,207 @@
+"""Retrieves many pages' edits at once, with threads waiting on the API and processes diffing the revisions.
+
+Each page is listed and its revisions' content retrieved in a thread of its own, since most of
+that time is spent waiting for responses. Working out what each revision added and removed
+(get_edits.diff_texts) is CPU-bound, so it is sent to a pool of processes. Only a bounded
+number of pages are in flight at once, so memory doesn't grow with the number of pages, and
+progress is reported with an estimate of the time left as pages finish.
+"""
+
+import datetime
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import edit_cache
+from get_edits import DIFF_BATCH_SIZE, diff_texts, get_contents, get_diff_texts, iter_edits, mark_diff_missing
+
+# The default number of pages retrieved at once
+DEFAULT_THREADS = 8
+
+# The default number of seconds between progress reports
+DEFAULT_REPORT_INTERVAL = 10.0
+
+class SweepProgress:
+    """Counts the pages a sweep has finished and estimates how long the rest will take."""
+
+    def __init__(self, total, report_interval=DEFAULT_REPORT_INTERVAL):
+        """
+        Args:
+            total (int): The number of pages in the sweep.
+            report_interval (float): The least number of seconds between printed reports, or None
+                to not print any.
+        """
+        self.total = total
+        self.report_interval = report_interval
+        self.pages = 0
+        self.edits = 0
+        self.start = time.perf_counter()
+        self.last_report = None
+
+    def update(self, num_edits):
+        """Counts a finished page and its edits, and prints a report if one is due."""
+        self.pages += 1
+        self.edits += num_edits
+        if self.report_interval is None:
+            return
+        now = time.perf_counter()
+        if self.pages == self.total or self.last_report is None or now - self.last_report >= self.report_interval:
+            self.last_report = now
+            print(self)
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def eta(self):
+        """Estimates the seconds left from the average time per page so far, or None before any page finishes."""
+        if not self.pages:
+            return None
+        return self.elapsed() / self.pages * (self.total - self.pages)
+
+    def __str__(self):
+        eta = self.eta()
+        return "{}/{} pages ({:.0%}), {} edits, {} elapsed, ETA {}".format(
+            self.pages, self.total, self.pages / max(self.total, 1), self.edits,
+            datetime.timedelta(seconds=round(self.elapsed())),
+            "unknown" if eta is None else datetime.timedelta(seconds=round(eta)))
+
+def diff_revisions(pairs):
+    """Diffs each of a list of (old_text, new_text) pairs with diff_texts. Run in the process pool."""
+    return [diff_texts(old_text, new_text) for old_text, new_text in pairs]
+
+def add_diffs_parallel(edits, site, executor=None, batch_size=DIFF_BATCH_SIZE):
+    """Adds the added and removed text to edits that already have their sizes, like add_diffs_batch,
+    but diffs the revisions in a process pool while the next batch's content is retrieved.
+
+    As in add_diffs_batch, edits next to a revision with hidden or deleted text are marked with
+    diff_missing instead.
+
+    Args:
+        edits (list): The edit dicts, from iter_edits with diffs=False.
+        site (pywikibot.Site): The site object for the wiki.
+        executor (concurrent.futures.Executor): The pool to diff the revisions in, or None to diff
+            them in the calling thread.
+        batch_size (int): The most revisions to request the content of at once. Each batch of
+            edits is one less, to leave room for the oldest edit's parent.
+    """
+    pending = []
+    for i in range(0, len(edits), batch_size - 1):
+        batch = edits[i:i + batch_size - 1]
+        revids = {edit["revid"] for edit in batch} | {edit["parentid"] for edit in batch if edit["parentid"]}
+        contents = get_contents(site, sorted(revids), batch_size)
+        texts = [get_diff_texts(edit, contents) for edit in batch]
+        for edit, edit_texts in zip(batch, texts):
+            if edit_texts is None:
+                mark_diff_missing(edit)
+        batch = [edit for edit, edit_texts in zip(batch, texts) if edit_texts is not None]
+        pairs = [edit_texts for edit_texts in texts if edit_texts is not None]
+        if executor is None:
+            pending.append((batch, diff_revisions(pairs)))
+        else:
+            pending.append((batch, executor.submit(diff_revisions, pairs)))
+
+    for batch, diffs in pending:
+        if executor is not None:
+            diffs = diffs.result()
+        for edit, (added, removed) in zip(batch, diffs):
+            edit["added"], edit["removed"] = added, removed
+
+def fetch_page(title, site, start_time=None, end_time=None, diffs=True, select=None, executor=None, use_cache=True):
+    """Retrieves a page's edits, with the diffs of the ones select chooses. Run in the thread pool.
+
+    Args:
+        title (str): The title of the page.
+        site (pywikibot.Site): The site object for the wiki.
+        start_time (datetime.datetime): The newest timestamp to include, as in get_edits.
+        end_time (datetime.datetime): The oldest timestamp to include, as in get_edits.
+        diffs (bool): Whether to retrieve any diffs.
+        select (callable): Given the title and the page's edits (with only their metadata), returns
+            the edits whose diffs are needed. Defaults to every edit.
+        executor (concurrent.futures.Executor): The pool to diff the revisions in, or None to diff
+            them in this thread.
+        use_cache (bool): Whether to read diffs from and save them to the shared edit cache.
+
+    Returns:
+        list: The page's edits, most recent first. Those that weren't selected have no diffs.
+    """
+    edits = list(iter_edits(title, site, start_time=start_time, end_time=end_time, use_cache=False, diffs=False))
+    if not diffs:
+        return edits
+
+    needed = edits if select is None else select(title, edits)
+    cache = edit_cache.get_default_cache() if use_cache else None
+    cached = cache.get_many(site, [edit["revid"] for edit in needed]) if cache else {}
+    for edit in needed:
+        if edit["revid"] in cached:
+            cached_edit = cached[edit["revid"]]
+            edit["added"], edit["removed"] = cached_edit["added"], cached_edit["removed"]
+            if cached_edit.get("diff_missing", False):
+                edit["diff_missing"] = True
+    missing = [edit for edit in needed if edit["revid"] not in cached]
+    add_diffs_parallel(missing, site, executor)
+    if cache and missing:
+        cache.put_many(site, missing)
+    return edits
+
+def sweep_pages(titles, site, start_time=None, end_time=None, diffs=True, select=None, threads=DEFAULT_THREADS,
+        processes=None, max_in_flight=None, use_cache=True, report_interval=DEFAULT_REPORT_INTERVAL):
+    """Retrieves the edits on many pages in parallel, with fetch_page.
+
+    Args:
+        titles (list): The titles of the pages.
+        site (pywikibot.Site): The site object for the wiki.
+        start_time (datetime.datetime): The newest timestamp to include, as in get_edits.
+        end_time (datetime.datetime): The oldest timestamp to include, as in get_edits.
+        diffs (bool): Whether to retrieve any diffs.
+        select (callable): Chooses the edits whose diffs are needed, as in fetch_page.
+        threads (int): The number of pages retrieved at once.
+        processes (int): The number of processes diffing revisions. Defaults to the number of
+            CPUs. 0 diffs them in the threads instead.
+        max_in_flight (int): The most pages started but not yet yielded. Defaults to twice threads.
+        use_cache (bool): Whether to read diffs from and save them to the shared edit cache.
+        report_interval (float): The least number of seconds between progress reports, or None
+            to not print any.
+
+    Yields:
+        tuple: The title and list of edits of each page, in the order they finish.
+    """
+    titles = list(titles)
+    if processes is None:
+        processes = os.cpu_count() or 1
+    max_in_flight = max_in_flight or 2 * threads
+    progress = SweepProgress(len(titles), report_interval)
+    processes_pool = ProcessPoolExecutor(max_workers=processes) if diffs and processes else None
+    if processes_pool is not None:
+        # The worker processes are started before any threads, since forking a process while
+        # other threads hold locks can leave the children deadlocked
+        processes_pool.submit(int).result()
+
+    try:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            remaining = iter(titles)
+            pending = {}
+
+            def start_pages(count):
+                if count <= 0:
+                    return
+                for title in remaining:
+                    future = executor.submit(fetch_page, title, site, start_time, end_time, diffs, select,
+                        processes_pool, use_cache)
+                    pending[future] = title
+                    count -= 1
+                    if count == 0:
+                        return
+
+            start_pages(max_in_flight)
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    title = pending.pop(future)
+                    edits = future.result()
+                    progress.update(len(edits))
+                    yield title, edits
+                # Only start new pages once finished ones have been handed over, which bounds memory
+                start_pages(len(done))
+    finally:
+        if processes_pool is not None:
+            processes_pool.shutdown()
@@ -0,0 +1,301 @@
+"""Watches a wiki's recent changes and raises alerts on pages whose recent edits are suspicious.
+
+Changes are read from list=recentchanges as they happen, or replayed from a JSONL file of
+recorded list=recentchanges entries (one entry per line, as written by record_feed). Each
+change is scored by the sus_metrics metrics as it arrives, and every page keeps the counts of
+its edits within a sliding window of time. A page raises an alert when the share of its recent
+edits that meet a metric moves more than sus_marker SDs from the average page.
+
+Usage: python recent_changes.py [feed.jsonl [speed]]
+Watches English Wikipedia, or replays a feed file speed times faster than it was recorded
+(as fast as possible if no speed is given).
+"""
+
+import collections
+import datetime
+import json
+import sys
+import time
+
+import numpy as np
+import pywikibot as pwb
+
+import get_edits
+from outlier_monitor import IncrementalScorer
+from sus_metrics import metrics as suspiciousness_metrics, user_metrics, default_site as metrics_site
+from user_info import prefetch_users
+
+TIMESTAMP_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# The change properties requested from list=recentchanges
+RC_PROPS = ("title", "ids", "sizes", "flags", "user", "userid", "timestamp", "comment", "tags")
+
+def iter_recent_changes(site, start_time=None, follow=True, poll_interval=5.0):
+    """Yields a wiki's recent edits and page creations, oldest first, following the API's continue tokens.
+
+    Args:
+        site (pywikibot.Site): The site object for the wiki.
+        start_time (datetime.datetime): The time to start from. Defaults to now.
+        follow (bool): Whether to keep polling for new changes once the listing has caught up,
+            rather than stopping.
+        poll_interval (float): The number of seconds to wait between polls once caught up.
+
+    Yields:
+        dict: Each list=recentchanges entry.
+    """
+    for changes in iter_recent_change_batches(site, start_time, follow, poll_interval):
+        yield from changes
+
+def iter_recent_change_batches(site, start_time=None, follow=True, poll_interval=5.0):
+    """Yields a wiki's recent edits and page creations like iter_recent_changes, but as the list
+    of new changes in each response, so that they can be processed together.
+
+    Yields:
+        list: The new list=recentchanges entries of each response, oldest first. Empty lists
+            (polls that found nothing new) are skipped.
+    """
+    if start_time is None:
+        start_time = datetime.datetime.now(datetime.timezone.utc)
+    params = {
+        "action": "query",
+        "format": "json",
+        "list": "recentchanges",
+        "rcdir": "newer",
+        "rcstart": start_time.strftime(TIMESTAMP_FORMAT),
+        "rctype": "edit|new",
+        "rcprop": "|".join(RC_PROPS),
+        "rclimit": "max"
+    }
+    # Each poll restarts from the newest timestamp seen, so the changes made in that second are listed again
+    repeated = set()
+    while True:
+        result = get_edits.submit(site, params)
+        changes = result["query"]["recentchanges"]
+        new_changes = [change for change in changes if change["rcid"] not in repeated]
+        if new_changes:
+            yield new_changes
+        if "continue" in result:
+            params.update(result["continue"])
+            continue
+        if not follow:
+            return
+
+        if changes:
+            params["rcstart"] = changes[-1]["timestamp"]
+            repeated = {change["rcid"] for change in changes if change["timestamp"] == params["rcstart"]}
+        params.pop("rccontinue", None)
+        time.sleep(poll_interval)
+
+def replay_feed(path, speed=None):
+    """Yields the changes recorded in a JSONL feed file, optionally paced like they were made.
+
+    Args:
+        path (str): The path of the feed file, with one list=recentchanges entry per line.
+        speed (float): How many times faster than real time to replay the changes, going
+            by their timestamps. None replays them as fast as they can be read.
+
+    Yields:
+        dict: Each list=recentchanges entry.
+    """
+    replay_start = time.perf_counter()
+    first = None
+    with open(path) as feed:
+        for line in feed:
+            if not line.strip():
+                continue
+            change = json.loads(line)
+            if speed:
+                timestamp = parse_timestamp(change["timestamp"])
+                if first is None:
+                    first = timestamp
+                delay = (timestamp - first).total_seconds() / speed - (time.perf_counter() - replay_start)
+                if delay > 0:
+                    time.sleep(delay)
+            yield change
+
+def record_feed(changes, path):
+    """Writes changes to a JSONL feed file that replay_feed can replay.
+
+    Returns:
+        int: The number of changes written.
+    """
+    count = 0
+    with open(path, "w") as feed:
+        for change in changes:
+            feed.write(json.dumps(change) + "\n")
+            count += 1
+    return count
+
+def to_edit_dict(change):
+    """Converts a list=recentchanges entry to an edit dict, without the diff, like get_edits makes.
+
+    Changes whose user has been hidden (userhidden) have no user or userid, and get the user ""
+    and the userid -1, as get_edits gives them.
+    """
+    return {
+        "revid": change["revid"],
+        "parentid": change.get("old_revid", 0),
+        "user": change.get("user", ""),
+        "userid": change.get("userid", -1) if change.get("user", "") != "" else -1,
+        "comment": change.get("comment", ""),
+        "timestamp": change["timestamp"],
+        "tags": change.get("tags", []),
+        "minor": "minor" in change,
+        "new_size": change.get("newlen", 0),
+        "size_delta": change.get("newlen", 0) - change.get("oldlen", 0)
+    }
+
+def parse_timestamp(timestamp):
+    return datetime.datetime.strptime(timestamp, TIMESTAMP_FORMAT)
+
+class RecentChangesMonitor:
+    """Scores each change as it arrives and keeps every page's counts over a sliding window.
+
+    Pages are scored by an IncrementalScorer, so each change only updates the scores of its
+    own page and of the pages whose edits leave the window.
+    """
+
+    def __init__(self, sus_metrics=suspiciousness_metrics, window=datetime.timedelta(hours=24),
+            min_edits=5, sus_marker=2):
+        """
+        Args:
+            sus_metrics (dict): The metrics to judge each edit by, in the format {metric_name: metric_function}
+            window (datetime.timedelta): How long an edit counts towards its page's statistics, going by
+                the changes' timestamps.
+            min_edits (int): The number of edits a page needs within the window to be scored.
+            sus_marker (float): The number of SDs from the mean a page must be to raise an alert.
+        """
+        self.sus_metrics = sus_metrics
+        self.window = window
+        self.sus_marker = sus_marker
+        self.scorer = IncrementalScorer(sus_metrics, min_edits=min_edits)
+        # The (timestamp, page, metric results) of every edit within the window, oldest first
+        self.recent = collections.deque()
+        # The (page, metric name) pairs that are currently past the threshold
+        self.alerting = set()
+        self.events = 0
+        self.elapsed = 0.0
+        self.max_latency = 0.0
+
+    def process(self, change, arrived=None):
+        """Scores a change, updates the sliding windows and checks the change's page for outliers.
+
+        Args:
+            change (dict): The list=recentchanges entry.
+            arrived (float): The time.perf_counter() time the change arrived, for measuring latency.
+                Defaults to now.
+
+        Returns:
+            list: An alert dict for each metric the change's page has newly become an outlier in,
+                with the page, metric, score, percent, and the change that raised it.
+        """
+        start = time.perf_counter()
+        edit = to_edit_dict(change)
+        page = change["title"]
+        timestamp = parse_timestamp(edit["timestamp"])
+        flags = np.array([bool(metric_func(edit)) for metric_func in self.sus_metrics.values()], dtype=np.int64)
+
+        self.recent.append((timestamp, page, flags))
+        self.scorer.update_counts(page, 1, flags)
+        # Changes are usually in order, so only the oldest edits can have left the window
+        while self.recent and self.recent[0][0] <= timestamp - self.window:
+            _, old_page, old_flags = self.recent.popleft()
+            self.scorer.update_counts(old_page, -1, -old_flags)
+            if old_page not in self.scorer.percents:
+                self.alerting.difference_update((old_page, metric_name) for metric_name in self.scorer.metric_names)
+
+        alerts = []
+        scores = self.scorer.score_values(page)
+        for i, metric_name in enumerate(self.scorer.metric_names):
+            outlier = scores is not None and abs(scores[i]) > self.sus_marker
+            if outlier and (page, metric_name) not in self.alerting:
+                self.alerting.add((page, metric_name))
+                alerts.append({
+                    "page": page,
+                    "metric": metric_name,
+                    "score": scores[i],
+                    "percent": self.scorer.percents[page][i],
+                    "change": change
+                })
+            elif not outlier:
+                self.alerting.discard((page, metric_name))
+
+        end = time.perf_counter()
+        self.events += 1
+        self.elapsed += end - start
+        self.max_latency = max(self.max_latency, end - (start if arrived is None else arrived))
+        return alerts
+
+    def process_batch(self, changes, arrived=None):
+        """Processes changes that arrived together, such as one list=recentchanges response,
+        looking up the authors that aren't in the user cache yet in bulk first.
+
+        Otherwise the user metrics would look up each new account with a request of its own.
+
+        Args:
+            changes (list): The list=recentchanges entries, oldest first.
+            arrived (float): The time.perf_counter() time the changes arrived. Defaults to now.
+
+        Returns:
+            list: The alerts the changes raised, as process returns them.
+        """
+        if any(metric_func in user_metrics for metric_func in self.sus_metrics.values()):
+            # Cached users are skipped, so only the new accounts are requested
+            prefetch_users(metrics_site, (change["user"] for change in changes if change.get("userid") and change.get("user")))
+        alerts = []
+        for change in changes:
+            alerts += self.process(change, arrived)
+        return alerts
+
+    def run(self, changes):
+        """Processes every change from a source, such as iter_recent_changes or replay_feed.
+
+        Yields:
+            dict: Each alert, as soon as its change has been processed.
+        """
+        for change in changes:
+            yield from self.process(change, time.perf_counter())
+
+    def run_batches(self, batches):
+        """Processes every batch of changes from a source, such as iter_recent_change_batches, with process_batch.
+
+        Yields:
+            dict: Each alert, as soon as its batch has been processed.
+        """
+        for changes in batches:
+            yield from self.process_batch(changes, time.perf_counter())
+
+    def stats(self):
+        """Gets the number of changes processed, the processing throughput, and the longest
+        time between a change arriving and its alerts being raised.
+
+        Returns:
+            dict: The events, the events per second of processing time, and the max latency in seconds.
+        """
+        return {
+            "events": self.events,
+            "events_per_second": self.events / self.elapsed if self.elapsed else 0,
+            "max_latency": self.max_latency
+        }
+
+def main():
+    monitor = RecentChangesMonitor()
+    if len(sys.argv) > 1:
+        alerts = monitor.run(replay_feed(sys.argv[1], float(sys.argv[2]) if len(sys.argv) > 2 else None))
+    else:
+        alerts = monitor.run_batches(iter_recent_change_batches(pwb.Site("en", "wikipedia")))
+
+    start = time.perf_counter()
+    try:
+        for alert in alerts:
+            print("{timestamp} {page}: {metric} at {percent:.0%} ({score:+.1f} SDs), raised by revision {revid} by {user}".format(
+                timestamp=alert["change"]["timestamp"], revid=alert["change"]["revid"], user=alert["change"]["user"], **alert))
+    except KeyboardInterrupt:
+        pass
+
+    stats = monitor.stats()
+    print("{} events in {:.1f} s, {:.0f} events/s of processing, max latency {:.1f} ms".format(
+        stats["events"], time.perf_counter() - start, stats["events_per_second"], stats["max_latency"] * 1000))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Writes the account reports to PDF one page at a time, so that a report's size isn't limited by memory.
+
+matplotlib's PdfPages holds on to every image drawn into it until the file is closed. The report
+pages are made of nothing but raster images, so make_page lays each page out as a single image
+and StreamingPdf writes it to the file straight away.
+"""
+
+import zlib
+
+import numpy as np
+
+class StreamingPdf:
+    """A PDF file of raster pages that writes each page as soon as it is added.
+
+    Only the byte offset of each object is kept until the file is closed.
+    """
+
+    # Object 1 is the catalog and object 2 is the page tree, both written on close
+    CATALOG_ID = 1
+    PAGES_ID = 2
+
+    def __init__(self, path, resolution=100):
+        """
+        Args:
+            path (str): The path to write the PDF to.
+            resolution (int): The pixels per inch that page images are shown at.
+        """
+        self.path = path
+        self.resolution = resolution
+        self.offsets = {}
+        self.next_id = self.PAGES_ID + 1
+        self.page_ids = []
+        self.file = open(path, "wb")
+        self.file.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def write_object(self, entries, stream=None, object_id=None):
+        """Writes a dictionary object, or a stream object, to the file.
+
+        Args:
+            entries (bytes): The dictionary's entries, without the enclosing << >>. A stream's
+                Length entry is added automatically.
+            stream (bytes): The stream's (already encoded) data, if the object is a stream.
+            object_id (int): The object number, or None to use the next free one.
+
+        Returns:
+            int: The object number.
+        """
+        if object_id is None:
+            object_id = self.next_id
+            self.next_id += 1
+        self.offsets[object_id] = self.file.tell()
+        if stream is None:
+            self.file.write(b"%d 0 obj\n<< %s >>\nendobj\n" % (object_id, entries))
+        else:
+            self.file.write(b"%d 0 obj\n<< %s /Length %d >>\nstream\n" % (object_id, entries, len(stream)))
+            self.file.write(stream + b"\nendstream\nendobj\n")
+        return object_id
+
+    def add_page(self, image):
+        """Writes a page showing an image.
+
+        Args:
+            image (numpy.ndarray): The page's RGB image, as a (height, width, 3) array of uint8.
+        """
+        height, width = image.shape[:2]
+        image_id = self.write_object(
+            b"/Type /XObject /Subtype /Image /Width %d /Height %d /ColorSpace /DeviceRGB "
+            b"/BitsPerComponent 8 /Filter /FlateDecode" % (width, height),
+            zlib.compress(np.ascontiguousarray(image, dtype=np.uint8).tobytes()))
+
+        # Points are 1/72 inch
+        page_width = width * 72 / self.resolution
+        page_height = height * 72 / self.resolution
+        contents_id = self.write_object(b"", b"q %.2f 0 0 %.2f 0 0 cm /Page Do Q" % (page_width, page_height))
+        self.page_ids.append(self.write_object(
+            b"/Type /Page /Parent %d 0 R /MediaBox [0 0 %.2f %.2f] /Resources << /XObject << /Page %d 0 R >> >> "
+            b"/Contents %d 0 R" % (self.PAGES_ID, page_width, page_height, image_id, contents_id)))
+
+    def close(self):
+        """Writes the page tree, catalog and cross-reference table, and closes the file."""
+        if self.file.closed:
+            return
+        kids = b" ".join(b"%d 0 R" % page_id for page_id in self.page_ids)
+        self.write_object(b"/Type /Pages /Kids [%s] /Count %d" % (kids, len(self.page_ids)), object_id=self.PAGES_ID)
+        self.write_object(b"/Type /Catalog /Pages %d 0 R" % self.PAGES_ID, object_id=self.CATALOG_ID)
+
+        xref_offset = self.file.tell()
+        size = self.next_id
+        self.file.write(b"xref\n0 %d\n0000000000 65535 f \n" % size)
+        for object_id in range(1, size):
+            self.file.write(b"%010d 00000 n \n" % self.offsets[object_id])
+        self.file.write(b"trailer\n<< /Size %d /Root %d 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (size, self.CATALOG_ID, xref_offset))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def make_page(rows, num_rows, margin=20):
+    """Lays out a page of images in a grid on a white background, one row of images per user.
+
+    Args:
+        rows (list): The list of images in each row, each an RGB array of uint8.
+        num_rows (int): The number of rows on a full page. Rows past the end of rows are left blank,
+            so that a last page that isn't full is the same size as the rest.
+        margin (int): The number of pixels around and between the images.
+
+    Returns:
+        numpy.ndarray: The page's RGB image.
+    """
+    row_height = max(image.shape[0] for images in rows for image in images)
+    num_columns = max(len(images) for images in rows)
+    column_widths = [max(images[column].shape[1] for images in rows if column < len(images)) for column in range(num_columns)]
+
+    page = np.full((num_rows * (row_height + margin) + margin, sum(column_widths) + (num_columns + 1) * margin, 3), 255, dtype=np.uint8)
+    for row, images in enumerate(rows):
+        top = margin + row * (row_height + margin)
+        left = margin
+        for column, image in enumerate(images):
+            # Center each image in its cell
+            height, width = image.shape[:2]
+            y = top + (row_height - height) // 2
+            x = left + (column_widths[column] - width) // 2
+            page[y:y + height, x:x + width] = image[:, :, :3]
+            left += column_widths[column] + margin
+    return page
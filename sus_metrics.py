@@ -1,7 +1,7 @@
 """Functions that can be used to gauge suspiciousness of edits and users."""
 
 import pywikibot as pwb
-from functools import lru_cache
+from user_info import get_user, prefetch_users
 
 def is_anon(edit):
     """Returns whether an edit was made anonymously.
@@ -56,29 +56,50 @@ def few_posts(edit):
     else: return __few_posts_internal(edit['user'])
 
 # Section: Internal functions for metric functions that require API calls.
-# A separate, internal function is needed because otherwise the caching feature would
-# fail (different edits with same username -> no caching; same username repeatedly fed to
-# internal function -> successful caching)
+# User information is read from the shared user cache in user_info, which
+# get_pages_suspiciousness fills for every author of a page's edits with
+# batched list=users requests before the metrics run. Users missing from the
+# cache are looked up one at a time.
 
-@lru_cache(128)
 def __young_internal(username):
-    user = pwb.User(default_site, username)
-    if user:
-        reg = user.registration()
-        if reg:
-            return (pwb.Timestamp.now() - reg).days < 100
-    return False
+    return __is_young(get_user(default_site, username))
 
-@lru_cache(128)
 def __few_posts_internal(username):
-    user = pwb.User(default_site, username)
-    if user:
-        return user.editCount() <= 10
+    return __has_few_posts(get_user(default_site, username))
+
+def __is_young(user_info):
+    reg = user_info["registration"]
+    if reg:
+        return (pwb.Timestamp.now() - reg).days < 100
+    return False
+
+def __has_few_posts(user_info):
+    return user_info["editcount"] <= 10
+
+# Section: Vectorized versions of the metric functions. Each takes an edit table
+# (see edit_table.make_edit_table) and returns a boolean Series with one value per
+# edit, so a whole set of pages can be scored in a single pass.
+
+def is_anon_column(table):
+    return table["userid"] == 0
 
-# TODO: When creating metrics where the API must be queried, use
-# functools's caching features to speed up retrieval
-# e.g. checking information about a user: the return value will always be the
-# same for the same username, so we can lru_cache the result
+def no_comment_column(table):
+    return table["comment_empty"] & (table["size_delta"].abs() > 10)
+
+def young_column(table):
+    return __user_column(table, __is_young)
+
+def few_posts_column(table):
+    return __user_column(table, __has_few_posts)
+
+def __user_column(table, predicate):
+    # Evaluate the predicate once per registered author rather than once per edit.
+    # Anonymous edits are never flagged, as in the scalar metrics.
+    registered = table["userid"] != 0
+    usernames = table.loc[registered, "user"].unique()
+    prefetch_users(default_site, usernames)
+    values = {username: predicate(get_user(default_site, username)) for username in usernames}
+    return table["user"].map(values).where(registered, False).astype(bool)
 
 metrics = {
     "anon": is_anon,
@@ -87,5 +108,40 @@ metrics = {
     "few_posts": few_posts
 }
 
+# The metrics that read the user table, so the authors of the edits they score should be
+# prefetched with user_info.prefetch_edit_users before they run
+user_metrics = {young, few_posts}
+
+# The vectorized version of each metric function. Metrics without one are evaluated edit by edit.
+vectorized_metrics = {
+    is_anon: is_anon_column,
+    no_comment: no_comment_column,
+    young: young_column,
+    few_posts: few_posts_column
+}
+
+# The edit dict keys each metric reads. Metrics without an entry are assumed to read every key.
+metric_fields = {
+    is_anon: {"userid"},
+    no_comment: {"comment", "size_delta"},
+    young: {"user", "userid"},
+    few_posts: {"user", "userid"}
+}
+
+def needs_diffs(sus_metrics: dict) -> bool:
+    """Returns whether any of a set of metrics reads the text an edit added or removed.
+
+    If none do, edits can be retrieved with only their metadata, which skips retrieving
+    and parsing a diff for every edit.
+
+    Args:
+        sus_metrics (dict): The metrics, in the format {metric_name: metric_function}
+
+    Returns:
+        bool: Whether the edits' added and removed text is needed.
+    """
+    return any(metric_fields.get(metric_func, {"added", "removed"}) & {"added", "removed"}
+        for metric_func in sus_metrics.values())
+
 # The site used in metric function calls, since a site can't be passed as a parameter
 default_site = pwb.Site("en", "wikipedia")
\ No newline at end of file
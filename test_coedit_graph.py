@@ -0,0 +1,17 @@
+import datetime
+
+import numpy as np
+
+from coedit_graph import CoeditGraph
+
+def test_close_edits_counts_each_group_once():
+    # A edits Page in two windows of time next to each other and B in the first of them, and
+    # both edit Other in the same window
+    timestamps = np.datetime64("2022-01-01T00:00:00", "s") + np.array([0, 70, 10, 0, 5]) * np.timedelta64(1, "m")
+    graph = CoeditGraph(["A", "A", "B", "A", "B"], ["Page", "Page", "Page", "Other", "Other"], timestamps,
+        window=datetime.timedelta(hours=1), min_weight=0)
+    a, b = list(graph.users).index("A"), list(graph.users).index("B")
+
+    assert graph.close_edits[a, b] == graph.close_edits[b, a] == 2
+    # Both cosine similarities are at most 1, so the weight is at most 1 + time_weight
+    assert graph.graph[a, b] == graph.graph[b, a] <= 2
@@ -0,0 +1,13 @@
+import pickle
+
+import edit_cache
+
+def test_pickled_cache_reopens_file(tmp_path):
+    cache = edit_cache.EditCache(str(tmp_path / "edits.sqlite"))
+    cache.put_many(None, [{"revid": 1, "added": ["text"], "removed": []}])
+    assert cache.get(None, 1) is not None
+
+    copy = pickle.loads(pickle.dumps(cache))
+    assert copy.path == cache.path
+    assert (copy.hits, copy.misses) == (0, 0)
+    assert copy.get(None, 1) == {"revid": 1, "added": ["text"], "removed": []}
@@ -0,0 +1,26 @@
+import datetime
+
+import edit_warehouse
+import get_edits
+from fake_api import FakeWiki
+
+def test_sync_with_end_time_and_hidden_revision(tmp_path, monkeypatch):
+    wiki = FakeWiki()
+    wiki.add_page("Test page", 50)
+    hidden = wiki.pages["Test page"]["history"][20]["revid"]
+    wiki.revisions[hidden]["texthidden"] = True
+    end_time = datetime.datetime(2000, 1, 1)
+    warehouse = edit_warehouse.EditWarehouse(str(tmp_path / "warehouse"))
+
+    with wiki.serve() as server:
+        monkeypatch.setattr(get_edits, "submit", server.submit)
+        assert warehouse.sync_page("Test page", None, end_time=end_time, use_cache=False) == 50
+        wiki.add_revisions("Test page", 10)
+        # The stored edits are newer than end_time, so the sync still only retrieves the new ones
+        assert warehouse.sync_page("Test page", None, end_time=end_time, use_cache=False) == 10
+
+    edits = warehouse.get_edit_dicts(None, ["Test page"])["Test page"]
+    assert len(edits) == 60
+    missing = sorted(edit["revid"] for edit in edits if edit["diff_missing"])
+    assert missing == sorted(edit["revid"] for edit in edits if hidden in (edit["revid"], edit["parentid"]))
+    assert len(missing) == 2
@@ -0,0 +1,130 @@
+import pytest
+
+import get_edits
+from fake_api import FakeWiki, diff_html
+
+# Diff tables in the shapes MediaWiki's compare output takes, with the added and removed text
+# each should give
+DIFF_FIXTURES = [
+    # Inline changes, with character references
+    ('<tr><td colspan="2" class="diff-lineno" id="mw-diff-left-l12">Line 12:</td>'
+        '<td colspan="2" class="diff-lineno">Line 12:</td></tr>\n'
+        '<tr><td class="diff-marker" data-marker="\u2212"></td><td class="diff-deletedline diff-side-deleted"><div>'
+        'The <del class="diffchange diffchange-inline">quick</del> fox &amp; the &quot;dog&quot;</div></td>'
+        '<td class="diff-marker" data-marker="+"></td><td class="diff-addedline diff-side-added"><div>'
+        'The <ins class="diffchange diffchange-inline">slow&nbsp;brown</ins> fox &amp; the &quot;dog&quot;'
+        '<ins class="diffchange diffchange-inline"> &lt;ref&gt;&#91;1&#93;</ins></div></td></tr>\n',
+        ["slow\xa0brown", " <ref>[1]"], ["quick"]),
+    # Context rows are skipped, and whole lines are added and removed
+    ('<tr><td class="diff-marker"></td><td class="diff-context diff-side-deleted"><div>Unchanged</div></td>'
+        '<td class="diff-marker"></td><td class="diff-context diff-side-added"><div>Unchanged</div></td></tr>\n'
+        '<tr><td colspan="2" class="diff-empty diff-side-deleted"></td><td class="diff-marker" data-marker="+"></td>'
+        '<td class="diff-addedline diff-side-added"><div>== New section ==</div></td></tr>\n'
+        '<tr><td colspan="2" class="diff-empty diff-side-deleted"></td><td class="diff-marker" data-marker="+"></td>'
+        '<td class="diff-addedline diff-side-added"><br></td></tr>\n'
+        '<tr><td class="diff-marker" data-marker="\u2212"></td><td class="diff-deletedline diff-side-deleted">'
+        '<div>{{Citation needed|date=May 2021}}</div></td><td colspan="2" class="diff-empty diff-side-added"></td></tr>\n',
+        ["== New section =="], ["{{Citation needed|date=May 2021}}"]),
+    # A moved paragraph, whose anchors are part of the line's text
+    ('<tr><td class="diff-marker"><a class="mw-diff-movedpara-left" title="Paragraph was moved." '
+        'href="#movedpara_3_1_rhs">&#x26AB;</a></td><td class="diff-deletedline diff-side-deleted"><div>'
+        '<a name="movedpara_1_0_lhs"></a>Moved <del class="diffchange diffchange-inline">old</del> text</div></td>'
+        '<td colspan="2" class="diff-empty diff-side-added"></td></tr>\n',
+        [], ["Moved old text"]),
+    # The older table layout, with a changed line whose new side has no inline changes
+    ("<tr>\n  <td class='diff-marker'>\u2212</td>\n  <td class='diff-deletedline'><div>"
+        "Text <del class='diffchange diffchange-inline'>removed</del></div></td>\n"
+        "  <td class='diff-marker'>+</td>\n  <td class='diff-addedline'><div>Text</div></td>\n</tr>\n"
+        "<tr>\n  <td colspan=\"2\">&#160;</td>\n  <td class='diff-marker'>+</td>\n"
+        "  <td class='diff-addedline'><div dir='rtl'>\u05e9\u05dc\u05d5\u05dd &#039;\u4f60\u597d&#039; \U0001f600</div></td>\n</tr>\n",
+        ["\u05e9\u05dc\u05d5\u05dd '\u4f60\u597d' \U0001f600"], ["removed"]),
+    # No changes at all
+    ("", [], [])
+]
+
+# Pairs of revision texts with the diff table wikidiff2 gives for them. These were written out by
+# hand in wikidiff2's format rather than recorded from action=compare. Every inline change ends
+# at punctuation or the end of the line, where wikidiff2's word boundaries match diff_words.
+COMPARE_FIXTURES = [
+    # A changed number and a changed link target
+    ("'''Springfield''' is a town in [[Ohio]].\nIts population was 1,200.\n",
+        "'''Springfield''' is a town in [[Illinois]].\nIts population was 1,350.\n",
+        '<tr><td colspan="2" class="diff-lineno" id="mw-diff-left-l1">Line 1:</td>'
+        '<td colspan="2" class="diff-lineno">Line 1:</td></tr>\n'
+        '<tr><td class="diff-marker" data-marker="−"></td><td class="diff-deletedline diff-side-deleted"><div>'
+        '&#039;&#039;&#039;Springfield&#039;&#039;&#039; is a town in [[<del class="diffchange diffchange-inline">Ohio</del>]].'
+        '</div></td><td class="diff-marker" data-marker="+"></td><td class="diff-addedline diff-side-added"><div>'
+        '&#039;&#039;&#039;Springfield&#039;&#039;&#039; is a town in [[<ins class="diffchange diffchange-inline">Illinois</ins>]].'
+        '</div></td></tr>\n'
+        '<tr><td class="diff-marker" data-marker="−"></td><td class="diff-deletedline diff-side-deleted"><div>'
+        'Its population was 1,<del class="diffchange diffchange-inline">200</del>.</div></td>'
+        '<td class="diff-marker" data-marker="+"></td><td class="diff-addedline diff-side-added"><div>'
+        'Its population was 1,<ins class="diffchange diffchange-inline">350</ins>.</div></td></tr>\n'),
+    # A stub template replaced by a new section
+    ("Springfield is a town.\n{{stub}}\n",
+        "Springfield is a town.\n\n== History ==\nIt was founded in 1850.\n",
+        '<tr><td colspan="2" class="diff-lineno" id="mw-diff-left-l1">Line 1:</td>'
+        '<td colspan="2" class="diff-lineno">Line 1:</td></tr>\n'
+        '<tr><td class="diff-marker"></td><td class="diff-context diff-side-deleted"><div>Springfield is a town.</div></td>'
+        '<td class="diff-marker"></td><td class="diff-context diff-side-added"><div>Springfield is a town.</div></td></tr>\n'
+        '<tr><td class="diff-marker" data-marker="−"></td><td class="diff-deletedline diff-side-deleted">'
+        '<div>{{stub}}</div></td><td colspan="2" class="diff-empty diff-side-added"></td></tr>\n'
+        '<tr><td colspan="2" class="diff-empty diff-side-deleted"></td><td class="diff-marker" data-marker="+"></td>'
+        '<td class="diff-addedline diff-side-added"><br></td></tr>\n'
+        '<tr><td colspan="2" class="diff-empty diff-side-deleted"></td><td class="diff-marker" data-marker="+"></td>'
+        '<td class="diff-addedline diff-side-added"><div>== History ==</div></td></tr>\n'
+        '<tr><td colspan="2" class="diff-empty diff-side-deleted"></td><td class="diff-marker" data-marker="+"></td>'
+        '<td class="diff-addedline diff-side-added"><div>It was founded in 1850.</div></td></tr>\n'),
+    # A reference removed from the end of a line
+    ("Springfield is a town.<ref>{{cite web|title=Census}}</ref>\n",
+        "Springfield is a town.\n",
+        '<tr><td colspan="2" class="diff-lineno" id="mw-diff-left-l1">Line 1:</td>'
+        '<td colspan="2" class="diff-lineno">Line 1:</td></tr>\n'
+        '<tr><td class="diff-marker" data-marker="−"></td><td class="diff-deletedline diff-side-deleted"><div>'
+        'Springfield is a town.<del class="diffchange diffchange-inline">&lt;ref&gt;{{cite web|title=Census}}&lt;/ref&gt;</del>'
+        '</div></td><td class="diff-marker" data-marker="+"></td><td class="diff-addedline diff-side-added"><div>'
+        'Springfield is a town.</div></td></tr>\n')
+]
+
+def parse_diff_html_bs4(diff):
+    """The original BeautifulSoup implementation of get_edits.parse_diff_html."""
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(diff, features="html.parser")
+    added = []
+    removed = []
+    for tr in soup.find_all("tr"):
+        added_line = tr.find("td", class_="diff-addedline")
+        deleted_line = tr.find("td", class_="diff-deletedline")
+        if added_line and deleted_line:
+            added += [text.get_text() for text in added_line.find_all("ins")]
+            removed += [text.get_text() for text in deleted_line.find_all("del")]
+        elif added_line:
+            div = added_line.find("div")
+            if div:
+                added.append(div.get_text())
+        elif deleted_line:
+            div = deleted_line.find("div")
+            if div:
+                removed.append(div.get_text())
+    return added, removed
+
+@pytest.mark.parametrize("diff, added, removed", DIFF_FIXTURES)
+def test_parse_diff_html_fixtures(diff, added, removed):
+    assert get_edits.parse_diff_html(diff) == (added, removed)
+
+@pytest.mark.parametrize("diff, added, removed", DIFF_FIXTURES)
+def test_bs4_fixtures(diff, added, removed):
+    pytest.importorskip("bs4")
+    assert parse_diff_html_bs4(diff) == (added, removed)
+
+def test_parse_diff_html_matches_bs4():
+    pytest.importorskip("bs4")
+    wiki = FakeWiki()
+    wiki.add_page("Test page", 1000)
+    for rev in wiki.pages["Test page"]["history"]:
+        diff = diff_html(wiki.revisions[rev["parentid"]]["text"] if rev["parentid"] else "", rev["text"])
+        assert get_edits.parse_diff_html(diff) == parse_diff_html_bs4(diff), rev["revid"]
+
+@pytest.mark.parametrize("old_text, new_text, diff", COMPARE_FIXTURES)
+def test_diff_texts_matches_compare(old_text, new_text, diff):
+    assert get_edits.diff_texts(old_text, new_text) == get_edits.parse_diff_html(diff)
@@ -0,0 +1,26 @@
+import edit_cache
+import get_edits
+import page_sweep
+from fake_api import FakeWiki
+
+def test_sweep_twice_with_hidden_revision(tmp_path, monkeypatch):
+    wiki = FakeWiki()
+    wiki.add_page("Test page", 100)
+    hidden = wiki.pages["Test page"]["history"][40]["revid"]
+    wiki.revisions[hidden]["texthidden"] = True
+    cache = edit_cache.EditCache(str(tmp_path / "edits.sqlite"))
+    monkeypatch.setattr(edit_cache, "_default_cache", cache)
+
+    with wiki.serve() as server:
+        monkeypatch.setattr(get_edits, "submit", server.submit)
+        sweeps = [dict(page_sweep.sweep_pages(["Test page"], None, processes=0, report_interval=None))
+            for _ in range(2)]
+
+    # The second sweep reads every diff from the cache, and still marks the edits next to the hidden revision
+    assert cache.stats()["hits"] == 100
+    for edits in sweeps:
+        missing = sorted(edit["revid"] for edit in edits["Test page"] if edit.get("diff_missing", False))
+        assert missing == sorted(edit["revid"] for edit in edits["Test page"]
+            if hidden in (edit["revid"], edit["parentid"]))
+        assert len(missing) == 2
+    assert sweeps[0]["Test page"] == sweeps[1]["Test page"]
@@ -0,0 +1,46 @@
+import datetime
+import json
+
+import recent_changes
+from sus_metrics import is_anon, no_comment
+
+def make_change(rcid, title, timestamp, user="Example", userid=1, comment="", oldlen=100, newlen=200):
+    return {
+        "type": "edit",
+        "ns": 0,
+        "title": title,
+        "rcid": rcid,
+        "revid": rcid,
+        "old_revid": rcid - 1,
+        "user": user,
+        "userid": userid,
+        "oldlen": oldlen,
+        "newlen": newlen,
+        "timestamp": timestamp,
+        "comment": comment,
+        "tags": []
+    }
+
+def test_to_edit_dict_hidden_user():
+    change = make_change(5, "Page", "2024-01-01T00:00:00Z")
+    del change["user"], change["userid"]
+    change["userhidden"] = ""
+
+    edit = recent_changes.to_edit_dict(change)
+    assert edit["user"] == ""
+    assert edit["userid"] == -1
+
+def test_replay_with_hidden_user(tmp_path):
+    changes = [make_change(i, "Page %d" % (i % 3), "2024-01-01T00:%02d:00Z" % i, user="User%d" % i, userid=i)
+        for i in range(1, 20)]
+    # A change whose user was suppressed, which list=recentchanges lists without user or userid
+    del changes[10]["user"], changes[10]["userid"]
+    changes[10]["userhidden"] = ""
+    path = tmp_path / "feed.jsonl"
+    path.write_text("".join(json.dumps(change) + "\n" for change in changes))
+
+    monitor = recent_changes.RecentChangesMonitor({"anon": is_anon, "no_comment": no_comment},
+        window=datetime.timedelta(hours=1), min_edits=1)
+    list(monitor.run(recent_changes.replay_feed(str(path))))
+    assert monitor.stats()["events"] == len(changes)
+    assert sum(monitor.scorer.counts.values()) == len(changes)
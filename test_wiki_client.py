@@ -0,0 +1,47 @@
+import datetime
+import email.utils
+import pickle
+
+import wiki_client
+from fake_api import FakeWiki
+
+def test_pickled_client_starts_its_own_loop():
+    client = wiki_client.WikiClient("http://127.0.0.1:1/w/api.php", max_retries=2)
+    try:
+        copy = pickle.loads(pickle.dumps(client))
+        try:
+            assert (copy.api_url, copy.kwargs) == (client.api_url, client.kwargs)
+            assert copy.client.max_retries == 2
+            assert copy.loop is not client.loop and copy.thread.is_alive()
+        finally:
+            copy.close()
+    finally:
+        client.close()
+
+class ServerSite:
+    """A site whose API is a FakeWiki server's."""
+
+    def __init__(self, server):
+        self.server = server
+
+    def apipath(self):
+        return "/w/api.php"
+
+    def base_url(self, path):
+        return self.server.url[:-len(self.apipath())] + path
+
+def test_submit_sends_to_site():
+    wiki = FakeWiki()
+    wiki.add_page("Test page", 5)
+    with wiki.serve() as server, wiki_client.WikiClient("http://127.0.0.1:1/w/api.php", max_retries=0) as client:
+        result = client.submit(ServerSite(server), {"action": "query", "prop": "revisions", "titles": "Test page"})
+    assert [page["title"] for page in result["query"]["pages"].values()] == ["Test page"]
+
+def test_parse_retry_after():
+    assert wiki_client.parse_retry_after("120") == 120.0
+    assert wiki_client.parse_retry_after("-5") == 0.0
+    assert wiki_client.parse_retry_after("Wed, 21 Oct 2015 07:28:00 GMT") == 0.0
+    later = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=2)
+    assert 100 < wiki_client.parse_retry_after(email.utils.format_datetime(later, usegmt=True)) <= 120
+    assert wiki_client.parse_retry_after("soon") is None
+    assert wiki_client.parse_retry_after("inf") is None
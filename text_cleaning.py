@@ -0,0 +1,78 @@
+"""Normalizes the text added and removed in edits into lists of English words.
+
+The English vocabulary and stopword sets are built once and shared, and each distinct
+token is only classified once, so whole batches of edits can be cleaned cheaply.
+"""
+
+import re
+from functools import lru_cache
+
+import nltk
+
+# The same tokens nltk.wordpunct_tokenize splits text into
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]+")
+NON_ALPHABET_PATTERN = re.compile(r"[^a-zA-Z]")
+
+@lru_cache(maxsize=None)
+def get_vocabulary():
+    """Gets the lowercase set of English words from nltk's words corpus, loading it on first use."""
+    return frozenset(word.lower() for word in nltk.corpus.words.words())
+
+def make_stopword_set(stopwords):
+    """Makes a lowercase set out of a list of stopwords, for use with remove_stopwords."""
+    return frozenset(word.lower() for word in stopwords)
+
+@lru_cache(maxsize=1 << 16)
+def clean_token(token):
+    """Gets what is left of a token once non-English words and non-alphabet characters are removed.
+
+    Args:
+        token (str): A token from TOKEN_PATTERN.
+
+    Returns:
+        str: The cleaned token, which is empty if nothing is left.
+    """
+    if token.isalpha() and token.lower() not in get_vocabulary():
+        return ""
+    return NON_ALPHABET_PATTERN.sub("", token)
+
+def clean_changes(changes):
+    """Removes non-English words and non-alphabet characters from a list of additions or removals.
+
+    Args:
+        changes (list): The strings added or removed in an edit.
+
+    Returns:
+        list: The list of words left in each change, leaving out changes with no words left.
+    """
+    cleaned = []
+    for change in changes:
+        words = [word for word in map(clean_token, TOKEN_PATTERN.findall(change)) if word]
+        if words:
+            cleaned.append(words)
+    return cleaned
+
+def get_changes_batch(edits, label, min_length=3):
+    """Gets every cleaned word added or removed across a batch of edits.
+
+    Args:
+        edits (list): The edit dicts.
+        label (str): "added" or "removed".
+        min_length (int): The length a word must have to be kept.
+
+    Returns:
+        list: The words, in edit order.
+    """
+    return [word for edit in edits for change in clean_changes(edit[label]) for word in change if len(word) >= min_length]
+
+def remove_stopwords(words, stopword_set):
+    """Removes stopwords from a list of words, ignoring case.
+
+    Args:
+        words (list): The words.
+        stopword_set (frozenset): The lowercase stopwords, from make_stopword_set.
+
+    Returns:
+        list: The words that aren't stopwords.
+    """
+    return [word for word in words if word.lower() not in stopword_set]
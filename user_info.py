@@ -0,0 +1,296 @@
+"""A shared cache of user information, filled in bulk with list=users requests.
+
+Looking users up one at a time costs a request per user per fact. prefetch_users resolves
+every fact the metrics and reports need for up to 50 users per request, and get_user reads
+them back. Every module reads users through the default UserCache, so each user is looked up
+at most once per run, and at most once per TTL across runs when the cache is kept on disk.
+"""
+
+import collections
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import pywikibot as pwb
+import get_edits
+from edit_cache import site_key
+from wiki_client import get_default_client, match_users
+
+# The most users list=users accepts in a single request
+USERS_BATCH_SIZE = 50
+
+# The user properties requested for each user
+USER_PROPS = ("registration", "editcount", "groups", "gender", "rights")
+
+# The most users kept in memory, and how long (in seconds) a user's information is trusted for
+DEFAULT_MAX_SIZE = 100000
+DEFAULT_TTL = 24 * 60 * 60
+
+class UserCache:
+    """A size-bounded cache of user table entries, keyed by (site key, username), that counts
+    its hits and misses.
+
+    Entries older than the TTL are looked up again, and once the cache is full the least
+    recently used entry is evicted. If a path is given, the list=users entries are also kept
+    in a SQLite file so later runs can reuse them until they expire.
+
+    Safe to share between threads. Each process opens its own connection to the file.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, ttl=DEFAULT_TTL, path=None):
+        """
+        Args:
+            max_size (int): The most users to keep in memory.
+            ttl (float): The number of seconds a user's information is kept before it is looked up again,
+                or None to keep it for as long as the cache is open.
+            path (str): The path of the SQLite file to persist entries in, or None to only keep them in memory.
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.lock = threading.RLock()
+        # (fetch time, user table entry) pairs, least recently used first
+        self.entries = collections.OrderedDict()
+        self._connection = None
+        self._pid = None
+
+    @property
+    def connection(self):
+        # Connections can't be shared with forked processes, so reconnect in a new process
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("""CREATE TABLE IF NOT EXISTS users (
+                site TEXT NOT NULL,
+                username TEXT NOT NULL,
+                fetched REAL NOT NULL,
+                entry TEXT NOT NULL,
+                PRIMARY KEY (site, username)
+            )""")
+            self._connection.commit()
+            self._pid = os.getpid()
+        return self._connection
+
+    def expired(self, fetched):
+        return self.ttl is not None and time.time() - fetched > self.ttl
+
+    def get_many(self, site, usernames):
+        """Gets the cached information on every user out of a list who hasn't expired,
+        reading the users missing from memory from the file.
+
+        Args:
+            site (pywikibot.Site): The site the users are on.
+            usernames (iterable): The names of the users.
+
+        Returns:
+            dict: The user table entries that were cached, keyed by username.
+        """
+        key = site_key(site)
+        usernames = list(dict.fromkeys(usernames))
+        found = {}
+        with self.lock:
+            for username in usernames:
+                cached = self.entries.get((key, username))
+                if cached is None:
+                    continue
+                if self.expired(cached[0]):
+                    del self.entries[key, username]
+                    continue
+                self.entries.move_to_end((key, username))
+                found[username] = cached[1]
+
+            if self.path is not None:
+                missing = [username for username in usernames if username not in found]
+                for fetched, username, entry in self.read_rows(key, missing):
+                    found[username] = self.store(key, username, parse_user(entry), fetched)
+
+            self.hits += len(found)
+            self.misses += len(usernames) - len(found)
+        return found
+
+    def read_rows(self, key, usernames):
+        rows = []
+        # SQLite's limit on the number of parameters in a single statement is at least 999
+        for i in range(0, len(usernames), 500):
+            batch = usernames[i:i + 500]
+            rows += self.connection.execute(
+                "SELECT fetched, username, entry FROM users WHERE site = ? AND username IN (%s)" % ",".join("?" * len(batch)),
+                [key] + batch)
+        return [(fetched, username, json.loads(entry)) for fetched, username, entry in rows if not self.expired(fetched)]
+
+    def put_many(self, site, entries):
+        """Caches the list=users entries of a set of users, replacing any that were already cached.
+
+        Args:
+            site (pywikibot.Site): The site the users are on.
+            entries (dict): The list=users entry of each user, keyed by username.
+
+        Returns:
+            dict: The user table entries made from them, keyed by username.
+        """
+        key = site_key(site)
+        fetched = time.time()
+        with self.lock:
+            parsed = {username: self.store(key, username, parse_user(entry), fetched) for username, entry in entries.items()}
+            if self.path is not None:
+                self.connection.executemany("INSERT OR REPLACE INTO users (site, username, fetched, entry) VALUES (?, ?, ?, ?)",
+                    [(key, username, fetched, json.dumps(entry)) for username, entry in entries.items()])
+                self.connection.commit()
+        return parsed
+
+    def store(self, key, username, user_info, fetched):
+        self.entries[key, username] = (fetched, user_info)
+        self.entries.move_to_end((key, username))
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+        return user_info
+
+    def prefetch(self, site, usernames):
+        """Looks up every user that isn't cached, USERS_BATCH_SIZE users per request.
+
+        Args:
+            site (pywikibot.Site): The site the users are on.
+            usernames (iterable): The names of the users.
+
+        Returns:
+            dict: The user table entry of each user, keyed by username.
+        """
+        usernames = list(dict.fromkeys(usernames))
+        with self.lock:
+            found = self.get_many(site, usernames)
+            missing = [username for username in usernames if username not in found]
+            if missing:
+                entries = fetch_users(site, missing)
+                found.update(self.put_many(site, {username: entries.get(username, {}) for username in missing}))
+        return found
+
+    def get(self, site, username):
+        """Gets the information on a user, looking the user up if they aren't cached."""
+        with self.lock:
+            cached = self.entries.get((site_key(site), username))
+            if cached is not None and not self.expired(cached[0]):
+                self.entries.move_to_end((site_key(site), username))
+                self.hits += 1
+                return cached[1]
+        return self.prefetch(site, [username])[username]
+
+    def clear(self):
+        """Empties the in-memory cache and resets its statistics. The file is left as it is."""
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def stats(self):
+        """Gets the number of hits, misses and evictions since the cache was opened or cleared,
+        and the number of users in memory.
+
+        Returns:
+            dict: The hits, misses, hit rate, evictions and size.
+        """
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0,
+                "evictions": self.evictions,
+                "size": len(self.entries)
+            }
+
+    def close(self):
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+def fetch_users(site, usernames):
+    """Requests the list=users entries of a list of users, USERS_BATCH_SIZE users per request.
+
+    Returns:
+        dict: The list=users entry of each user that exists, keyed by username as given.
+    """
+    client = get_default_client()
+    if client:
+        # The client sends the batches concurrently
+        return client.users(usernames, USER_PROPS)
+
+    entries = {}
+    for i in range(0, len(usernames), USERS_BATCH_SIZE):
+        batch = usernames[i:i + USERS_BATCH_SIZE]
+        result = get_edits.submit(site, {
+            "action": "query",
+            "format": "json",
+            "list": "users",
+            "ususers": "|".join(batch),
+            "usprop": "|".join(USER_PROPS)
+        })
+        entries.update(match_users(batch, result["query"]["users"]))
+    return entries
+
+_default_user_cache = None
+_default_user_cache_lock = threading.Lock()
+
+def set_default_user_cache(cache):
+    """Sets the cache that every module reads users from, e.g. one persisted to disk or with a different TTL."""
+    global _default_user_cache
+    with _default_user_cache_lock:
+        _default_user_cache = cache
+
+def get_default_user_cache():
+    """Gets the cache shared by every module, an in-memory UserCache unless one has been set."""
+    global _default_user_cache
+    with _default_user_cache_lock:
+        if _default_user_cache is None:
+            _default_user_cache = UserCache()
+        return _default_user_cache
+
+def prefetch_users(site, usernames):
+    """Looks up every user that isn't in the shared cache yet, USERS_BATCH_SIZE users per request.
+
+    Args:
+        site (pywikibot.Site): The site the users are on.
+        usernames (iterable): The names of the users.
+    """
+    get_default_user_cache().prefetch(site, usernames)
+
+def prefetch_edit_users(site, edits):
+    """Looks up the authors of a list of edits, skipping anonymous editors.
+
+    Args:
+        site (pywikibot.Site): The site the edits were made on.
+        edits (iterable): The edit dicts.
+    """
+    prefetch_users(site, (edit["user"] for edit in edits if edit["userid"] != 0))
+
+def get_user(site, username):
+    """Gets the information on a user, looking the user up if they aren't in the shared cache.
+
+    Args:
+        site (pywikibot.Site): The site the user is on.
+        username (str): The name of the user.
+
+    Returns:
+        dict: The user's registration (pywikibot.Timestamp or None), editcount, groups, gender
+            and rights, and whether the user exists.
+    """
+    return get_default_user_cache().get(site, username)
+
+def parse_user(entry):
+    """Converts a list=users entry to a user table entry."""
+    registration = entry.get("registration")
+    return {
+        "exists": "userid" in entry,
+        "registration": pwb.Timestamp.fromISOformat(registration) if registration else None,
+        "editcount": entry.get("editcount", 0),
+        "groups": entry.get("groups", []),
+        "gender": entry.get("gender", "unknown"),
+        "rights": entry.get("rights", [])
+    }
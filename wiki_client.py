@@ -0,0 +1,344 @@
+"""An asyncio MediaWiki API client that shares one pooled HTTP session between every request.
+
+AsyncWikiClient is for asyncio code. WikiClient runs one on a background event loop so that
+blocking code (and several threads at once) can use it too. Once a WikiClient has been set
+with set_default_client, get_edits, account_info, SP500, sus_metrics and outlier_edits send
+their API requests through it instead of through pywikibot.
+"""
+
+import asyncio
+import datetime
+import email.utils
+import math
+import os
+import random
+import re
+import threading
+import urllib.parse
+
+import aiohttp
+from pywikibot.exceptions import APIError, MaxlagTimeoutError, ServerError
+
+# The most values most list parameters (e.g. ususers) accept in a single request
+MAX_BATCH_SIZE = 50
+
+class AsyncWikiClient:
+    """Sends requests to a MediaWiki API over a shared aiohttp session.
+
+    Each host gets at most max_per_host requests in flight at once. Requests turned away with
+    HTTP 429/503 or a maxlag error are retried with exponential backoff, honouring the server's
+    Retry-After header when it sends one.
+    """
+
+    def __init__(self, api_url, max_per_host=8, max_retries=5, maxlag=5, backoff=1.0,
+            user_agent="social_media_forensics (pywikibot compatible)"):
+        """
+        Args:
+            api_url (str): The URL of the wiki's api.php.
+            max_per_host (int): The most requests to have in flight to one host at once.
+            max_retries (int): The number of times to retry a throttled request before giving up.
+            maxlag (int): The maxlag parameter sent with each request, in seconds.
+            backoff (float): The number of seconds to wait before the first retry, doubled on each retry.
+            user_agent (str): The User-Agent header to send.
+        """
+        self.api_url = api_url
+        self.max_per_host = max_per_host
+        self.max_retries = max_retries
+        self.maxlag = maxlag
+        self.backoff = backoff
+        self.user_agent = user_agent
+        self.requests = 0
+        self.retries = 0
+        self._session = None
+        self._semaphores = {}
+
+    @property
+    def session(self):
+        # The session has to be created on the event loop that uses it
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit_per_host=self.max_per_host)
+            self._session = aiohttp.ClientSession(connector=connector, headers={"User-Agent": self.user_agent})
+        return self._session
+
+    def semaphore(self, url):
+        host = urllib.parse.urlsplit(url).netloc
+        if host not in self._semaphores:
+            self._semaphores[host] = asyncio.Semaphore(self.max_per_host)
+        return self._semaphores[host]
+
+    async def request(self, params, api_url=None):
+        """Sends an API request, retrying it while the server is throttling or lagged.
+
+        Args:
+            params (dict): The API request parameters. Lists are joined with "|".
+            api_url (str): The URL of the api.php to send it to. Defaults to the client's.
+
+        Returns:
+            dict: The parsed API response.
+
+        Raises:
+            pywikibot.exceptions.APIError: The API returned an error other than maxlag.
+            pywikibot.exceptions.MaxlagTimeoutError: The server was still lagged after max_retries retries.
+            pywikibot.exceptions.ServerError: The server was still throttling after max_retries retries.
+        """
+        data = {"format": "json", "maxlag": self.maxlag}
+        for key, value in params.items():
+            data[key] = "|".join(str(v) for v in value) if isinstance(value, (list, tuple, set)) else str(value)
+
+        api_url = api_url or self.api_url
+        for attempt in range(self.max_retries + 1):
+            async with self.semaphore(api_url):
+                self.requests += 1
+                async with self.session.post(api_url, data=data) as response:
+                    retry_after = response.headers.get("Retry-After")
+                    if response.status in (429, 503):
+                        error = ServerError("HTTP {} from {}".format(response.status, api_url))
+                    else:
+                        response.raise_for_status()
+                        result = await response.json(content_type=None)
+                        if "error" not in result:
+                            return result
+                        if result["error"].get("code") != "maxlag":
+                            raise APIError(result["error"].get("code", ""), result["error"].get("info", ""))
+                        error = MaxlagTimeoutError("Maximum retries attempted due to maxlag without success.")
+
+            # Wait outside of the semaphore so other requests to the host can go ahead
+            if attempt == self.max_retries:
+                raise error
+            self.retries += 1
+            delay = parse_retry_after(retry_after) if retry_after else None
+            if delay is None:
+                delay = self.backoff * 2 ** attempt
+            await asyncio.sleep(delay + random.uniform(0, self.backoff / 10))
+
+    async def query(self, params):
+        """Yields every response to a query, following the API's continue tokens.
+
+        Args:
+            params (dict): The API request parameters.
+
+        Yields:
+            dict: Each parsed API response.
+        """
+        params = dict(params, action="query")
+        while True:
+            result = await self.request(params)
+            yield result
+            if "continue" not in result:
+                return
+            params.update(result["continue"])
+
+    async def contributions(self, username, total=500):
+        """Gets a user's most recent contributions, newest first.
+
+        Args:
+            username (str): The name of the user.
+            total (int): The most contributions to get.
+
+        Returns:
+            list: The usercontribs entries.
+        """
+        contribs = []
+        params = {"list": "usercontribs", "ucuser": username, "uclimit": min(total, 500),
+            "ucprop": "ids|title|timestamp|comment|size|flags|tags"}
+        async for result in self.query(params):
+            contribs += result["query"]["usercontribs"]
+            if len(contribs) >= total:
+                break
+        return contribs[:total]
+
+    async def users(self, usernames, props=("registration", "editcount", "groups", "gender")):
+        """Gets information on many users, MAX_BATCH_SIZE users per request, with the batches sent concurrently.
+
+        Args:
+            usernames (list): The names of the users.
+            props (tuple): The usprop values to request.
+
+        Returns:
+            dict: The list=users entry of each user that exists, keyed by username as given.
+        """
+        usernames = list(dict.fromkeys(usernames))
+        batches = [usernames[i:i + MAX_BATCH_SIZE] for i in range(0, len(usernames), MAX_BATCH_SIZE)]
+        results = await asyncio.gather(*(
+            self.request({"action": "query", "list": "users", "ususers": batch, "usprop": list(props)})
+            for batch in batches))
+
+        users = {}
+        for batch, result in zip(batches, results):
+            users.update(match_users(batch, result["query"]["users"]))
+        return users
+
+    async def search(self, search_term, total=10):
+        """Gets the titles of the pages a search finds.
+
+        Args:
+            search_term (str): The search term.
+            total (int): The most titles to get.
+
+        Returns:
+            list: The titles, most relevant first.
+        """
+        titles = []
+        params = {"list": "search", "srsearch": search_term, "srlimit": min(total, 500), "srprop": ""}
+        async for result in self.query(params):
+            titles += [page["title"] for page in result["query"]["search"]]
+            if len(titles) >= total:
+                break
+        return titles[:total]
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+class WikiClient:
+    """Runs an AsyncWikiClient on a background event loop so blocking code can use it.
+
+    Every method can be called from any thread. The methods that take a list of users
+    send their requests concurrently.
+    """
+
+    def __init__(self, api_url, **kwargs):
+        """
+        Args:
+            api_url (str): The URL of the wiki's api.php.
+            **kwargs: Passed on to AsyncWikiClient.
+        """
+        self.api_url = api_url
+        self.kwargs = kwargs
+        self.start()
+
+    def start(self):
+        """Starts a new AsyncWikiClient and event loop thread for the current process."""
+        self.pid = os.getpid()
+        self._client = AsyncWikiClient(self.api_url, **self.kwargs)
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def __getstate__(self):
+        # The event loop thread and session can't be pickled, so a client sent to a spawned
+        # process starts its own there
+        return {"api_url": self.api_url, "kwargs": self.kwargs}
+
+    def __setstate__(self, state):
+        self.__init__(state["api_url"], **state["kwargs"])
+
+    @classmethod
+    def for_site(cls, site, **kwargs):
+        """Makes a client for a pywikibot site's API."""
+        return cls(site.base_url(site.apipath()), **kwargs)
+
+    @property
+    def client(self):
+        """The AsyncWikiClient. A forked worker process doesn't inherit the loop thread,
+        so the first use in a new process starts its own client and loop.
+        """
+        if self.pid != os.getpid():
+            self.start()
+        return self._client
+
+    def run(self, coroutine):
+        """Runs a coroutine on the client's event loop and waits for its result."""
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def gather(self, coroutines):
+        """Runs coroutines concurrently on the client's event loop and waits for all of their results."""
+        async def gather():
+            return await asyncio.gather(*coroutines)
+        return self.run(gather())
+
+    def submit(self, site, params):
+        """Sends an API request to a site's api.php, or to the client's if site is None.
+        Has the same signature as get_edits.submit.
+        """
+        api_url = None if site is None else site.base_url(site.apipath())
+        return self.run(self.client.request(params, api_url))
+
+    def contributions(self, username, total=500):
+        return self.run(self.client.contributions(username, total))
+
+    def contributions_many(self, usernames, total=500):
+        """Gets the most recent contributions of many users concurrently.
+
+        Returns:
+            dict: The usercontribs entries of each user, keyed by username.
+        """
+        usernames = list(dict.fromkeys(usernames))
+        return dict(zip(usernames, self.gather(self.client.contributions(username, total) for username in usernames)))
+
+    def users(self, usernames, props=("registration", "editcount", "groups", "gender")):
+        return self.run(self.client.users(usernames, props))
+
+    def search(self, search_term, total=10):
+        return self.run(self.client.search(search_term, total))
+
+    def close(self):
+        if self.pid != os.getpid():
+            return
+        self.run(self.client.close())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def parse_retry_after(value):
+    """Gets the number of seconds a Retry-After header asks clients to wait, given either in
+    seconds or as an HTTP date, or None if it is neither.
+    """
+    try:
+        seconds = float(value)
+    except ValueError:
+        try:
+            date = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+        if date.tzinfo is None:
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        seconds = (date - datetime.datetime.now(datetime.timezone.utc)).total_seconds()
+    if not math.isfinite(seconds):
+        return None
+    return max(seconds, 0.0)
+
+def normalize_username(username):
+    """Normalizes a username the way the API does, with underscores as spaces and the first letter in uppercase."""
+    username = re.sub(r"[ _]+", " ", username).strip()
+    return username[:1].upper() + username[1:]
+
+def match_users(usernames, entries):
+    """Matches list=users entries to the usernames they were requested with.
+
+    The API lists invalid names (such as IP addresses) before the others, normalizes the names
+    and drops duplicates, so entries are matched by their normalized name rather than by position.
+
+    Args:
+        usernames (list): The names of the users, as requested.
+        entries (list): The list=users entries from the response.
+
+    Returns:
+        dict: The entry of each user that exists, keyed by username as requested. Invalid
+            and missing users are left out.
+    """
+    found = {entry["name"]: entry for entry in entries if "invalid" not in entry and "missing" not in entry}
+    return {username: found[normalize_username(username)] for username in usernames
+        if normalize_username(username) in found}
+
+_default_client = None
+
+def set_default_client(client):
+    """Sets the client that every module sends its API requests through, or None to use pywikibot."""
+    global _default_client
+    _default_client = client
+
+def get_default_client():
+    """Gets the client set with set_default_client, or None if requests go through pywikibot."""
+    return _default_client